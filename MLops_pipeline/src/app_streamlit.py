@@ -8,9 +8,14 @@ import streamlit as st # type: ignore
 import pandas as pd
 import joblib
 import numpy as np
+import io
 import os
+from matplotlib import pyplot as plt
 from PIL import Image
 
+from lean_model import LeanModel
+from prediction import predict_frame, score_frame, what_if_grid
+
 # ==============================
 # Configuración general
 # ==============================
@@ -20,10 +25,19 @@ st.title("🐾 Sistema Predictivo y Monitoreo - Adopción de Mascotas")
 # ==============================
 # Cargar modelo y preprocesador
 # ==============================
+LEAN_MODEL_DIR = "RandomForest_lean"
+MODEL_PATH = "RandomForest_model.pkl"
+# Filas por bloque al puntuar un CSV subido
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))
+
+
 @st.cache_resource
 def load_model():
+    # Con el artefacto lean (solo NumPy) no se deserializa el Pipeline de sklearn
+    if os.path.exists(os.path.join(LEAN_MODEL_DIR, "model.json")):
+        return LeanModel(LEAN_MODEL_DIR)
     try:
-        model = joblib.load("RandomForest_model.pkl")
+        model = joblib.load(MODEL_PATH)
         return model
     except FileNotFoundError as e:
         st.error("❌ No se encontró el modelo entrenado (.pkl).")
@@ -32,11 +46,105 @@ def load_model():
 
 model = load_model()
 
+
+@st.cache_resource
+def load_batch_model():
+    """
+    Modelo para lotes grandes (escenarios y CSV): el Pipeline de sklearn si existe,
+    que con miles de filas es mucho más rápido que el artefacto lean.
+    """
+    if os.path.exists(MODEL_PATH):
+        return joblib.load(MODEL_PATH)
+    return model
+
+# ==============================
+# Resultados de monitoreo (cacheados)
+# ==============================
+# Streamlit re-ejecuta el script en cada interacción: los artefactos de monitoreo
+# se leen una sola vez y solo se vuelven a leer si cambia su fecha de modificación.
+def file_mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+@st.cache_data
+def load_drift_results(path, mtime):
+    return pd.read_csv(path)
+
+
+@st.cache_data
+def load_drift_charts(folder, mtime):
+    """(nombre, bytes del PNG) de cada gráfico de drift, en orden alfabético."""
+    images = sorted(f for f in os.listdir(folder) if f.endswith("_drift.png"))
+    charts = []
+    for img_file in images:
+        with open(os.path.join(folder, img_file), "rb") as f:
+            charts.append((img_file.replace("_drift.png", ""), f.read()))
+    return charts
+
+
+def model_version():
+    """Fecha del artefacto en uso: los resultados cacheados se invalidan si el modelo cambia."""
+    return file_mtime(MODEL_PATH) or file_mtime(os.path.join(LEAN_MODEL_DIR, "model.bin"))
+
+
+# ==============================
+# Puntuación en lote (cacheada)
+# ==============================
+# Variables para los escenarios: (etiqueta, mínimo, máximo)
+WHAT_IF_AXES = {
+    "AdoptionFee": ("Tarifa de adopción ($)", 0.0, 500.0),
+    "TimeInShelterDays": ("Días en refugio", 0.0, 200.0),
+    "AgeMonths": ("Edad (meses)", 1.0, 180.0),
+    "WeightKg": ("Peso (kg)", 0.5, 40.0),
+}
+
+
+@st.cache_data(max_entries=64)
+def score_what_if(base_items, x_col, x_range, y_col, y_range, steps, version):
+    """
+    Probabilidad en cada celda de la grilla x_range × y_range (steps puntos por eje),
+    con el resto de las variables de la mascota base. Toda la grilla se puntúa en
+    una sola llamada. Devuelve (valores de x, valores de y, matriz len(y) x len(x)).
+    """
+    x_values = np.linspace(*x_range, steps)
+    y_values = np.linspace(*y_range, steps)
+    grid = what_if_grid(dict(base_items), x_col, x_values, y_col, y_values)
+    _, probs = score_frame(load_batch_model(), grid)
+    return x_values, y_values, probs.reshape(len(y_values), len(x_values))
+
+
+@st.cache_data(max_entries=8)
+def score_csv(data, chunk_rows, version):
+    """CSV puntuado por bloques de `chunk_rows` filas (columnas Prediction y Probability agregadas)."""
+    batch_model = load_batch_model()
+    parts = []
+    for chunk in pd.read_csv(io.BytesIO(data), chunksize=chunk_rows):
+        preds, probs = score_frame(batch_model, chunk)
+        chunk["Prediction"] = preds
+        chunk["Probability"] = probs
+        parts.append(chunk)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def heatmap(x_values, y_values, probs, x_label, y_label, point=None):
+    """Mapa de calor de la probabilidad, con la curva del 50 % y la mascota base marcada."""
+    fig, ax = plt.subplots(figsize=(8, 5))
+    mesh = ax.pcolormesh(x_values, y_values, probs, cmap="viridis", vmin=0, vmax=1, shading="nearest")
+    if np.nanmin(probs) < 0.5 < np.nanmax(probs):
+        ax.contour(x_values, y_values, probs, levels=[0.5], colors="white", linewidths=1.5)
+    if point is not None:
+        ax.plot(*point, marker="*", markersize=14, color="red")
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    fig.colorbar(mesh, ax=ax, label="Probabilidad de adopción")
+    return fig
+
 # ==============================
 # Crear pestañas
 # ==============================
 # tab1, tab2 = st.tabs(["📈 Monitoreo del modelo", "🐕 Predicción de adopción"])
-tab2, tab1 = st.tabs(["🐕 Predicción de adopción", "📈 Monitoreo del modelo"])
+tab2, tab3, tab4, tab1 = st.tabs(["🐕 Predicción de adopción", "🧪 Escenarios", "📂 Puntuar CSV",
+                                  "📈 Monitoreo del modelo"])
 
 # ============================================================
 # 🧮 TAB 1: Monitoreo
@@ -45,7 +153,9 @@ with tab1:
     st.header("📊 Monitoreo y detección de Data Drift")
 
     try:
-        df_drift = pd.read_csv("drift_results.csv")
+        if file_mtime("drift_results.csv") is None:
+            raise FileNotFoundError("drift_results.csv")
+        df_drift = load_drift_results("drift_results.csv", file_mtime("drift_results.csv"))
         st.dataframe(df_drift, width="stretch")
 
         st.subheader("📉 Métricas de Drift (PSI y KS Test)")
@@ -65,10 +175,11 @@ with tab1:
 
     if os.path.exists("drift_charts"):
         cols = st.columns(3)
-        images = [f for f in os.listdir("drift_charts") if f.endswith(".png")]
-        for i, img_file in enumerate(images):
+        # El manifiesto se reescribe cada vez que cambia algún gráfico
+        version = file_mtime(os.path.join("drift_charts", "_manifest.json")) or file_mtime("drift_charts")
+        for i, (caption, image) in enumerate(load_drift_charts("drift_charts", version)):
             with cols[i % 3]:
-                st.image(os.path.join("drift_charts", img_file), caption=img_file.replace("_drift.png", ""))
+                st.image(image, caption=caption)
     else:
         st.info("Aún no se han generado gráficos de drift. Ejecuta `model_monitoring.py` para crearlos.")
 
@@ -101,6 +212,15 @@ with tab2:
         health_condition = st.selectbox("Condición médica", ["Saludable", "Con condición médica"])
         prev_owner = st.selectbox("¿Tuvo dueño previo?", ["Sí", "No"])
 
+    # Mascota con los valores originales (también es la base de los escenarios)
+    pet = {
+        "PetType": pet_type, "Breed": breed, "AgeMonths": age, "Color": color, "Size": size,
+        "WeightKg": weight, "Vaccinated": 1 if vaccinated == "Sí" else 0,
+        "HealthCondition": 1 if health_condition == "Con condición médica" else 0,
+        "TimeInShelterDays": time_in_shelter, "AdoptionFee": adoption_fee,
+        "PreviousOwner": 1 if prev_owner == "Sí" else 0,
+    }
+
     # Preparar entrada
     if st.button("🔍 Predecir probabilidad de adopción"):
         if model is None:
@@ -111,7 +231,7 @@ with tab2:
             color_map = {'Black': 0, 'Brown': 1, 'Gray': 2, 'Orange': 3, 'White': 4}
 
             # Construir DataFrame con columnas y valores esperados
-            input_data = pd.DataFrame([{
+            record = {
                 "AgeMonths": age,
                 "WeightKg": weight,
                 "TimeInShelterDays": time_in_shelter,
@@ -123,19 +243,26 @@ with tab2:
                 "Vaccinated": 1 if vaccinated == "Sí" else 0,
                 "HealthCondition": 1 if health_condition == "Con condición médica" else 0,
                 "PreviousOwner": 1 if prev_owner == "Sí" else 0
-            }])
+            }
+            input_data = pd.DataFrame([record])
 
-            # Reordenar columnas según el preprocessor
-            try:
-                expected_cols = list(model.named_steps['preprocessor'].feature_names_in_)
-                input_data = input_data[expected_cols]
-            except Exception as e:
-                st.warning("⚠️ No se pudieron reordenar las columnas automáticamente.")
-                st.write(e)
+            if isinstance(model, LeanModel):
+                # El artefacto lean aplica los mapas ordinales a los textos originales
+                result = model.score({**record, "Size": size, "Color": color})
+                pred, prob = result["prediction"], result["probability"]
+                input_data = input_data[model.expected]
+            else:
+                # Reordenar columnas según el preprocessor
+                try:
+                    expected_cols = list(model.named_steps['preprocessor'].feature_names_in_)
+                    input_data = input_data[expected_cols]
+                except Exception as e:
+                    st.warning("⚠️ No se pudieron reordenar las columnas automáticamente.")
+                    st.write(e)
 
-            # Predicción
-            pred = model.predict(input_data)[0]
-            prob = model.predict_proba(input_data)[0][1]
+                # Predicción y probabilidad en una sola pasada por el pipeline
+                preds, probs = predict_frame(model, input_data)
+                pred, prob = preds[0], probs[0]
 
             st.subheader("📋 Resultado:")
             if pred == 1:
@@ -147,6 +274,90 @@ with tab2:
             st.dataframe(input_data)
 
 
+# ============================================================
+# 🧪 TAB 3: Escenarios (qué pasaría si...)
+# ============================================================
+with tab3:
+    st.header("🧪 ¿Cómo cambia la probabilidad?")
+    st.markdown("Se toma la mascota de la pestaña **Predicción de adopción** y se varían dos de sus "
+                "variables. Toda la grilla se puntúa en un solo lote.")
+
+    col1, col2, col3 = st.columns(3)
+    axes = list(WHAT_IF_AXES)
+    with col1:
+        x_col = st.selectbox("Eje X", axes, index=0, format_func=lambda c: WHAT_IF_AXES[c][0])
+    with col2:
+        y_col = st.selectbox("Eje Y", [c for c in axes if c != x_col], index=0,
+                             format_func=lambda c: WHAT_IF_AXES[c][0])
+    with col3:
+        steps = st.slider("Puntos por eje", 10, 200, 51)
+
+    x_label, x_min, x_max = WHAT_IF_AXES[x_col]
+    y_label, y_min, y_max = WHAT_IF_AXES[y_col]
+    x_range = st.slider(x_label, x_min, x_max, (x_min, x_max))
+    y_range = st.slider(y_label, y_min, y_max, (y_min, y_max))
+
+    if model is None:
+        st.error("❌ No hay modelo cargado.")
+    else:
+        # Argumentos hashables: mismo escenario -> resultado cacheado sin volver a puntuar
+        x_values, y_values, probs = score_what_if(tuple(sorted(pet.items())), x_col, x_range, y_col, y_range,
+                                                  steps, model_version())
+        fig = heatmap(x_values, y_values, probs, x_label, y_label, point=(pet[x_col], pet[y_col]))
+        st.pyplot(fig)
+        plt.close(fig)
+        st.caption(f"{probs.size:,} combinaciones · ⭐ mascota actual · línea blanca: probabilidad del 50 %")
+
+        best = np.unravel_index(np.nanargmax(probs), probs.shape)
+        st.info(f"Máxima probabilidad ({probs[best]:.2%}) con {x_label.lower()} = {x_values[best[1]]:.1f} "
+                f"y {y_label.lower()} = {y_values[best[0]]:.1f}")
+
+
+# ============================================================
+# 📂 TAB 4: Puntuar CSV
+# ============================================================
+with tab4:
+    st.header("📂 Puntuar un CSV de mascotas")
+    st.markdown("El archivo debe tener las mismas columnas que `Base_de_datos.csv` (sin `AdoptionLikelihood`). "
+                "Se puntúa por bloques y el resultado queda en cache mientras no cambie el archivo ni el modelo.")
+
+    uploaded = st.file_uploader("Archivo CSV", type=["csv"])
+    chunk_rows = st.number_input("Filas por bloque", min_value=1000, max_value=1_000_000,
+                                 value=CSV_CHUNK_ROWS, step=10000)
+
+    if uploaded is not None:
+        if model is None:
+            st.error("❌ No hay modelo cargado.")
+        else:
+            try:
+                with st.spinner("Puntuando..."):
+                    scored = score_csv(uploaded.getvalue(), int(chunk_rows), model_version())
+            except (KeyError, ValueError, pd.errors.ParserError, UnicodeDecodeError) as e:
+                # Columnas faltantes, CSV mal formado o en otra codificación: mismo caso
+                # que el 400 de /predict_batch en la API
+                st.error(f"❌ No se pudo puntuar el archivo: {type(e).__name__}: {e}")
+                scored = None
+
+            if scored is not None and len(scored):
+                unscored = int(scored["Probability"].isna().sum())
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Mascotas", f"{len(scored):,}")
+                col2.metric("Probabilidad media", f"{scored['Probability'].mean():.2%}")
+                col3.metric("Alta probabilidad de adopción", f"{(scored['Prediction'] == 1).mean():.1%}")
+                if unscored:
+                    st.warning(f"⚠️ {unscored} filas no se pudieron puntuar (valores faltantes o no reconocidos).")
+
+                st.subheader("Distribución de probabilidades")
+                counts, edges = np.histogram(scored["Probability"].dropna(), bins=20, range=(0, 1))
+                st.bar_chart(pd.Series(counts, index=[f"{e:.2f}" for e in edges[:-1]], name="Mascotas"))
+
+                st.subheader("🐾 Mascotas con menor probabilidad de adopción")
+                st.dataframe(scored.nsmallest(20, "Probability"), width="stretch")
+
+                st.download_button("⬇️ Descargar resultados", scored.to_csv(index=False).encode("utf-8"),
+                                   file_name="mascotas_puntuadas.csv", mime="text/csv")
+
+
 # ============================================================
 # 🎨 Créditos
 # ============================================================
@@ -0,0 +1,117 @@
+# artifact_store.py
+# Almacén de artefactos versionado por contenido (splits, preprocesador, modelos).
+#
+# Cada artefacto se guarda como artifacts/<nombre>/<clave>.<ext>:
+# - DataFrames/Series en Arrow sin comprimir (se abren con memory-map)
+# - Cualquier otro objeto con joblib
+# La clave es un hash de las entradas (hash de los datos + configuración), así que
+# si las entradas no cambian la etapa puede reutilizar lo que ya está guardado.
+# artifacts/refs.json apunta a la última versión de cada nombre.
+
+import hashlib
+import json
+import os
+
+import joblib
+import pandas as pd
+import pyarrow as pa
+
+ARTIFACTS_DIR = "artifacts"
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class ArtifactStore:
+
+    def __init__(self, root=ARTIFACTS_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """Clave estable a partir de las entradas de una etapa."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _path(self, name, key, ext):
+        return os.path.join(self.root, name, f"{key}.{ext}")
+
+    def has(self, name, key):
+        return any(os.path.exists(self._path(name, key, ext)) for ext in ("arrow", "joblib"))
+
+    # --- Referencias a la última versión ---
+    def _refs_path(self):
+        return os.path.join(self.root, "refs.json")
+
+    def refs(self):
+        if not os.path.exists(self._refs_path()):
+            return {}
+        with open(self._refs_path()) as f:
+            return json.load(f)
+
+    def ref(self, name):
+        """Clave de la última versión guardada de `name`."""
+        refs = self.refs()
+        if name not in refs:
+            raise FileNotFoundError(f"No hay artefacto '{name}' en {self.root}. Ejecuta primero la etapa que lo genera.")
+        return refs[name]
+
+    def tag(self, names, key):
+        """Marca `key` como la versión actual de `names`."""
+        refs = self.refs()
+        refs.update({n: key for n in names})
+
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(refs, f, indent=2, sort_keys=True)
+        _atomic_write(self._refs_path(), write)
+
+    # --- Guardar / cargar ---
+    def put(self, name, key, obj, meta=None):
+        """Guarda `obj` como versión `key` de `name` y la marca como actual."""
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            is_series = isinstance(obj, pd.Series)
+            df = obj.to_frame() if is_series else obj
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}), b"series": b"1" if is_series else b"0"
+            })
+
+            def write(tmp):
+                with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            _atomic_write(self._path(name, key, "arrow"), write)
+        else:
+            _atomic_write(self._path(name, key, "joblib"), lambda tmp: joblib.dump(obj, tmp))
+
+        if meta is not None:
+            with open(self._path(name, key, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2, default=str)
+        self.tag([name], key)
+
+    def meta(self, name, key=None):
+        """Metadatos guardados junto con la versión `key` de `name` ({} si no hay)."""
+        path = self._path(name, key or self.ref(name), "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def get(self, name, key=None):
+        """Carga la versión `key` de `name` (por defecto la actual)."""
+        key = key or self.ref(name)
+        arrow_path = self._path(name, key, "arrow")
+        if os.path.exists(arrow_path):
+            # Memory-map: las columnas numéricas no se copian a memoria al cargar
+            with pa.memory_map(arrow_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas(split_blocks=True)
+            if (table.schema.metadata or {}).get(b"series") == b"1":
+                return df.iloc[:, 0]
+            return df
+        return joblib.load(self._path(name, key, "joblib"))
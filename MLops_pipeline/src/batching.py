@@ -0,0 +1,116 @@
+# batching.py
+# Agrupador de peticiones (micro-batching) para el servicio de predicción.
+
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class BatchStats:
+    """Métricas de tamaño de lote y tiempo en cola (últimas `window` peticiones)."""
+
+    def __init__(self, window=10000):
+        self.batches = 0
+        self.rows = 0
+        self.max_batch = 0
+        self.batch_sizes = Counter()
+        self.queue_ms = deque(maxlen=window)
+
+    def record(self, size, queue_ms):
+        self.batches += 1
+        self.rows += size
+        self.max_batch = max(self.max_batch, size)
+        self.batch_sizes[size] += 1
+        self.queue_ms.extend(queue_ms)
+
+    def as_dict(self):
+        q = np.array(self.queue_ms) if self.queue_ms else np.zeros(1)
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            "queue_ms_p50": float(np.percentile(q, 50)),
+            "queue_ms_p99": float(np.percentile(q, 99)),
+        }
+
+
+class MicroBatcher:
+    """
+    Junta peticiones concurrentes de un solo registro durante `max_wait_ms`
+    o hasta `max_batch_size` filas, las puntúa juntas con `score_fn` en un
+    hilo de trabajo y devuelve a cada llamador su propio resultado.
+
+    `score_fn(records)` debe devolver una lista alineada con `records` donde
+    cada elemento es el resultado o la excepción de ese registro.
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=5.0, workers=1):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self.stats = BatchStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batcher")
+        self._slots = None
+        self._queue = None
+        self._loop = None
+        self._tasks = set()
+
+    def _start(self):
+        # Se crea en el primer uso para quedar atado al event loop del servidor
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._keep(self._loop.create_task(self._collect()))
+
+    def _keep(self, task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def submit(self, record):
+        """Encola un registro y espera su resultado (o su excepción)."""
+        if self._loop is not asyncio.get_running_loop():
+            self._start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((record, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Esperar un hilo libre; mientras tanto siguen llegando peticiones a la cola
+            await self._slots.acquire()
+            self._keep(self._loop.create_task(self._dispatch(batch)))
+
+    async def _dispatch(self, batch):
+        records = [r for r, _, _ in batch]
+        start = time.perf_counter()
+        self.stats.record(len(batch), [(start - t) * 1000 for _, _, t in batch])
+        try:
+            results = await self._loop.run_in_executor(self._executor, self.score_fn, records)
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._slots.release()
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,477 @@
+# benchmarks.py
+# Mediciones de rendimiento reproducibles: ingeniería de características, fit y
+# predict de cada modelo de config.json, cálculo de drift y pruebas de carga de la
+# API en proceso, sobre datasets sintéticos de 10^3 a 10^7 filas con el esquema de
+# Base_de_datos.csv. Ejecutar desde MLops_pipeline/src:
+#
+#   python benchmarks.py                                   # 10^3, 10^4 y 10^5 filas
+#   python benchmarks.py --sizes 1000 1000000 --only fe,drift
+#   python benchmarks.py --only sparse --breeds 5000            # denso vs CSR float32 con muchas razas
+#   python benchmarks.py --save-baseline bench_baseline.json
+#   python benchmarks.py --baseline bench_baseline.json    # código de salida 1 si hay regresiones
+#
+# La parte de la API (serve, single) necesita RandomForest_model.pkl.
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PATH = "../../Base_de_datos.csv"
+DATA_DIR = "bench_data"
+SECTIONS = ("fe", "models", "drift", "sparse", "serve", "single")
+
+# Valores del dataset original (Base_de_datos.csv)
+PET_TYPES = np.array(["Dog", "Cat", "Rabbit", "Bird"])
+PET_TYPE_P = [0.26, 0.25, 0.25, 0.24]
+BREEDS = {"Dog": ["Golden Retriever", "Labrador", "Poodle"], "Cat": ["Siamese", "Persian"],
+          "Rabbit": ["Rabbit"], "Bird": ["Parakeet"]}
+COLORS = np.array(["Black", "Brown", "Gray", "Orange", "White"])
+SIZES = np.array(["Small", "Medium", "Large"])
+SIZE_P = [0.33, 0.36, 0.31]
+# Variables de entorno que cambian lo que se mide (quedan en los resultados)
+ENV_KEYS = ("FEATURE_MODE", "CAT_ENCODING", "CAT_MIN_FREQUENCY", "CAT_MAX_CATEGORIES", "CAT_HASH_FEATURES",
+            "PREDICTION_CACHE", "BATCHING", "MODEL_PATH", "DRIFT_WORKERS")
+
+
+# --- Datos sintéticos ---
+def _synthetic_chunk(rng, start, n, breeds=0):
+    pet_type = rng.choice(PET_TYPES, size=n, p=PET_TYPE_P)
+    breed = np.empty(n, dtype=object)
+    for kind, options in BREEDS.items():
+        mask = pet_type == kind
+        breed[mask] = rng.choice(options, size=int(mask.sum()))
+    df = pd.DataFrame({
+        "PetID": np.arange(start, start + n, dtype=np.int64),
+        "PetType": pet_type,
+        "Breed": breed,
+        "AgeMonths": rng.integers(1, 180, size=n),
+        "Color": rng.choice(COLORS, size=n),
+        "Size": rng.choice(SIZES, size=n, p=SIZE_P),
+        "WeightKg": np.round(rng.uniform(1, 30, size=n), 6),
+        "Vaccinated": (rng.random(n) < 0.70).astype(np.int8),
+        "HealthCondition": (rng.random(n) < 0.20).astype(np.int8),
+        "TimeInShelterDays": rng.integers(1, 90, size=n),
+        "AdoptionFee": rng.integers(0, 500, size=n),
+        "PreviousOwner": (rng.random(n) < 0.30).astype(np.int8),
+    })
+    # Etiqueta con una relación aprendible (como en el dataset real: tamaño mediano,
+    # cachorros, vacunados y sanos se adoptan más), ~33 % de positivos
+    logit = (-1.6 + 1.6 * (df["Size"] == "Medium") - 0.015 * (df["AgeMonths"] - 60)
+             + 1.2 * df["Vaccinated"] - 2.0 * df["HealthCondition"]
+             + 0.6 * df["Breed"].isin(["Labrador", "Golden Retriever"]) - 0.5 * (df["PetType"] == "Bird"))
+    df["AdoptionLikelihood"] = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(np.int8)
+    if breeds:
+        # Red de refugios con muchas razas: la mitad de las filas pasa a una de `breeds`
+        # mezclas con frecuencias tipo Zipf (pocas muy comunes y una cola larga)
+        mixed = rng.random(n) < 0.5
+        ids = (rng.zipf(1.3, size=int(mixed.sum())) - 1) % breeds
+        df.loc[mixed, "Breed"] = df.loc[mixed, "PetType"] + " mix " + pd.Series(ids, dtype=str).to_numpy()
+    return df
+
+
+def synthetic_dataset(n, seed=42, breeds=0, chunk_rows=1_000_000):
+    """
+    CSV sintético de `n` filas con el esquema de Base_de_datos.csv (con `breeds`
+    razas adicionales si es > 0). Se genera por bloques (cada uno con su propia
+    semilla, así que el resultado no depende del tamaño del bloque de escritura)
+    y se guarda en `bench_data/` para reutilizarlo.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    suffix = f"_b{breeds}" if breeds else ""
+    path = os.path.join(DATA_DIR, f"synthetic_{n}_{seed}{suffix}.csv")
+    if os.path.exists(path):
+        return path
+    tmp_path = path + ".tmp"
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, n, chunk_rows)):
+        rng = np.random.default_rng([seed, i])
+        chunk = _synthetic_chunk(rng, offset + 1, min(chunk_rows, n - offset), breeds)
+        chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    os.replace(tmp_path, path)
+    print(f"🧬 Dataset sintético {path} ({n:,} filas, {time.perf_counter() - start:.1f} s)")
+    return path
+
+
+# --- Medición ---
+def _timeit(fn, repeats):
+    """Ejecuta `fn` `repeats` veces; devuelve el último resultado y los tiempos."""
+    times, result = [], None
+    for _ in range(max(1, repeats)):
+        result = None
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, times
+
+
+def _record(results, name, n, times, **extra):
+    """Guarda una medición como `nombre@filas`; `seconds` (el mínimo) es lo que se compara."""
+    key = f"{name}@{n}"
+    results[key] = {"seconds": min(times), "median_seconds": float(np.median(times)),
+                    "runs": len(times), "rows": n, **extra}
+    print(f"  {key:<56} {min(times):>9.4f} s")
+    return results[key]
+
+
+def bench_feature_engineering(path, n, repeats, results):
+    """Carga (CSV en frío y desde el cache Arrow), split, fit_transform y perfil de referencia."""
+    from drift_engine import ReferenceProfile
+    from ft_engineering import _file_hash, build_split, load_dataset
+
+    data_hash = _file_hash(path)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def cold():
+            for f in os.listdir(cache_dir):
+                os.remove(os.path.join(cache_dir, f))
+            return load_dataset(path, cache_dir=cache_dir, data_hash=data_hash)
+        _, times = _timeit(cold, repeats)
+        _record(results, "fe.load_csv", n, times)
+        df, times = _timeit(lambda: load_dataset(path, cache_dir=cache_dir, data_hash=data_hash), repeats)
+        _record(results, "fe.load_cached", n, times)
+        # El DataFrame mapea el archivo del cache: se copia antes de borrar el directorio
+        df = df.copy()
+
+    split, times = _timeit(lambda: build_split(df), repeats)
+    _record(results, "fe.split", n, times)
+    X_train, X_test, y_train, y_test, preprocessor = split
+    del df
+
+    Xt_train, times = _timeit(lambda: preprocessor.fit_transform(X_train), repeats)
+    _record(results, "fe.fit_transform", n, times, features=int(Xt_train.shape[1]))
+    Xt_test, times = _timeit(lambda: preprocessor.transform(X_test), repeats)
+    _record(results, "fe.transform", n, times)
+
+    profile, times = _timeit(lambda: ReferenceProfile(X_train), repeats)
+    _record(results, "fe.reference_profile", n, times)
+    return {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test,
+            "Xt_train": Xt_train, "Xt_test": Xt_test, "profile": profile, "preprocessor": preprocessor}
+
+
+def bench_models(split, n, repeats, results, fit_rows, predict_rows):
+    """
+    Fit y predict_proba de cada modelo de config.json sobre las filas ya transformadas.
+    El fit usa a lo sumo `fit_rows` filas y el predict `predict_rows` (quedan en el resultado).
+    """
+    from model_registry import build_estimator, load_config
+
+    Xt_train, y_train = split["Xt_train"][:fit_rows], split["y_train"].to_numpy()[:fit_rows]
+    Xt_test = split["Xt_test"][:predict_rows]
+    for name, spec in load_config()["models"].items():
+        model, times = _timeit(lambda: build_estimator(spec).fit(Xt_train, y_train), repeats)
+        _record(results, f"model.{name}.fit", n, times, fit_rows=len(Xt_train))
+        _, times = _timeit(lambda: model.predict_proba(Xt_test), repeats)
+        _record(results, f"model.{name}.predict", n, times, predict_rows=len(Xt_test),
+                rows_per_second=len(Xt_test) / min(times))
+
+
+def _matrix_bytes(X):
+    if hasattr(X, "indptr"):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def bench_feature_modes(split, n, repeats, results, fit_rows, predict_rows, max_dense_mb=2000):
+    """
+    Salida densa (float64) contra compacta (CSR float32) con cada codificación de
+    las categóricas: memoria de la matriz, fit_transform, y fit/predict de los
+    modelos que aceptan matrices dispersas sin convertirlas (LogisticRegression, XGBoost).
+    La versión densa se omite si ocuparía más de `max_dense_mb`.
+    """
+    from ft_engineering import CAT_ENCODINGS, FEATURE_MODES, build_preprocessor, feature_params
+    from model_registry import build_estimator, load_config
+
+    specs = load_config()["models"]
+    cols = {name: list(c) for name, _, c in split["preprocessor"].transformers}
+    y_train = split["y_train"].to_numpy()[:fit_rows]
+    for encoding in CAT_ENCODINGS:
+        # Primero la compacta: su ancho dice cuánto ocuparía la densa
+        for mode in sorted(FEATURE_MODES, reverse=True):
+            prefix = f"features.{mode}.{encoding}"
+            if mode == "dense":
+                dense_mb = len(split["X_train"]) * width * 8 / 1e6
+                if dense_mb > max_dense_mb:
+                    print(f"  ⏭️ {prefix}@{n}: la matriz densa ocuparía ~{dense_mb:,.0f} MB, se omite")
+                    continue
+            pre = build_preprocessor(cols.get("num", []), cols.get("cat", []), cols.get("bin", []),
+                                     feature_params(mode, encoding))
+            Xt_train, times = _timeit(lambda: pre.fit_transform(split["X_train"]), repeats)
+            Xt_test = pre.transform(split["X_test"])[:predict_rows]
+            _record(results, f"{prefix}.fit_transform", n, times, features=int(Xt_train.shape[1]),
+                    matrix_mb=round(_matrix_bytes(Xt_train) / 1e6, 3), dtype=str(Xt_train.dtype))
+            width = Xt_train.shape[1]
+            Xt_fit = Xt_train[:fit_rows]
+            del Xt_train
+            for name in ("LogisticRegression", "XGBoost"):
+                model, times = _timeit(lambda: build_estimator(specs[name]).fit(Xt_fit, y_train), repeats)
+                _record(results, f"{prefix}.{name}.fit", n, times, fit_rows=Xt_fit.shape[0])
+                _, times = _timeit(lambda: model.predict_proba(Xt_test), repeats)
+                _record(results, f"{prefix}.{name}.predict", n, times, predict_rows=Xt_test.shape[0],
+                        rows_per_second=Xt_test.shape[0] / min(times))
+
+
+def bench_drift(split, n, repeats, results):
+    """compute_drift de model_monitoring.py: 60 % de X_test contra el perfil de referencia."""
+    from drift_engine import compute_drift
+
+    window = split["X_test"].sample(frac=0.6, random_state=42)
+    _, times = _timeit(lambda: compute_drift(split["profile"], window), repeats)
+    _record(results, "drift.compute_drift", n, times, window_rows=len(window))
+
+
+async def _load_test(client, url, payloads, concurrency):
+    """
+    Envía todos los `payloads` con a lo sumo `concurrency` peticiones a la vez
+    (un dict o lista va como JSON; bytes, como archivo CSV).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(payload):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            if isinstance(payload, bytes):
+                response = await client.post(url, files={"file": ("batch.csv", payload, "text/csv")})
+            else:
+                response = await client.post(url, json=payload)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    return time.perf_counter() - start, np.array(latencies) * 1000, errors
+
+
+def bench_serve(path, repeats, results, requests_per_level, concurrency, batch_rows):
+    """
+    Pruebas de carga de /predict (un registro en JSON) y /predict_batch (un CSV de
+    `batch_rows` registros) con un cliente HTTP en proceso (httpx + ASGI, sin red
+    ni uvicorn).
+    """
+    import httpx
+    import model_deploy
+
+    df = pd.read_csv(path).drop(columns=["PetID", "AdoptionLikelihood"])
+    records = df.to_dict(orient="records")
+    cases = {
+        "predict": [records[i % len(records)] for i in range(requests_per_level)],
+        "predict_batch": [df.iloc[np.arange(i * batch_rows, (i + 1) * batch_rows) % len(df)]
+                          .to_csv(index=False).encode() for i in range(requests_per_level)],
+    }
+
+    async def run():
+        transport = httpx.ASGITransport(app=model_deploy.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for endpoint, payloads in cases.items():
+                await _load_test(client, f"/{endpoint}", payloads[:concurrency[-1]], concurrency[-1])  # calentar
+                rows = batch_rows if endpoint == "predict_batch" else 1
+                for c in concurrency:
+                    runs = [await _load_test(client, f"/{endpoint}", payloads, c) for _ in range(max(1, repeats))]
+                    best = min(runs, key=lambda r: r[0])
+                    errors = sum(r[2] for r in runs)
+                    _record(results, f"serve.{endpoint}.c{c}", len(payloads), [r[0] for r in runs],
+                            requests=len(payloads), rows_per_request=rows,
+                            errors=errors, rps=len(payloads) / best[0], p50_ms=float(np.percentile(best[1], 50)),
+                            p99_ms=float(np.percentile(best[1], 99)))
+                    if errors:
+                        print(f"  ⚠️ {errors} respuestas con error en /{endpoint} (el tiempo no es comparable)")
+
+    asyncio.run(run())
+
+
+def _load_records(n=500):
+    """Registros de ejemplo con el mismo formato que recibe la API."""
+    df = pd.read_csv(PATH).drop(columns=['PetID', 'AdoptionLikelihood'], errors='ignore')
+    return df.head(n).to_dict(orient="records")
+
+
+def _latencies(fn, records, repeats=3):
+    times = []
+    for _ in range(repeats):
+        for r in records:
+            t0 = time.perf_counter()
+            fn(r)
+            times.append(time.perf_counter() - t0)
+    return np.array(times) * 1000
+
+
+def _summary(name, ms):
+    print(f"{name:<18} p50={np.percentile(ms, 50):.3f} ms  "
+          f"p99={np.percentile(ms, 99):.3f} ms  media={ms.mean():.3f} ms")
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_ms": float(ms.mean())}
+
+
+def bench_single_predict(n=500, repeats=3):
+    """Compara /predict con la ruta rápida contra la ruta con pandas."""
+    import model_deploy
+    from starlette.requests import Request
+    from starlette.responses import Response
+
+    loop = asyncio.new_event_loop()
+    records = _load_records(n)
+    entry = model_deploy.manager.default()
+    scorer = entry.fast_scorer
+
+    def call(record):
+        request = Request({"type": "http", "headers": []})
+        return loop.run_until_complete(model_deploy.predict(request=request, response=Response(), payload=record))
+
+    try:
+        # Ruta con pandas (fast_scorer deshabilitado)
+        entry.fast_scorer = None
+        slow_out = [call(r) for r in records]
+        slow_ms = _latencies(call, records, repeats)
+
+        entry.fast_scorer = scorer
+        fast_out = [call(r) for r in records]
+        fast_ms = _latencies(call, records, repeats)
+    finally:
+        entry.fast_scorer = scorer
+        loop.close()
+
+    assert fast_out == slow_out, "La ruta rápida no coincide con la ruta con pandas"
+
+    print(f"\n⏱️ /predict (1 registro) - {len(records)} registros x {repeats}")
+    results = {
+        "pandas": _summary("pandas + Pipeline", slow_ms),
+        "fast": _summary("ruta rápida", fast_ms),
+    }
+    print(f"Mejora p50: x{results['pandas']['p50_ms'] / results['fast']['p50_ms']:.1f}")
+    return results
+
+
+# --- Comparación con la línea base ---
+def compare(results, baseline, tolerance=0.2, min_seconds=0.005):
+    """
+    Mediciones que empeoraron más de `tolerance` (0.2 = 20 %) respecto de la línea
+    base. Las diferencias menores a `min_seconds` se consideran ruido.
+    """
+    rows, regressions = [], []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = current["seconds"] / base["seconds"] if base["seconds"] > 0 else float("inf")
+        regressed = ratio > 1 + tolerance and current["seconds"] - base["seconds"] > min_seconds
+        rows.append((key, base["seconds"], current["seconds"], ratio, regressed))
+        if regressed:
+            regressions.append(key)
+
+    if rows:
+        print(f"\n📏 Comparación con la línea base (tolerancia {tolerance:.0%})")
+        for key, base_s, cur_s, ratio, regressed in rows:
+            mark = "❌" if regressed else ("🚀" if ratio < 1 - tolerance else "✅")
+            print(f"  {mark} {key:<56} {base_s:>9.4f} s -> {cur_s:>9.4f} s  x{ratio:.2f}")
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"  (sin medir en esta corrida: {len(missing)} de la línea base)")
+    return regressions
+
+
+def _versions():
+    versions = {}
+    for module in ("numpy", "pandas", "sklearn", "xgboost", "pyarrow", "fastapi", "httpx"):
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            versions[module] = None
+    return versions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks reproducibles del pipeline y de la API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Filas de los datasets sintéticos (10^3 a 10^7)")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"Secciones a medir: {','.join(SECTIONS)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--breeds", type=int, default=0, help="Razas adicionales en los datos sintéticos")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones por medición (se compara el mínimo)")
+    parser.add_argument("--model-fit-rows", type=int, default=20000, help="Máximo de filas para el fit de los modelos")
+    parser.add_argument("--model-predict-rows", type=int, default=100000, help="Máximo de filas para el predict")
+    parser.add_argument("--max-dense-mb", type=int, default=2000,
+                        help="En la sección sparse, omitir matrices densas más grandes")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por nivel de concurrencia")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-rows", type=int, default=100, help="Registros por petición a /predict_batch")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--save-baseline", help="Además de --out, guardar esta corrida como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20 %%)")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Diferencias menores se ignoran (ruido)")
+    args = parser.parse_args(argv)
+
+    sections = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in sections if s not in SECTIONS]
+    if unknown:
+        parser.error(f"Secciones desconocidas: {unknown}")
+
+    results, datasets = {}, {}
+    started = time.time()
+    for n in sorted(args.sizes):
+        path = synthetic_dataset(n, args.seed, args.breeds)
+        datasets[n] = path
+        if not {"fe", "models", "drift", "sparse"} & set(sections):
+            continue
+        print(f"\n📊 {n:,} filas")
+        split = bench_feature_engineering(path, n, args.repeats, results)
+        if "models" in sections:
+            bench_models(split, n, args.repeats, results, args.model_fit_rows, args.model_predict_rows)
+        if "drift" in sections:
+            bench_drift(split, n, args.repeats, results)
+        if "sparse" in sections:
+            bench_feature_modes(split, n, args.repeats, results, args.model_fit_rows, args.model_predict_rows,
+                                args.max_dense_mb)
+        del split
+        gc.collect()
+    if "fe" not in sections:
+        results = {k: v for k, v in results.items() if not k.startswith("fe.")}
+
+    if "serve" in sections:
+        print(f"\n🌐 Carga en proceso ({args.requests} peticiones por nivel)")
+        bench_serve(datasets[min(datasets)], args.repeats, results, args.requests,
+                    sorted(args.concurrency), args.batch_rows)
+    single = bench_single_predict() if "single" in sections else None
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+                 "seconds": round(time.time() - started, 1),
+                 "python": sys.version.split()[0], "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(), "versions": _versions(), "args": vars(args),
+                 "env": {k: os.environ[k] for k in ENV_KEYS if k in os.environ}},
+        "results": results,
+        "single_predict": single,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance, args.min_seconds)
+        report["baseline"] = {"path": args.baseline, "timestamp": baseline["meta"]["timestamp"],
+                              "tolerance": args.tolerance, "regressions": regressions}
+
+    for out in filter(None, [args.out, args.save_baseline]):
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"💾 Resultados guardados en {out}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresiones: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# bulk_scoring.py
+# Scoring masivo fuera de la API: divide un CSV/Parquet en particiones y las
+# puntúa en paralelo con un pool de procesos (cada proceso carga el modelo una vez).
+#
+# Ejecutar desde MLops_pipeline/src:
+#   python bulk_scoring.py registro.csv --output scored/ --workers 8
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import joblib
+import pandas as pd
+import pyarrow.parquet as pq
+
+from prediction import prepare_dataframe, predict_frame
+
+# Modelo cargado una sola vez por proceso de trabajo
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = joblib.load(model_path)
+    # Un hilo por proceso: el paralelismo lo da el pool, no n_jobs=-1 del modelo
+    params = _worker_model.get_params()
+    if 'classifier__n_jobs' in params:
+        _worker_model.set_params(classifier__n_jobs=1)
+    if 'preprocessor__n_jobs' in params:
+        _worker_model.set_params(preprocessor__n_jobs=1)
+
+
+def _score_partition(idx, df, output_dir):
+    """Puntúa una partición y la escribe como part-XXXXX.parquet."""
+    t0 = time.perf_counter()
+    preds, probs = predict_frame(_worker_model, prepare_dataframe(df.copy(), _worker_model))
+    df["Prediction"] = preds
+    df["Probability"] = probs
+    df.to_parquet(os.path.join(output_dir, f"part-{idx:05d}.parquet"), index=False)
+    return idx, len(df), time.perf_counter() - t0
+
+
+def iter_partitions(path, partition_rows):
+    """Lee el archivo de entrada por particiones de `partition_rows` filas, en orden."""
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=partition_rows):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(path, chunksize=partition_rows) as reader:
+            yield from reader
+
+
+def bulk_score(input_path, output_dir, model_path="RandomForest_model.pkl",
+               workers=None, partition_rows=100_000):
+    """
+    Puntúa `input_path` y escribe las particiones en `output_dir`.
+    Leer los part-XXXXX.parquet en orden de nombre devuelve las filas en el
+    mismo orden que el archivo de entrada.
+    """
+    workers = workers or os.cpu_count()
+    os.makedirs(output_dir, exist_ok=True)
+    # Quitar particiones de una corrida anterior para no mezclar resultados
+    for old in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+        os.remove(old)
+
+    start = time.perf_counter()
+    partitions = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path,)) as pool:
+        pending = set()
+        for idx, chunk in enumerate(iter_partitions(input_path, partition_rows)):
+            pending.add(pool.submit(_score_partition, idx, chunk, output_dir))
+            # Limitar particiones en vuelo para que la memoria no crezca con el archivo
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                partitions.extend(f.result() for f in done)
+        partitions.extend(f.result() for f in wait(pending)[0])
+
+    elapsed = time.perf_counter() - start
+    rows = sum(n for _, n, _ in partitions)
+    report = {
+        "input": input_path,
+        "output_dir": output_dir,
+        "model": model_path,
+        "workers": workers,
+        "partitions": len(partitions),
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "partition_seconds": {f"part-{i:05d}": round(s, 3) for i, _, s in sorted(partitions)},
+    }
+    with open(os.path.join(output_dir, "_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"✅ {rows} filas puntuadas en {elapsed:.2f}s "
+          f"({report['rows_per_second']} filas/s, {len(partitions)} particiones, {workers} procesos)")
+    print(f"💾 Resultados en '{output_dir}' (reporte en _report.json)")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring masivo de mascotas con el modelo entrenado.")
+    parser.add_argument("input", help="Archivo CSV o Parquet a puntuar")
+    parser.add_argument("--output", default="bulk_scores", help="Carpeta de salida (Parquet particionado)")
+    parser.add_argument("--model", default="RandomForest_model.pkl", help="Pipeline entrenado (.pkl)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de trabajo (por defecto, todos los núcleos)")
+    parser.add_argument("--partition-rows", type=int, default=100_000, help="Filas por partición")
+    args = parser.parse_args()
+
+    bulk_score(args.input, args.output, args.model, args.workers, args.partition_rows)
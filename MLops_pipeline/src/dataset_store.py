@@ -0,0 +1,145 @@
+# dataset_store.py
+# Lotes nuevos de datos etiquetados (resultados de adopción que llegan después del
+# entrenamiento) y estadísticas acumuladas de las variables.
+#
+# Cada lote se guarda una sola vez como Arrow tipado en data_batches/ (el nombre
+# incluye el hash del contenido) y data_batches/manifest.json lleva el orden en que
+# llegaron. ft_engineering.py suma todos los lotes al CSV base en la reconstrucción
+# completa, e incremental_training.py usa solo los que todavía no se aplicaron.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+BATCHES_DIR = "data_batches"
+TARGET = "AdoptionLikelihood"
+
+
+def _frame_hash(df):
+    """Hash del contenido del lote (no depende del archivo de origen ni del orden de columnas)."""
+    df = df[sorted(df.columns)]
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+class DatasetStore:
+
+    def __init__(self, root=BATCHES_DIR):
+        self.root = root
+
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def batches(self):
+        """Lotes en orden de llegada: [{"hash", "file", "rows", "added_at"}]."""
+        if not os.path.exists(self._manifest_path()):
+            return []
+        with open(self._manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def append(self, df, required_columns):
+        """
+        Agrega un lote etiquetado. Devuelve su entrada del manifiesto y si es nuevo
+        (un lote con el mismo contenido no se agrega dos veces).
+        """
+        missing = [c for c in required_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en el lote: {missing}")
+        if df[TARGET].isna().any() or not df[TARGET].isin([0, 1]).all():
+            raise ValueError(f"{TARGET} debe ser 0 o 1 en todas las filas del lote")
+
+        digest = _frame_hash(df)
+        manifest = self.batches()
+        for entry in manifest:
+            if entry["hash"] == digest:
+                return entry, False
+
+        os.makedirs(self.root, exist_ok=True)
+        entry = {"hash": digest, "file": f"batch-{len(manifest) + 1:06d}-{digest[:12]}.arrow",
+                 "rows": len(df), "added_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        path = os.path.join(self.root, entry["file"])
+        feather.write_feather(df.reset_index(drop=True), path + ".tmp", compression="uncompressed")
+        os.replace(path + ".tmp", path)
+
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest + [entry], f, indent=2)
+        os.replace(tmp, self._manifest_path())
+        return entry, True
+
+    def load(self, entries=None):
+        """Lotes concatenados (todos o los de `entries`); DataFrame vacío si no hay."""
+        entries = self.batches() if entries is None else entries
+        frames = [feather.read_feather(os.path.join(self.root, e["file"])) for e in entries]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def combined_hash(self, base_hash, entries=None):
+        """Versión de los datos: el hash del CSV base más el de cada lote, en orden."""
+        entries = self.batches() if entries is None else entries
+        if not entries:
+            return base_hash
+        h = hashlib.sha256(base_hash.encode())
+        for e in entries:
+            h.update(e["hash"].encode())
+        return h.hexdigest()
+
+
+class FeatureStats:
+    """
+    Conteos exactos por valor, mínimo y máximo de cada columna, que se pueden
+    actualizar por lotes. De ahí salen la mediana y la moda (lo que calcula
+    SimpleImputer), el rango de MinMaxScaler y el conjunto de categorías sin
+    volver a recorrer los datos anteriores.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {}   # columna -> {valor: conteo}
+        self.min = {}
+        self.max = {}
+        self.numeric = set()
+
+    def update(self, X):
+        for col in X.columns:
+            values = X[col]
+            if pd.api.types.is_numeric_dtype(values):
+                self.numeric.add(col)
+                values = values.astype(np.float64)
+            counts = self.counts.setdefault(col, {})
+            # (las columnas category también cuentan sus categorías sin filas: se omiten)
+            for value, n in values.value_counts(dropna=True).items():
+                if n:
+                    counts[value] = counts.get(value, 0) + int(n)
+            if col in self.numeric and values.notna().any():
+                lo, hi = float(values.min()), float(values.max())
+                self.min[col] = min(self.min.get(col, lo), lo)
+                self.max[col] = max(self.max.get(col, hi), hi)
+        self.rows += len(X)
+        return self
+
+    def median(self, col):
+        """Mediana como np.median: con cantidad par, el promedio de los dos valores centrales."""
+        items = sorted(self.counts[col].items())
+        values = np.array([v for v, _ in items], dtype=np.float64)
+        cum = np.cumsum([n for _, n in items])
+        total = cum[-1]
+        lo = values[np.searchsorted(cum, (total - 1) // 2, side="right")]
+        hi = values[np.searchsorted(cum, total // 2, side="right")]
+        return (lo + hi) / 2
+
+    def mean(self, col):
+        counts = self.counts[col]
+        return sum(v * n for v, n in counts.items()) / sum(counts.values())
+
+    def most_frequent(self, col):
+        """Moda como SimpleImputer: ante un empate, el menor valor."""
+        counts = self.counts[col]
+        top = max(counts.values())
+        return min(v for v, n in counts.items() if n == top)
+
+    def categories(self, col):
+        return set(self.counts.get(col, {}))
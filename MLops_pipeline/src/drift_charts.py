@@ -0,0 +1,103 @@
+# drift_charts.py
+# Gráficos de drift (histograma de referencia vs. actual) con renderizado incremental.
+#
+# Cada gráfico se identifica por un hash de los histogramas que dibuja; si el hash
+# coincide con el de drift_charts/_manifest.json y el PNG existe, no se vuelve a
+# generar. Los que sí cambian se renderizan en paralelo en un pool de procesos.
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from drift_engine import PLOT_BINS
+
+CHARTS_DIR = "drift_charts"
+MANIFEST = "_manifest.json"
+# Subir si cambia el estilo de los gráficos para forzar que se regeneren
+CHART_VERSION = 1
+
+
+def chart_data(profile, X_new, col):
+    """Histogramas de densidad (referencia del perfil y ventana nueva) de una columna."""
+    ref_density, ref_edges = profile.histograms[col]
+    values = X_new[col].to_numpy(dtype=float)
+    new_density, new_edges = np.histogram(values[~np.isnan(values)], bins=PLOT_BINS, density=True)
+    return {"col": col, "ref": (ref_density, ref_edges), "new": (new_density, new_edges)}
+
+
+def chart_key(data):
+    """Hash del contenido del gráfico: mismos histogramas => mismo PNG."""
+    h = hashlib.sha256(f"{CHART_VERSION}:{data['col']}".encode())
+    for density, edges in (data["ref"], data["new"]):
+        h.update(np.ascontiguousarray(density, dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(edges, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def render_chart(data, path):
+    """Dibuja y guarda un gráfico (sin pyplot, para poder usarse desde varios procesos)."""
+    col = data["col"]
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    for (density, edges), label, color in ((data["ref"], "Histórico (train)", "skyblue"),
+                                           (data["new"], "Actual (new)", "salmon")):
+        ax.hist(edges[:-1], bins=edges, weights=density, alpha=0.5, label=label, color=color)
+    ax.set_title(f"Distribución de {col} - Histórico vs Actual")
+    ax.set_xlabel(col)
+    ax.set_ylabel("Densidad")
+    ax.legend()
+    fig.tight_layout()
+    # Escritura atómica: el dashboard nunca lee un PNG a medio escribir
+    tmp = path + ".tmp.png"
+    fig.savefig(tmp)
+    os.replace(tmp, path)
+    return col
+
+
+def render_drift_charts(profile, X_new, out_dir=CHARTS_DIR, workers=None):
+    """
+    Genera solo los gráficos cuyo contenido cambió. Devuelve (renderizados, omitidos).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    new_manifest, pending, skipped = {}, [], []
+    for col in profile.numeric:
+        data = chart_data(profile, X_new, col)
+        key = chart_key(data)
+        path = os.path.join(out_dir, f"{col}_drift.png")
+        new_manifest[col] = key
+        if manifest.get(col) == key and os.path.exists(path):
+            skipped.append(col)
+        else:
+            pending.append((data, path))
+
+    workers = workers or int(os.getenv("CHART_WORKERS", "0")) or os.cpu_count()
+    workers = min(workers, len(pending))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(render_chart, *zip(*pending)))
+    else:
+        rendered = [render_chart(data, path) for data, path in pending]
+
+    # Quitar gráficos de columnas que ya no se monitorean
+    for col in set(manifest) - set(new_manifest):
+        stale = os.path.join(out_dir, f"{col}_drift.png")
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    # Sin cambios no se toca el manifiesto (el dashboard usa su mtime como versión)
+    if new_manifest != manifest or rendered:
+        tmp = manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(new_manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, manifest_path)
+    return rendered, skipped
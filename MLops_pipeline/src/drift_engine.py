@@ -0,0 +1,224 @@
+# drift_engine.py
+# Motor de drift reutilizable: resume la distribución de referencia una sola vez
+# (ECDF por cuantiles, bordes de PSI, frecuencias de categorías) y compara contra
+# cualquier ventana nueva con KS, Chi² y PSI para todas las columnas.
+# ft_engineering.py guarda el perfil en el almacén de artefactos junto al split.
+#
+#   profile = ReferenceProfile(X_train)
+#   df_drift, psi_values = compute_drift(profile, X_new)
+#
+# Mientras la ECDF sea exacta, KS y PSI coinciden con ks_2samp y np.histogram.
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency, ks_2samp, kstwo
+
+P_VALUE_THRESHOLD = 0.05
+# Tamaño máximo con el que ks_2samp usa la distribución exacta (method='auto')
+KS_EXACT_MAX_N = 10000
+# Puntos máximos de la ECDF guardada por columna numérica
+PROFILE_MAX_POINTS = 4096
+# Bins de los histogramas de densidad usados en los gráficos de drift
+PLOT_BINS = 20
+PSI_THRESHOLD = 0.2
+
+
+def as_plain(df):
+    """Las categóricas del cache tipado se comparan como valores simples."""
+    df = pd.DataFrame(df)
+    cat_cols = df.select_dtypes(include=['category']).columns
+    if len(cat_cols):
+        df = df.copy()
+        for c in cat_cols:
+            df[c] = df[c].astype(object)
+    return df
+
+
+def psi_value(expected, actual):
+    """PSI entre dos vectores de proporciones por bin."""
+    return np.sum((expected - actual) * np.log((expected + 1e-6) / (actual + 1e-6)))
+
+
+def _ecdf_sketch(values, max_points):
+    """
+    (valores, conteos acumulados, n) de la ECDF. Con hasta `max_points` valores
+    distintos es exacta; si hay más, se reduce a `max_points` cuantiles con su
+    conteo exacto (KS aproximado, pero con memoria acotada).
+    """
+    values = values[~np.isnan(values.astype(float))]
+    uniques, counts = np.unique(values, return_counts=True)
+    if len(uniques) <= max_points:
+        return uniques, np.cumsum(counts), len(uniques)
+    ordered = np.sort(values)
+    points = np.unique(np.quantile(ordered, np.linspace(0, 1, max_points)).astype(ordered.dtype))
+    return points, np.searchsorted(ordered, points, side='right'), len(uniques)
+
+
+@lru_cache(maxsize=4096)
+def _ks_result(i, j, n1, n2):
+    """
+    (D, p-value) de KS para D = |i/n1 - j/n2|. El resultado solo depende de
+    (D, n1, n2), así que se calcula con dos muestras mínimas que producen el mismo
+    D y se reutiliza entre columnas y ventanas.
+    """
+    if max(n1, n2) > KS_EXACT_MAX_N:
+        # Aproximación asintótica, igual que ks_2samp con muestras grandes
+        d = abs(i / n1 - j / n2)
+        m, n = sorted([float(n1), float(n2)], reverse=True)
+        return np.float64(d), float(np.clip(kstwo.sf(d, np.round(m * n / (m + n))), 0, 1))
+    a = np.repeat([0.0, 1.0], [i, n1 - i])
+    b = np.repeat([0.0, 1.0], [j, n2 - j])
+    result = ks_2samp(a, b)
+    return result.statistic, result.pvalue
+
+
+class ReferenceProfile:
+    """
+    Resumen compacto de la distribución de referencia (por ejemplo, X_train).
+    No guarda filas: su tamaño depende del número de columnas y de `max_points`,
+    no del tamaño del conjunto de entrenamiento.
+    """
+
+    def __init__(self, reference, psi_bins=10, max_points=PROFILE_MAX_POINTS):
+        reference = as_plain(reference)
+        self.columns = list(reference.columns)
+        self.numeric = [c for c in self.columns if pd.api.types.is_numeric_dtype(reference[c])]
+        self.categorical = [c for c in self.columns if c not in self.numeric]
+        self.n_rows = len(reference)
+
+        # Numéricas: ECDF (valores y conteos acumulados) y bordes/proporciones de PSI
+        self.ecdf = {}
+        self.has_nan = {}
+        self.psi_edges = {}
+        self.psi_expected = {}
+        self.histograms = {}
+        for c in self.numeric:
+            values = reference[c].to_numpy()
+            self.ecdf[c] = _ecdf_sketch(values, max_points)
+            self.has_nan[c] = bool(np.isnan(values.astype(float)).any())
+            counts, edges = np.histogram(values, bins=psi_bins)
+            self.psi_edges[c] = edges
+            self.psi_expected[c] = counts / len(values)
+            self.histograms[c] = np.histogram(values, bins=PLOT_BINS, density=True)
+
+        # Categóricas: tabla de frecuencias
+        self.frequencies = {c: reference[c].value_counts(dropna=True).to_dict() for c in self.categorical}
+
+    @property
+    def exact(self):
+        """True si todas las ECDF son exactas (no se redujeron a cuantiles)."""
+        return all(len(v) == n for v, _, n in self.ecdf.values())
+
+    # --- Pruebas por columna ---
+    def ks(self, col, values):
+        """KS de dos muestras contra la ECDF de referencia (misma lógica que ks_2samp)."""
+        ref_values, ref_cum, _ = self.ecdf[col]
+        new = np.sort(values)
+        if self.has_nan[col] or np.isnan(new.astype(float)).any():
+            # ks_2samp propaga los NaN
+            return np.nan, np.nan
+        n1, n2 = self.n_rows, len(new)
+        data_all = np.concatenate([ref_values, new])
+        cdf1_counts = np.concatenate([[0], ref_cum])[np.searchsorted(ref_values, data_all, side='right')]
+        cdf2_counts = np.searchsorted(new, data_all, side='right')
+        cddiffs = cdf1_counts / n1 - cdf2_counts / n2
+        k_max, k_min = np.argmax(cddiffs), np.argmin(cddiffs)
+        k = k_min if -cddiffs[k_min] > cddiffs[k_max] else k_max
+        return _ks_result(int(cdf1_counts[k]), int(cdf2_counts[k]), n1, n2)
+
+    def chi2(self, col, values):
+        """Chi² de las frecuencias de referencia vs. la ventana, solo con categorías comunes."""
+        return self.chi2_from_counts(col, values.value_counts(dropna=True).to_dict())
+
+    def chi2_from_counts(self, col, window_counts):
+        """Chi² a partir de los conteos por categoría de la ventana; devuelve (p-value, alerta si no aplica)."""
+        reference_counts = self.frequencies[col]
+        comunes = sorted(set(reference_counts) & {v for v, n in window_counts.items() if n > 0}, key=str)
+        if len(comunes) <= 1:
+            return np.nan, "N/A (sin valores comunes o insuficientes)"
+        contingency = np.array([[reference_counts[v] for v in comunes],
+                                [window_counts[v] for v in comunes]])
+        _, p_value, _, _ = chi2_contingency(contingency, correction=False)
+        return p_value, None
+
+    def psi(self, col, values):
+        """Population Stability Index con los bordes de la referencia."""
+        actual, _ = np.histogram(values, bins=self.psi_edges[col])
+        return self.psi_from_counts(col, actual, len(values))
+
+    def psi_from_counts(self, col, counts, n):
+        """PSI a partir de los conteos de la ventana en los bins de la referencia (`n` filas)."""
+        return psi_value(self.psi_expected[col], counts / n)
+
+    # --- Conteos incrementales (monitoreo en línea) ---
+    def ks_buckets(self, col, values):
+        """
+        Conteos de `values` por tramo de la ECDF de referencia: el tramo k agrupa
+        los valores en (p[k-1], p[k]]. Sumar estos conteos entre lotes permite
+        evaluar KS sin guardar los valores.
+        """
+        ref_values = self.ecdf[col][0]
+        return np.bincount(np.searchsorted(ref_values, values, side='left'), minlength=len(ref_values) + 1)
+
+    def ks_from_buckets(self, col, buckets):
+        """KS aproximado: la diferencia de las ECDF se evalúa solo en los puntos de la referencia."""
+        _, ref_cum, _ = self.ecdf[col]
+        n1, n2 = self.n_rows, int(buckets.sum())
+        window_cum = np.cumsum(buckets)[:-1]
+        cddiffs = ref_cum / n1 - window_cum / n2
+        k_max, k_min = np.argmax(cddiffs), np.argmin(cddiffs)
+        k = k_min if -cddiffs[k_min] > cddiffs[k_max] else k_max
+        return _ks_result(int(ref_cum[k]), int(window_cum[k]), n1, n2)
+
+
+def _column_result(profile, col, window):
+    values = window[col]
+    if col in profile.ecdf:
+        stat, p_value = profile.ks(col, values.to_numpy())
+        return {
+            "Variable": col,
+            "Tipo": "Numérica",
+            "Métrica": "KS Test",
+            "Valor": stat,
+            "P-value": p_value,
+            "Alerta": "⚠️ Drift" if p_value < P_VALUE_THRESHOLD else "✅ Estable"
+        }, profile.psi(col, values.to_numpy())
+
+    p_value, na_alert = profile.chi2(col, values)
+    return {
+        "Variable": col,
+        "Tipo": "Categórica",
+        "Métrica": "Chi²",
+        "Valor": None,
+        "P-value": p_value,
+        "Alerta": na_alert or ("⚠️ Drift" if p_value < P_VALUE_THRESHOLD else "✅ Estable")
+    }, None
+
+
+def compute_drift(profile, window, workers=None):
+    """
+    Compara `window` contra `profile` en todas las columnas, en paralelo por columna.
+    Devuelve (DataFrame de resultados en el orden de las columnas, {columna: PSI}).
+    """
+    window = as_plain(window)
+    workers = workers or int(os.getenv("DRIFT_WORKERS", "0")) or os.cpu_count()
+    workers = max(1, min(workers, math.ceil(len(profile.columns) / 4)))
+    if workers == 1:
+        results = [_column_result(profile, c, window) for c in profile.columns]
+    else:
+        # numpy libera el GIL al ordenar/buscar, así que los hilos sí se reparten el trabajo
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda c: _column_result(profile, c, window), profile.columns))
+
+    df_drift = pd.DataFrame([row for row, _ in results])
+    psi_values = {row["Variable"]: psi for row, psi in results if psi is not None}
+    return df_drift, psi_values
+
+
+def psi_alert(psi_val):
+    return "⚠️ Alto Drift" if psi_val > PSI_THRESHOLD else "✅ Estable"
@@ -0,0 +1,99 @@
+# experiment_runner.py
+# Búsqueda de hiperparámetros definida en config.json (sección "training").
+# Cada corrida se identifica por el hash de su spec y de la versión de los datos:
+# las que ya están en experiments.db no se repiten y una búsqueda interrumpida
+# continúa donde quedó.
+#
+# Ejecutar desde MLops_pipeline/src (después de ft_engineering.py):
+#   python experiment_runner.py            # corre lo pendiente
+#   python experiment_runner.py --top 10   # solo muestra los mejores resultados
+
+import argparse
+import os
+
+import numpy as np
+from sklearn.metrics import f1_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+
+from artifact_store import ArtifactStore
+from fold_cache import TransformCache
+from model_registry import ResultsDB, build_estimator, expand_grid, load_config, run_id
+from training_scheduler import run_jobs
+
+SPLIT_ARTIFACTS = ('X_train', 'X_test', 'y_train', 'y_test', 'preprocessor')
+
+
+def prepare_folds(cv):
+    """
+    Matrices transformadas del holdout y de cada fold (el preprocesador se ajusta
+    una vez por fold). Devuelve (versión de los datos, folds, preprocesador del holdout).
+    """
+    store = ArtifactStore()
+    split_key = store.ref("X_train")
+    X_train, X_test, y_train, y_test, preprocessor = (store.get(n, split_key) for n in SPLIT_ARTIFACTS)
+    preprocessor.set_params(n_jobs=1)
+    cache = TransformCache(preprocessor, X_train, y_train)
+
+    fitted_pre, Xt_train, Xt_test = cache.full(X_test)
+    folds = {'holdout': (Xt_train, y_train, Xt_test, y_test)}
+    for i, (train_idx, test_idx) in enumerate(StratifiedKFold(n_splits=cv).split(X_train, y_train)):
+        _, Xt_fold_train, Xt_fold_test = cache.fold(train_idx, test_idx)
+        folds[i] = (Xt_fold_train, y_train.iloc[train_idx], Xt_fold_test, y_train.iloc[test_idx])
+    return split_key, folds, fitted_pre
+
+
+def run_sweep(batch_size=None, budget=None):
+    config = load_config()
+    cv = config.get("cv_folds", 5)
+    db = ResultsDB()
+    split_key, folds, _ = prepare_folds(cv)
+
+    runs = expand_grid(config)
+    done = db.done_ids()
+    pending = [(run_id(r, split_key, cv), r) for r in runs]
+    pending = [(rid, r) for rid, r in pending if rid not in done]
+    print(f"🧪 {len(runs)} corridas en la búsqueda: {len(runs) - len(pending)} ya hechas, {len(pending)} pendientes "
+          f"(datos {split_key})")
+
+    # Por lotes: cada lote queda guardado en la base antes de empezar el siguiente
+    budget = budget or os.cpu_count()
+    batch_size = batch_size or max(2, budget)
+    Xt_test, y_test = folds['holdout'][2], folds['holdout'][3]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        jobs = []
+        for rid, run in batch:
+            db.start(rid, run, split_key, cv)
+            model = build_estimator(run)
+            jobs.append({'kind': 'holdout', 'name': rid, 'model': model, 'fold': 'holdout'})
+            jobs.extend({'kind': 'cv', 'name': rid, 'model': model, 'fold': i} for i in range(cv))
+        outputs, report = run_jobs(jobs, folds, budget)
+
+        for rid, run in batch:
+            scores = np.array(outputs[('cv', rid)])
+            preds = outputs[('holdout', rid)].predict(Xt_test)
+            seconds = sum(s for k, s in report["job_seconds"].items() if k.split(":")[1] == rid)
+            db.finish(rid, {
+                "cv_f1_mean": float(scores.mean()),
+                "cv_f1_std": float(scores.std()),
+                "test_f1": float(f1_score(y_test, preds)),
+                "test_roc_auc": float(roc_auc_score(y_test, preds)),
+                "seconds": seconds,
+            })
+            print(f"  {run['name']:<20} F1 CV={scores.mean():.3f} ± {scores.std():.3f}  {run['params']}")
+        print(f"✅ Lote {start // batch_size + 1}: {len(batch)} corridas en {report['wall_seconds']}s")
+
+    print("\n🏆 Mejores corridas:")
+    print(db.top(10, data_version=split_key).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de modelos definida en config.json.")
+    parser.add_argument("--top", type=int, default=None, help="Solo mostrar las N mejores corridas guardadas")
+    parser.add_argument("--batch-size", type=int, default=None, help="Corridas por lote")
+    args = parser.parse_args()
+
+    if args.top:
+        print(ResultsDB().top(args.top).to_string(index=False))
+    else:
+        run_sweep(args.batch_size, int(os.getenv("TRAIN_CORES", "0")) or None)
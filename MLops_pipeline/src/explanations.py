@@ -0,0 +1,213 @@
+# explanations.py
+# Explicación de cada predicción: cuánto aporta cada variable original al resultado.
+#
+# Para los árboles se usa la descomposición por caminos: al bajar de un nodo a su
+# hijo, la predicción del árbol cambia en (valor del hijo - valor del padre) y ese
+# cambio se atribuye a la variable con la que se dividió el padre. Sumando los
+# cambios de todo el camino hasta la hoja, en todos los árboles:
+#
+#     predicción = valor base + suma de las contribuciones       (exacto)
+#
+# La suma a lo largo de cada camino se precalcula al cargar el modelo: una tabla
+# con la contribución acumulada hasta cada hoja, ya sumada por columna original
+# (las columnas one-hot, etc. se agrupan con `preprocessor.get_feature_names_out()`).
+# Explicar un lote es buscar la hoja de cada fila en cada árbol (`apply`, el mismo
+# recorrido de predict_proba) y sumar esas filas de la tabla con un producto disperso.
+#
+# - RandomForest, ExtraTrees, DecisionTree: en probabilidad de adopción.
+# - GradientBoosting: en log-odds (lo que suman sus etapas).
+# - XGBoost: en log-odds, con la misma descomposición por caminos que calcula el propio
+#   booster (`pred_contribs` con `approx_contribs=True`, no los valores SHAP).
+# - LogisticRegression: en log-odds, coeficiente x valor de cada columna transformada.
+
+import numpy as np
+from scipy import sparse
+
+from prediction_cache import row_keys
+
+# Clasificadores de sklearn cuyos árboles dan probabilidades (se promedian)
+PROBA_FORESTS = ('RandomForestClassifier', 'ExtraTreesClassifier', 'DecisionTreeClassifier')
+
+
+class Unsupported(Exception):
+    """El modelo no tiene una explicación exacta implementada."""
+
+
+def _node_values(tree, proba):
+    """Valor de cada nodo: P(clase 1) normalizada o el valor de la hoja de regresión."""
+    value = tree.value[:, 0, :].astype(np.float64)
+    if not proba:
+        return value[:, 0]
+    total = value.sum(axis=1)
+    total[total == 0.0] = 1.0
+    return value[:, 1] / total
+
+
+def _leaf_table(trees, groups, proba, scale):
+    """
+    Tabla (nodos de todos los árboles x columnas originales) con la contribución
+    acumulada desde la raíz hasta cada nodo, el inicio de cada árbol en la tabla y
+    la suma de los valores de las raíces. La contribución de una fila es la suma de
+    las filas de la tabla de sus hojas.
+    """
+    rows, cols, data, parents, offsets, base, offset = [], [], [], [], [], 0.0, 0
+    for tree in trees:
+        value = _node_values(tree, proba)
+        parent = np.full(tree.node_count, -1)
+        inner = np.flatnonzero(tree.children_left >= 0)
+        parent[tree.children_left[inner]] = inner
+        parent[tree.children_right[inner]] = inner
+        child = np.flatnonzero(parent >= 0)
+        # Bajar al hijo cambia la predicción y se atribuye a la variable que dividió al padre
+        rows.append(child + offset)
+        cols.append(tree.feature[parent[child]])
+        data.append((value[child] - value[parent[child]]) * scale)
+        parents.append(np.where(parent >= 0, parent + offset, -1))
+        offsets.append(offset)
+        base += value[0] * scale
+        offset += tree.node_count
+    deltas = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                               shape=(offset, groups.shape[0]))
+    table = (deltas @ groups).toarray()
+    parent = np.concatenate(parents)
+
+    # Acumular por niveles: primero los hijos de las raíces, después sus hijos, ...
+    level = np.flatnonzero(parent < 0)
+    while len(level):
+        children = np.flatnonzero(np.isin(parent, level))
+        table[children] += table[parent[children]]
+        level = children
+    return table, np.array(offsets), base
+
+
+def feature_groups(preprocessor):
+    """
+    (columnas originales, matriz columnas transformadas x originales) a partir de
+    get_feature_names_out(): "num__AgeMonths" -> AgeMonths, "cat__Breed_Poodle" -> Breed.
+    Las salidas del hashing mezclan columnas y quedan en un grupo "PetType+Breed".
+    """
+    owners = {name: list(cols) for name, _, cols in preprocessor.transformers_
+              if not isinstance(cols, slice) and name != 'remainder'}
+    owner_of = []
+    for out_name in preprocessor.get_feature_names_out():
+        block, rest = out_name.split("__", 1)
+        cols = owners[block]
+        if rest in cols:
+            owner_of.append(rest)
+        else:
+            # One-hot: "<columna>_<categoría>" (la columna más larga que sea prefijo)
+            matches = [c for c in cols if rest.startswith(c + "_")]
+            owner_of.append(max(matches, key=len) if matches else "+".join(cols))
+    # Columnas en el orden de entrada del preprocesador; los grupos del hashing al final
+    used = dict.fromkeys(owner_of)
+    columns = [c for c in preprocessor.feature_names_in_ if c in used]
+    columns += [c for c in used if c not in columns]
+    index = {c: i for i, c in enumerate(columns)}
+    targets = [index[c] for c in owner_of]
+    n_out = len(targets)
+    groups = sparse.csr_matrix((np.ones(n_out), (np.arange(n_out), targets)), shape=(n_out, len(columns)))
+    return columns, groups
+
+
+class TreeExplainer:
+    """
+    Explicaciones exactas del clasificador de un Pipeline (preprocesador + modelo).
+
+        explainer = TreeExplainer(pipeline)
+        contrib = explainer.contributions(X)   # X ya transformada: filas x columnas originales
+        # explainer.base_value + contrib.sum(axis=1) == probabilidad (o log-odds)
+        explainer.as_records(contrib, top=3)
+    """
+
+    def __init__(self, pipeline):
+        if not hasattr(pipeline, "steps"):
+            raise Unsupported("El modelo no es un Pipeline de sklearn")
+        self.classifier = pipeline.steps[-1][1]
+        self.kind = type(self.classifier).__name__
+        self.columns, self._groups = feature_groups(pipeline.steps[0][1])
+        n_features = self._groups.shape[0]
+        clf = self.classifier
+
+        if self.kind in PROBA_FORESTS:
+            trees = [est.tree_ for est in getattr(clf, "estimators_", [clf])]
+            self._table, self._offsets, self.base_value = _leaf_table(trees, self._groups, True, 1.0 / len(trees))
+            self.output = "probability"
+        elif self.kind == 'GradientBoostingClassifier':
+            if clf.estimators_.shape[1] != 1:
+                raise Unsupported("GradientBoosting multiclase")
+            trees = [est.tree_ for est in clf.estimators_[:, 0]]
+            self._table, self._offsets, base = _leaf_table(trees, self._groups, False, clf.learning_rate)
+            # Valor inicial (log-odds de la proporción de adopciones en el entrenamiento)
+            p = clf.init_.predict_proba(np.zeros((1, n_features)))[0, 1] if clf.init_ != 'zero' else 0.5
+            self.base_value = float(np.log(p / (1 - p))) + base
+            self.output = "log_odds"
+        elif self.kind == 'XGBClassifier':
+            # La última columna de pred_contribs es el valor base (igual para todas las filas)
+            self.base_value = float(self._xgb_contribs(np.zeros((1, n_features)))[0, -1])
+            self.output = "log_odds"
+        elif self.kind == 'LogisticRegression':
+            if clf.coef_.shape[0] != 1:
+                raise Unsupported("LogisticRegression multiclase")
+            self.base_value = float(clf.intercept_[0])
+            self.output = "log_odds"
+        else:
+            raise Unsupported(f"Explicaciones no disponibles para {self.kind}")
+
+    def _xgb_contribs(self, X):
+        import xgboost as xgb
+        # approx_contribs: la misma descomposición por caminos (también suma exacto al margen)
+        return self.classifier.get_booster().predict(xgb.DMatrix(X), pred_contribs=True, approx_contribs=True)
+
+    def contributions(self, X):
+        """Contribuciones por columna original (ndarray filas x len(self.columns))."""
+        clf = self.classifier
+        if self.kind == 'XGBClassifier':
+            contrib = self._xgb_contribs(X)[:, :-1].astype(np.float64)
+        elif self.kind == 'LogisticRegression':
+            contrib = X.multiply(clf.coef_[0]).tocsr() if sparse.issparse(X) else np.asarray(X) * clf.coef_[0]
+        else:
+            # Hoja de cada fila en cada árbol (lo mismo que recorre predict_proba)
+            leaves = clf.apply(X).reshape(X.shape[0], -1) + self._offsets
+            n_rows, n_trees = leaves.shape
+            hits = sparse.csr_matrix((np.ones(leaves.size), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+                                     shape=(n_rows, self._table.shape[0]))
+            return hits @ self._table
+        contrib = contrib @ self._groups
+        return contrib.toarray() if sparse.issparse(contrib) else np.asarray(contrib)
+
+    def as_records(self, contributions, top=None):
+        """Lista de {base_value, output, contributions} por fila, de mayor a menor impacto."""
+        results = []
+        for row in contributions:
+            order = np.argsort(-np.abs(row), kind="stable")[:top or None]
+            results.append({"base_value": self.base_value, "output": self.output,
+                            "contributions": {self.columns[j]: float(row[j]) for j in order}})
+        return results
+
+
+def cached_contributions(cache, X, version, explainer):
+    """
+    Contribuciones de las filas transformadas X usando `cache` (un PredictionCache)
+    con la misma clave canónica de las predicciones: solo se explican las filas que
+    no estaban guardadas, y las repetidas dentro del lote una sola vez.
+    """
+    if cache is None:
+        return explainer.contributions(X)
+    keys = row_keys(X, version)
+    found = cache.get_many(keys)
+    contrib = np.empty((len(keys), len(explainer.columns)), dtype=np.float64)
+    missing = {}
+    for i, (key, result) in enumerate(zip(keys, found)):
+        if result is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            contrib[i] = result[0]
+    if missing:
+        first = [rows[0] for rows in missing.values()]
+        new = explainer.contributions(X[first] if sparse.issparse(X) else np.asarray(X)[first])
+        for rows, values in zip(missing.values(), new):
+            contrib[rows] = values
+        # Copia por fila: una vista mantendría vivo el arreglo de todo el lote en cache
+        cache.put_many(list(missing), [row.copy() for row in new],
+                       [explainer.base_value] * len(new), version)
+    return contrib
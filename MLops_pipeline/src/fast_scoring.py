@@ -0,0 +1,160 @@
+# fast_scoring.py
+# Ruta rápida (sin pandas) para transformar registros con el preprocesador entrenado.
+
+import math
+
+import numpy as np
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, MinMaxScaler, OneHotEncoder
+
+from feature_encoding import to_float32
+# El llenado de la fila es el mismo del artefacto lean (que no depende de sklearn)
+from lean_model import Unsupported as _Unsupported, fill_record
+
+
+def _compile_steps(trans):
+    """
+    Valida el sub-pipeline de un bloque del ColumnTransformer.
+    Devuelve (imputer, scaler, ohe); los pasos que no existan quedan en None.
+    """
+    if isinstance(trans, Pipeline):
+        steps = [s for _, s in trans.steps if s not in (None, 'passthrough')]
+    else:
+        steps = [trans]
+
+    imputer, scaler, ohe = None, None, None
+    for step in steps:
+        if isinstance(step, SimpleImputer) and imputer is None and scaler is None and ohe is None:
+            if step.add_indicator or any(
+                isinstance(v, float) and math.isnan(v) for v in step.statistics_
+            ):
+                raise _Unsupported("SimpleImputer con indicador o columnas vacías")
+            if not (isinstance(step.missing_values, float) and math.isnan(step.missing_values)):
+                raise _Unsupported("SimpleImputer con missing_values distinto de NaN")
+            imputer = step
+        elif isinstance(step, MinMaxScaler) and scaler is None and ohe is None:
+            if step.clip:
+                raise _Unsupported("MinMaxScaler con clip")
+            scaler = step
+        elif isinstance(step, OneHotEncoder) and ohe is None and scaler is None:
+            if step.handle_unknown not in ('ignore', 'infrequent_if_exist') or step.drop_idx_ is not None:
+                raise _Unsupported("OneHotEncoder con drop/error")
+            ohe = step
+        elif isinstance(step, FunctionTransformer) and step.func is to_float32:
+            # Modo compacto: el paso a float32 se hace al final (`model_input`)
+            continue
+        else:
+            raise _Unsupported(f"Paso no soportado: {type(step).__name__}")
+    return imputer, scaler, ohe
+
+
+def _ohe_positions(ohe, i, offset):
+    """
+    ({categoría: columna de salida}, columna de las desconocidas o None, ancho) de
+    la columna `i` del OneHotEncoder. Las categorías poco frecuentes comparten la
+    última columna del bloque (y las desconocidas también, con 'infrequent_if_exist').
+    """
+    infrequent = getattr(ohe, 'infrequent_categories_', None) if getattr(ohe, '_infrequent_enabled', False) else None
+    infrequent = set(infrequent[i]) if infrequent is not None and infrequent[i] is not None else set()
+    frequent = [cat for cat in ohe.categories_[i] if cat not in infrequent]
+    lookup = {cat: offset + j for j, cat in enumerate(frequent)}
+    if not infrequent:
+        return lookup, None, len(frequent)
+    other = offset + len(frequent)
+    lookup.update({cat: other for cat in infrequent})
+    unknown = other if ohe.handle_unknown == 'infrequent_if_exist' else None
+    return lookup, unknown, len(frequent) + 1
+
+
+class CompiledScorer:
+    """
+    Precalcula los parámetros del ColumnTransformer (escala/offset de MinMax,
+    valores de imputación, índices del OneHotEncoder y mapas ordinales) para
+    construir directamente la fila numérica de cada registro; la API puntúa la
+    matriz con una sola llamada a `predict_proba` del clasificador.
+
+    Si un registro trae algo que la ruta rápida no reproduce exactamente
+    (columnas faltantes, textos que no están en los mapas, tipos raros),
+    `transform_many` lo marca en la máscara y se debe usar la ruta con pandas.
+    """
+
+    def __init__(self, pipeline, ordinal_maps=None):
+        if not isinstance(pipeline, Pipeline):
+            raise _Unsupported("El modelo no es un Pipeline de sklearn")
+        preprocessor = pipeline.named_steps.get('preprocessor')
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise _Unsupported("El pipeline no tiene un ColumnTransformer 'preprocessor'")
+
+        self.classifier = pipeline.steps[-1][1]
+        self.classes = self.classifier.classes_
+        self.expected = list(preprocessor.feature_names_in_)
+        self.ordinal_maps = ordinal_maps or {}
+
+        # Operaciones por columna de entrada
+        self._num_ops = []   # (col, fill, scale, offset, pos)
+        self._cat_ops = []   # (col, {categoría: pos}, pos de las desconocidas, valor si falta)
+        offset_out = 0
+        for name, trans, cols in preprocessor.transformers_:
+            if trans == 'drop' or len(cols) == 0:
+                continue
+            if name == 'remainder':
+                raise _Unsupported("ColumnTransformer con remainder distinto de 'drop'")
+            cols = [self.expected[c] if isinstance(c, (int, np.integer)) else c for c in cols]
+            imputer, scaler, ohe = _compile_steps(trans)
+            if ohe is not None:
+                for i, col in enumerate(cols):
+                    lookup, unknown, width = _ohe_positions(ohe, i, offset_out)
+                    fill = str(imputer.statistics_[i]) if imputer is not None else None
+                    self._cat_ops.append((col, lookup, unknown, fill))
+                    offset_out += width
+            else:
+                for i, col in enumerate(cols):
+                    fill = float(imputer.statistics_[i]) if imputer is not None else None
+                    scale = float(scaler.scale_[i]) if scaler is not None else None
+                    shift = float(scaler.min_[i]) if scaler is not None else None
+                    self._num_ops.append((col, fill, scale, shift, offset_out))
+                    offset_out += 1
+
+        self.n_features = offset_out
+        # Modelo entrenado con matrices CSR float32 (FEATURE_MODE=sparse)
+        self.sparse_input = bool(getattr(preprocessor, 'sparse_output_', False))
+        n_in = getattr(self.classifier, 'n_features_in_', offset_out)
+        if n_in != offset_out:
+            raise _Unsupported("El número de columnas transformadas no coincide con el clasificador")
+
+    def _fill(self, record, values):
+        """Escribe en `values` la fila transformada de un dict, o lanza _Unsupported."""
+        fill_record(self._num_ops, self._cat_ops, self.ordinal_maps, record, values)
+
+    def model_input(self, X):
+        """
+        Filas densas -> el formato con el que se entrenó el clasificador. En modo
+        compacto es CSR float32 (para XGBoost un cero ausente no es lo mismo que un 0.0).
+        """
+        if self.sparse_input:
+            return sparse.csr_matrix(X, dtype=np.float32)
+        return X
+
+    def transform_many(self, records):
+        """Matriz transformada y máscara de los registros que resuelve la ruta rápida."""
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        ok = np.zeros(len(records), dtype=bool)
+        for i, record in enumerate(records):
+            try:
+                self._fill(record, X[i])
+                ok[i] = True
+            except _Unsupported:
+                X[i] = 0.0
+        return X, ok
+
+
+def compile_scorer(pipeline, ordinal_maps=None):
+    """Compila la ruta rápida o devuelve None si el pipeline no es compatible."""
+    try:
+        return CompiledScorer(pipeline, ordinal_maps)
+    except (_Unsupported, AttributeError, KeyError) as e:
+        print(f"Ruta rápida deshabilitada: {e}")
+        return None
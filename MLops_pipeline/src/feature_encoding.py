@@ -0,0 +1,69 @@
+# feature_encoding.py
+# Piezas del preprocesamiento para el modo compacto (FEATURE_MODE=sparse): el paso
+# que deja cada bloque en float32 y un codificador por hashing para categóricas de
+# muchas categorías. Van dentro del pipeline guardado, así que la API también
+# necesita este módulo (solo depende de NumPy, SciPy y sklearn).
+
+import zlib
+
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import FunctionTransformer
+
+
+def to_float32(X):
+    """Misma matriz en float32 (densa o dispersa)."""
+    if sparse.issparse(X):
+        return X.astype(np.float32)
+    return np.asarray(X, dtype=np.float32)
+
+
+def float32_step():
+    """Paso final de los bloques numérico y binario en modo compacto."""
+    return FunctionTransformer(to_float32, accept_sparse=True, feature_names_out="one-to-one")
+
+
+def hash_bucket(column, value, n_features):
+    """Columna de salida de `value` en la columna de entrada número `column` (estable entre procesos)."""
+    return zlib.crc32(f"{column}={value}".encode()) % n_features
+
+
+class HashingEncoder(TransformerMixin, BaseEstimator):
+    """
+    One-hot por hashing: cada categoría va a una de `n_features` columnas según
+    un hash de (columna, valor), sin guardar el vocabulario. Sirve para columnas
+    con miles de categorías (o categorías nuevas que aparecen todo el tiempo);
+    a cambio, dos categorías pueden compartir columna. La salida es CSR.
+    """
+
+    def __init__(self, n_features=64, dtype=np.float32):
+        self.n_features = n_features
+        self.dtype = dtype
+
+    def fit(self, X, y=None):
+        if hasattr(X, "columns"):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=object)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Se esperaban {self.n_features_in_} columnas categóricas")
+        n_rows, n_cols = X.shape
+        cols = np.empty((n_rows, n_cols), dtype=np.int64)
+        for j in range(n_cols):
+            # Un hash por valor distinto, no por fila
+            values, inverse = np.unique(X[:, j].astype(str), return_inverse=True)
+            buckets = np.array([hash_bucket(j, v, self.n_features) for v in values], dtype=np.int64)
+            cols[:, j] = buckets[inverse.ravel()]
+        rows = np.repeat(np.arange(n_rows), n_cols)
+        data = np.ones(n_rows * n_cols, dtype=self.dtype)
+        # Si dos columnas caen en la misma posición, se suman (como FeatureHasher sin signo)
+        out = sparse.csr_matrix((data, (rows, cols.ravel())), shape=(n_rows, self.n_features))
+        out.sum_duplicates()
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray([f"hash_{i}" for i in range(self.n_features)], dtype=object)
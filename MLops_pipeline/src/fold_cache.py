@@ -0,0 +1,69 @@
+# fold_cache.py
+# Cache de preprocesadores ajustados y matrices transformadas por fold.
+# Cada par (fold, preprocesador) se ajusta y transforma una sola vez y lo
+# comparten todos los modelos candidatos.
+
+import hashlib
+import time
+
+from sklearn.base import clone
+
+
+class TransformCache:
+    """
+    Guarda (preprocesador ajustado, X_train transformado, X_eval transformado)
+    por fold. `fold` sirve para validación cruzada y `full` para el holdout.
+    """
+
+    def __init__(self, preprocessor, X, y):
+        self.preprocessor = preprocessor
+        self.X = X
+        self.y = y
+        self.hits = 0
+        self.misses = 0
+        self.fit_seconds = 0.0
+        # Reutilizaciones y cargas de las matrices dentro de los procesos del planificador
+        self.worker_hits = 0
+        self.worker_loads = 0
+        self._cache = {}
+
+    def _fit_transform(self, key, X_fit, X_eval):
+        if key in self._cache:
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        t0 = time.perf_counter()
+        pre = clone(self.preprocessor)
+        Xt_fit = pre.fit_transform(X_fit)
+        Xt_eval = pre.transform(X_eval)
+        self.fit_seconds += time.perf_counter() - t0
+        self._cache[key] = (pre, Xt_fit, Xt_eval)
+        return self._cache[key]
+
+    def fold(self, train_idx, test_idx):
+        """Preprocesador ajustado en X[train_idx] y las matrices de ambos lados del fold."""
+        key = ("fold", hashlib.sha1(train_idx.tobytes()).hexdigest(),
+               hashlib.sha1(test_idx.tobytes()).hexdigest())
+        return self._fit_transform(key, self.X.iloc[train_idx], self.X.iloc[test_idx])
+
+    def full(self, X_eval):
+        """Preprocesador ajustado en todo X y la matriz transformada de `X_eval` (holdout)."""
+        key = ("full", id(X_eval))
+        return self._fit_transform(key, self.X, X_eval)
+
+    def record_workers(self, cache):
+        """Suma el `cache` ({"hits", "misses"}) que devuelve run_jobs."""
+        self.worker_hits += cache["hits"]
+        self.worker_loads += cache["misses"]
+
+    def stats(self):
+        # Cargar un fold en un proceso no lo vuelve a ajustar: solo los hits cuentan como reutilización
+        hits = self.hits + self.worker_hits
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "fit_seconds": round(self.fit_seconds, 3),
+            "worker_loads": self.worker_loads,
+        }
@@ -1,23 +1,179 @@
 # Feature engineering
 
+import hashlib
+import os
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder, MinMaxScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
-import joblib
+
+from artifact_store import ArtifactStore
+from dataset_store import DatasetStore, FeatureStats
+from drift_engine import ReferenceProfile
+from feature_encoding import HashingEncoder, float32_step
 
 size_map = {'Small': 0, 'Medium': 1, 'Large': 2}              # Small < Medium < Large
 color_map = {'Black': 0, 'Brown': 1, 'Gray': 2, 'Orange': 3, 'White': 4}  # oscuro -> claro
 
+# Tipos explícitos del dataset (las columnas enteras con nulos pasan a float32, que las
+# representa exactas). WeightKg queda en float64: en float32 el peso se redondea y
+# cambian los cortes de los árboles.
+SCHEMA = {
+    'PetID': 'int32',
+    'PetType': 'category',
+    'Breed': 'category',
+    'AgeMonths': 'int16',
+    'Color': 'category',
+    'Size': 'category',
+    'WeightKg': 'float64',
+    'Vaccinated': 'int8',
+    'HealthCondition': 'int8',
+    'TimeInShelterDays': 'int16',
+    'AdoptionFee': 'int16',
+    'PreviousOwner': 'int8',
+    'AdoptionLikelihood': 'int8',
+}
+SCHEMA_VERSION = 2
+CACHE_DIR = "data_cache"
 
-def run_pipeline():
+# Parámetros del split (forman parte de la clave de los artefactos)
+SPLIT_PARAMS = {'test_size': 0.2, 'random_state': 42}
 
-    # Carga
-    PATH = "../../Base_de_datos.csv"   
-    df = pd.read_csv(PATH)
 
+def _number(value):
+    """"5" -> 5 (cantidad), "0.01" -> 0.01 (proporción), como espera OneHotEncoder."""
+    return int(value) if value.isdigit() else float(value)
+
+
+# Salida del preprocesador: "dense" (float64) o "sparse" (CSR float32, ocupa mucho
+# menos cuando hay muchas categorías; LogisticRegression, XGBoost y los árboles la aceptan)
+FEATURE_MODE = os.getenv("FEATURE_MODE", "dense")
+# Codificación de PetType/Breed: "onehot", "capped" (las categorías poco frecuentes
+# se agrupan en una sola columna) o "hashed" (columnas fijas por hash, sin vocabulario)
+CAT_ENCODING = os.getenv("CAT_ENCODING", "onehot")
+CAT_MIN_FREQUENCY = _number(os.getenv("CAT_MIN_FREQUENCY", "0.001"))
+CAT_MAX_CATEGORIES = int(os.getenv("CAT_MAX_CATEGORIES", "0")) or None
+CAT_HASH_FEATURES = int(os.getenv("CAT_HASH_FEATURES", "256"))
+FEATURE_MODES = ('dense', 'sparse')
+CAT_ENCODINGS = ('onehot', 'capped', 'hashed')
+
+
+def feature_params(mode=None, encoding=None):
+    """Configuración del preprocesador (también forma parte de la clave de los artefactos)."""
+    mode, encoding = mode or FEATURE_MODE, encoding or CAT_ENCODING
+    if mode not in FEATURE_MODES:
+        raise ValueError(f"FEATURE_MODE debe ser uno de {FEATURE_MODES}: {mode}")
+    if encoding not in CAT_ENCODINGS:
+        raise ValueError(f"CAT_ENCODING debe ser uno de {CAT_ENCODINGS}: {encoding}")
+    params = {'mode': mode, 'encoding': encoding}
+    if encoding == 'capped':
+        params.update(min_frequency=CAT_MIN_FREQUENCY, max_categories=CAT_MAX_CATEGORIES)
+    elif encoding == 'hashed':
+        params.update(n_features=CAT_HASH_FEATURES)
+    return params
+SPLIT_ARTIFACTS = ('X_train', 'X_test', 'y_train', 'y_test', 'preprocessor')
+
+
+def _file_hash(path, block_size=1 << 20):
+    """Hash del contenido del archivo fuente (invalida el cache si cambia)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _apply_schema(df):
+    """Convierte las columnas conocidas a los tipos de SCHEMA."""
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('int'):
+            values = pd.to_numeric(df[col], errors='coerce')
+            info = np.iinfo(dtype)
+            fits = values.notna().all() and values.between(info.min, info.max).all()
+            df[col] = values.astype(dtype if fits else 'float32')
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def load_dataset(path, cache_dir=CACHE_DIR, data_hash=None):
+    """
+    Carga el dataset con tipos explícitos (categorías, enteros angostos).
+    La primera vez convierte el CSV a un archivo Arrow sin comprimir en `cache_dir`;
+    las siguientes lo abren con memory-map. El cache se invalida con el hash del CSV.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(path))[0]
+    key = f"{(data_hash or _file_hash(path))[:16]}-v{SCHEMA_VERSION}"
+    cache_path = os.path.join(cache_dir, f"{base}.{key}.arrow")
+
+    if os.path.exists(cache_path):
+        with pa.memory_map(cache_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        print(f"Cache tipado: {cache_path}")
+        return table.to_pandas(split_blocks=True)
+
+    df = _apply_schema(pd.read_csv(path))
+    tmp_path = cache_path + ".tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+    # Borrar caches de versiones anteriores del mismo archivo
+    for old in os.listdir(cache_dir):
+        if old.startswith(base + ".") and old.endswith(".arrow") and old != os.path.basename(cache_path):
+            os.remove(os.path.join(cache_dir, old))
+    print(f"Cache tipado creado: {cache_path}")
+    return df
+
+
+def build_preprocessor(num_cols, cat_cols, bin_cols, params=None):
+    """ColumnTransformer según `feature_params()`: denso/compacto y codificación de las categóricas."""
+    params = params or feature_params()
+    compact = params['mode'] == 'sparse'
+
+    num_steps = [('imp', SimpleImputer(strategy='median')), ('scaler', MinMaxScaler())]
+    bin_steps = [('imp', SimpleImputer(strategy='most_frequent'))]  # 0/1
+    if compact:
+        num_steps.append(('f32', float32_step()))
+        bin_steps.append(('f32', float32_step()))
+
+    dtype = np.float32 if compact else np.float64
+    if params['encoding'] == 'hashed':
+        encoder = HashingEncoder(n_features=params['n_features'], dtype=dtype)
+    elif params['encoding'] == 'capped':
+        encoder = OneHotEncoder(handle_unknown='infrequent_if_exist', min_frequency=params['min_frequency'],
+                                max_categories=params['max_categories'], sparse_output=compact, dtype=dtype)
+    else:
+        encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=compact, dtype=dtype)
+
+    # pipelines simples
+    num_pipe = Pipeline(num_steps, memory=None)
+    cat_pipe = Pipeline([('imp', SimpleImputer(strategy='most_frequent')),
+                         ('ohe', encoder)
+                         ], memory=None)
+    bin_pipe = Pipeline(bin_steps, memory=None)
+
+    # ColumnTransformer
+    transformers = []
+    if num_cols: transformers.append(('num', num_pipe, num_cols))
+    if cat_cols: transformers.append(('cat', cat_pipe, cat_cols))
+    if bin_cols: transformers.append(('bin', bin_pipe, bin_cols))
+
+    # sparse_threshold: en modo compacto siempre CSR, en modo denso siempre denso
+    return ColumnTransformer(transformers=transformers, remainder='drop', n_jobs=-1,
+                             sparse_threshold=1.0 if compact else 0.0)
+
+
+def build_split(df, params=None):
+    """Separa target/features, mapea ordinales, arma el preprocesador y hace el split."""
     # borrar id si existe
     if 'PetID' in df.columns:
         df = df.drop(columns=['PetID'])
@@ -34,46 +190,81 @@ def run_pipeline():
     # transformar Size y Color a ordinal numérico (si existen)
     if 'Size' in X.columns:
         X['Size'] = X['Size'].fillna(X['Size'].mode()[0])
-        X['Size'] = X['Size'].map(size_map)
+        X['Size'] = X['Size'].map(size_map).astype('float32')
         X['Size'] = X['Size'].fillna(int(X['Size'].median()))
         # meter Size entre num_cols
         num_cols = num_cols + ['Size']
 
     if 'Color' in X.columns:
         X['Color'] = X['Color'].fillna(X['Color'].mode()[0])
-        X['Color'] = X['Color'].map(color_map)
+        X['Color'] = X['Color'].map(color_map).astype('float32')
         X['Color'] = X['Color'].fillna(int(X['Color'].median()))
         # meter Color entre num_cols
         num_cols = num_cols + ['Color']
 
-    # pipelines simples
-    num_pipe = Pipeline([('imp', SimpleImputer(strategy='median')),
-                         ('scaler', MinMaxScaler())
-                         ], memory=None)
-    cat_pipe = Pipeline([('imp', SimpleImputer(strategy='most_frequent')),
-                         ('ohe', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
-                         ], memory=None)
-    bin_pipe = Pipeline([('imp', SimpleImputer(strategy='most_frequent')) # 0/1
-                         ], memory=None) 
+    # Los tipos angostos son para guardar y abrir con memory-map; el preprocesador
+    # trabaja en float64 como con el CSV, así los modelos no cambian
+    X[num_cols + bin_cols] = X[num_cols + bin_cols].astype('float64')
 
-    # ColumnTransformer
-    transformers = []
-    if num_cols: transformers.append(('num', num_pipe, num_cols))
-    if cat_cols: transformers.append(('cat', cat_pipe, cat_cols))
-    if bin_cols: transformers.append(('bin', bin_pipe, bin_cols))
-
-    preprocessor = ColumnTransformer(transformers=transformers, remainder='drop', n_jobs=-1)
+    preprocessor = build_preprocessor(num_cols, cat_cols, bin_cols, params)
 
     # split estratificado
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, **SPLIT_PARAMS, stratify=y)
+    return X_train, X_test, y_train, y_test, preprocessor
+
+
+def run_pipeline():
 
-    # guardar lo necesario
-    joblib.dump((X_train, X_test, y_train, y_test, preprocessor), 'processed_data.pkl')
-    print("Guardado processed_data.pkl")
+    # Carga
+    PATH = "../../Base_de_datos.csv"   
+    store = ArtifactStore()
+    # Lotes etiquetados agregados después (incremental_training.py): forman parte de los datos
+    batches = DatasetStore()
+    entries = batches.batches()
+    csv_hash = _file_hash(PATH)
+    data_hash = batches.combined_hash(csv_hash, entries)
+    params = feature_params()
+    split_key = store.key(data_hash, SCHEMA_VERSION, SPLIT_PARAMS, params)
+
+    if all(store.has(name, split_key) for name in SPLIT_ARTIFACTS):
+        # Mismos datos y misma configuración: se reutiliza el split guardado
+        print(f"♻️ Split sin cambios ({split_key}), se reutiliza del almacén de artefactos")
+        X_train, X_test, y_train, y_test, preprocessor = (store.get(n, split_key) for n in SPLIT_ARTIFACTS)
+        store.tag(SPLIT_ARTIFACTS, split_key)
+    else:
+        df = load_dataset(PATH, data_hash=csv_hash)
+        if entries:
+            df = _apply_schema(pd.concat([df, batches.load(entries)], ignore_index=True))
+            print(f"➕ {len(entries)} lotes agregados ({sum(e['rows'] for e in entries)} filas)")
+        X_train, X_test, y_train, y_test, preprocessor = build_split(df, params)
+
+        # guardar cada pieza por separado
+        meta = {"data_hash": data_hash, "schema_version": SCHEMA_VERSION, "split": SPLIT_PARAMS,
+                "features": params, "batches": [e["hash"] for e in entries]}
+        for name, obj in zip(SPLIT_ARTIFACTS, (X_train, X_test, y_train, y_test, preprocessor)):
+            store.put(name, split_key, obj, meta=meta)
+        print(f"Guardado split {split_key} en '{store.root}/'")
     print("X_train:", X_train.shape, "X_test:", X_test.shape)
+
+    # Perfil de referencia para el monitoreo (no guarda filas de entrenamiento)
+    if store.has("reference_profile", split_key):
+        store.tag(["reference_profile"], split_key)
+    else:
+        profile = ReferenceProfile(X_train)
+        store.put("reference_profile", split_key, profile,
+                  meta={"data_hash": data_hash, "rows": profile.n_rows, "exact_ecdf": profile.exact})
+        print(f"📐 Perfil de referencia guardado ({len(profile.columns)} columnas, {profile.n_rows} filas resumidas)")
+
+    # Estadísticas acumulables de X_train: el punto de partida del reentrenamiento incremental
+    if store.has("feature_stats", split_key):
+        store.tag(["feature_stats"], split_key)
+    else:
+        store.put("feature_stats", split_key, FeatureStats().update(X_train))
     
     
     x_sample_transformed = preprocessor.fit_transform(X_train.head(20))
+    if hasattr(x_sample_transformed, "toarray"):
+        x_sample_transformed = x_sample_transformed.toarray()
 
     # Obtener nombres de columnas resultantes
     feature_names = preprocessor.get_feature_names_out()
@@ -0,0 +1,300 @@
+# incremental_training.py
+# Reentrenamiento incremental con lotes nuevos de datos etiquetados.
+#
+#   python incremental_training.py lote_2024_06.csv [lote_2024_07.csv ...] [--full]
+#
+# Cada lote se agrega a data_batches/ (dataset_store.py). En vez de repetir el
+# split, el preprocesamiento y todo el entrenamiento, los modelos desplegados
+# (<Modelo>_model.pkl) se actualizan:
+# - Imputadores: mediana/moda/media recalculadas con las estadísticas acumuladas
+#   (FeatureStats), sin volver a leer los datos anteriores.
+# - RandomForest/ExtraTrees y GradientBoosting: warm_start, se agregan árboles
+#   (o etapas) entrenados con el lote más una muestra de repaso de los datos anteriores.
+# - XGBoost: se continúa el booster existente con árboles nuevos.
+# - LogisticRegression: warm_start desde los coeficientes actuales, con el lote y
+#   una muestra de repaso ponderada para representar todos los datos anteriores.
+# - Otros (DecisionTree): se mantienen hasta la próxima reconstrucción.
+#
+# Los rangos de MinMaxScaler y las categorías del one-hot quedan fijos (los
+# modelos ya entrenados dependen de esas columnas); el script mide cuántas filas
+# caen fuera de ellos. La reconstrucción completa (ft_engineering.py +
+# model_training_evaluation.py con todos los lotes) se hace solo si hay drift
+# contra el perfil de referencia, si los datos crecieron demasiado, si aparecen
+# demasiadas categorías nuevas o valores fuera de rango, o con --full.
+
+import argparse
+import math
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score
+from sklearn.preprocessing import OneHotEncoder
+
+from artifact_store import ArtifactStore
+from dataset_store import TARGET, DatasetStore, FeatureStats
+from drift_engine import P_VALUE_THRESHOLD, PSI_THRESHOLD, compute_drift
+from ft_engineering import SPLIT_ARTIFACTS, _apply_schema, run_pipeline
+from lean_model import export_lean
+from model_registry import load_config
+from prediction import COLOR_MAP, SIZE_MAP, prepare_dataframe
+
+# Mapas ordinales que la API aplica a Size y Color (para el artefacto lean)
+ORDINAL_MAPS = {'Size': SIZE_MAP, 'Color': COLOR_MAP}
+
+# Umbrales para pedir la reconstrucción completa
+DRIFT_MIN_ROWS = int(os.getenv("DRIFT_MIN_ROWS", "500"))          # filas mínimas para evaluar drift
+DRIFT_MIN_COLUMNS = int(os.getenv("DRIFT_MIN_COLUMNS", "2"))      # columnas con p-value bajo
+INCREMENTAL_MAX_GROWTH = float(os.getenv("INCREMENTAL_MAX_GROWTH", "0.5"))  # filas nuevas / filas de X_train
+MAX_UNSEEN_SHARE = float(os.getenv("MAX_UNSEEN_SHARE", "0.01"))   # filas con categorías desconocidas
+MAX_OUT_OF_RANGE_SHARE = float(os.getenv("MAX_OUT_OF_RANGE_SHARE", "0.05"))  # fuera del rango de MinMax
+# Muestra de repaso: filas anteriores por cada fila nueva (mínimo 1000)
+REPLAY_RATIO = float(os.getenv("INCREMENTAL_REPLAY", "1.0"))
+REPLAY_MIN_ROWS = 1000
+
+# Clasificadores que se pueden continuar (el resto espera a la reconstrucción)
+TREE_ENSEMBLES = ('RandomForestClassifier', 'ExtraTreesClassifier', 'GradientBoostingClassifier')
+
+
+def _read_batch(path):
+    df = pd.read_csv(path)
+    return _apply_schema(df)
+
+
+def _prepare(df, pipe):
+    """Features como las ve el pipeline (Size/Color ordinales) y target."""
+    y = df[TARGET].astype(int)
+    X = prepare_dataframe(df.drop(columns=[TARGET]).copy(), pipe)
+    return X, y
+
+
+def _new_state(split_key):
+    return {"split": split_key, "applied": [], "rows": 0, "history": []}
+
+
+# --- Chequeos que deciden la reconstrucción ---
+def drift_check(profile, window):
+    """Motivos de reconstrucción según el drift de `window` contra el perfil de referencia."""
+    if len(window) < DRIFT_MIN_ROWS:
+        print(f"ℹ️ Drift no evaluado: {len(window)} filas (mínimo {DRIFT_MIN_ROWS})")
+        return []
+    df_drift, psi_values = compute_drift(profile, window)
+    reasons = [f"PSI {col} = {psi:.3f}" for col, psi in psi_values.items() if psi > PSI_THRESHOLD]
+    alerts = df_drift.loc[df_drift["P-value"] < P_VALUE_THRESHOLD, "Variable"].tolist()
+    if len(alerts) >= DRIFT_MIN_COLUMNS:
+        reasons.append(f"p-value < {P_VALUE_THRESHOLD} en {alerts}")
+    return reasons
+
+
+def coverage_check(pipe, X):
+    """Proporción de filas con categorías desconocidas y con valores fuera del rango de MinMax."""
+    pre = pipe.named_steps['preprocessor']
+    unseen = np.zeros(len(X), dtype=bool)
+    out_of_range = np.zeros(len(X), dtype=bool)
+    for name, transformer, cols in pre.transformers_:
+        if not hasattr(transformer, "named_steps"):
+            continue
+        steps = transformer.named_steps
+        if isinstance(steps.get('ohe'), OneHotEncoder):
+            for col, cats in zip(cols, steps['ohe'].categories_):
+                values = X[col].astype(object)
+                unseen |= values.notna().to_numpy() & ~values.isin(set(cats)).to_numpy()
+        if 'scaler' in steps:
+            scaler = steps['scaler']
+            values = X[cols].to_numpy(dtype=np.float64)
+            with np.errstate(invalid='ignore'):
+                outside = (values < scaler.data_min_) | (values > scaler.data_max_)
+            out_of_range |= outside.any(axis=1)
+    return float(unseen.mean()), float(out_of_range.mean())
+
+
+# --- Actualización de los modelos ---
+def update_imputers(pipe, stats):
+    """Estadísticas de los SimpleImputer recalculadas con los conteos acumulados."""
+    pre = pipe.named_steps['preprocessor']
+    for name, transformer, cols in pre.transformers_:
+        imputer = getattr(transformer, "named_steps", {}).get('imp')
+        if imputer is None:
+            continue
+        compute = {'median': stats.median, 'mean': stats.mean, 'most_frequent': stats.most_frequent}.get(imputer.strategy)
+        if compute is None:
+            continue
+        imputer.statistics_ = np.asarray([compute(c) for c in cols], dtype=imputer.statistics_.dtype)
+
+
+def added_estimators(base_estimators, new_rows, base_rows):
+    """Árboles nuevos en proporción a los datos nuevos (al menos uno)."""
+    return max(1, math.ceil(base_estimators * new_rows / base_rows))
+
+
+def continue_model(pipe, X, y, weight, base_estimators, base_rows, new_rows):
+    """
+    Continúa el clasificador del pipeline con (X, y). Devuelve una descripción
+    del cambio o None si el modelo no se puede continuar.
+    """
+    clf = pipe.named_steps['classifier']
+    kind = type(clf).__name__
+    Xt = pipe[:-1].transform(X)
+
+    if kind in TREE_ENSEMBLES:
+        before = clf.n_estimators
+        clf.set_params(warm_start=True, n_estimators=before + added_estimators(base_estimators, new_rows, base_rows))
+        with warnings.catch_warnings():
+            # class_weight="balanced_subsample" se calcula por árbol; el lote más el repaso
+            # mantiene la proporción de clases, así que la advertencia de warm_start no aplica
+            warnings.filterwarnings("ignore", message="class_weight presets")
+            clf.fit(Xt, y)
+        clf.set_params(warm_start=False)
+        return f"{before} → {clf.n_estimators} árboles"
+    if kind == 'XGBClassifier':
+        before = clf.get_booster().num_boosted_rounds()
+        total = clf.n_estimators
+        clf.set_params(n_estimators=added_estimators(base_estimators, new_rows, base_rows))
+        clf.fit(Xt, y, xgb_model=clf.get_booster())
+        clf.set_params(n_estimators=total + clf.n_estimators)
+        return f"{before} → {clf.get_booster().num_boosted_rounds()} árboles"
+    if kind == 'LogisticRegression':
+        clf.set_params(warm_start=True)
+        clf.fit(Xt, y, sample_weight=weight)
+        clf.set_params(warm_start=False)
+        return f"coeficientes continuados ({int(np.max(clf.n_iter_))} iteraciones)"
+    return None
+
+
+def _save_model(store, pipe, name, split_key, applied, summary):
+    tmp = f"{name}_model.pkl.tmp"
+    joblib.dump(pipe, tmp)
+    os.replace(tmp, f"{name}_model.pkl")   # la API lo recarga sin ver un archivo a medias
+    export_lean(pipe, ORDINAL_MAPS, f"{name}_lean")
+    store.put(f"{name}_model", store.key(split_key, name, applied), pipe,
+              meta={"split": split_key, "incremental": applied, "update": summary})
+
+
+def rebuild(reasons):
+    """Reconstrucción completa con el CSV base más todos los lotes."""
+    print(f"🔁 Reconstrucción completa: {'; '.join(reasons)}")
+    run_pipeline()
+    env = {**os.environ, "MPLBACKEND": "Agg"}
+    subprocess.run([sys.executable, "model_training_evaluation.py"], check=True, env=env)
+
+
+def incremental_update(paths, full=False, replay=REPLAY_RATIO, seed=42):
+    store = ArtifactStore()
+    split_key = store.ref("X_train")
+    X_train, _, y_train, _, _ = (store.get(n, split_key) for n in SPLIT_ARTIFACTS)
+    split_batches = set(store.meta("X_train", split_key).get("batches", []))
+    state = store.get("incremental_state", split_key) if store.has("incremental_state", split_key) \
+        else _new_state(split_key)
+
+    # Modelos desplegados que se van a actualizar
+    config = load_config()
+    models = {name: joblib.load(f"{name}_model.pkl") for name in config["models"]
+              if os.path.exists(f"{name}_model.pkl")}
+    if not models:
+        raise FileNotFoundError("No hay modelos entrenados (*_model.pkl). Ejecuta model_training_evaluation.py.")
+    reference_pipe = next(iter(models.values()))
+
+    # 1) Agregar los lotes al almacén de datos
+    batches = DatasetStore()
+    required = list(X_train.columns) + [TARGET]
+    for path in paths:
+        entry, is_new = batches.append(_read_batch(path), required)
+        print(f"{'➕' if is_new else '♻️'} {path}: {entry['rows']} filas "
+              f"({'nuevo' if is_new else 'ya estaba'}, {entry['hash'][:12]})")
+
+    done = split_batches | set(state["applied"])
+    pending = [e for e in batches.batches() if e["hash"] not in done]
+    if not pending and not full:
+        print("✅ No hay lotes pendientes")
+        return state
+    previous = [e for e in batches.batches() if e["hash"] in state["applied"]]
+    X_new, y_new = _prepare(batches.load(pending), reference_pipe) if pending else (X_train.iloc[:0], y_train.iloc[:0])
+    X_prev, y_prev = _prepare(batches.load(previous), reference_pipe) if previous else (X_train.iloc[:0], y_train.iloc[:0])
+
+    # 2) ¿Alcanza con actualizar o hay que reconstruir?
+    reasons = ["--full"] if full else []
+    if len(X_new):
+        profile = store.get("reference_profile", split_key)
+        reasons += drift_check(profile, pd.concat([X_prev, X_new], ignore_index=True))
+        growth = (state["rows"] + len(X_new)) / len(X_train)
+        if growth > INCREMENTAL_MAX_GROWTH:
+            reasons.append(f"{growth:.0%} más filas que X_train (máximo {INCREMENTAL_MAX_GROWTH:.0%})")
+        unseen, out_of_range = coverage_check(reference_pipe, X_new)
+        print(f"🔎 Categorías desconocidas: {unseen:.2%} de las filas · fuera del rango de MinMax: {out_of_range:.2%}")
+        if unseen > MAX_UNSEEN_SHARE:
+            reasons.append(f"{unseen:.1%} de filas con categorías desconocidas")
+        if out_of_range > MAX_OUT_OF_RANGE_SHARE:
+            reasons.append(f"{out_of_range:.1%} de filas fuera del rango de MinMax")
+    if reasons:
+        rebuild(reasons)
+        return None
+
+    # 3) Actualización incremental
+    start = time.perf_counter()
+    # Conteos acumulados: X_train (guardados por ft_engineering) más los lotes ya aplicados
+    if "stats" in state:
+        stats = state["stats"]
+    elif store.has("feature_stats", split_key):
+        stats = store.get("feature_stats", split_key)
+    else:
+        stats = FeatureStats().update(X_train)
+    stats.update(X_new)
+
+    # Muestra de repaso de los datos anteriores (X_train + lotes ya aplicados)
+    X_old = pd.concat([X_train, X_prev], ignore_index=True)
+    y_old = pd.concat([y_train, y_prev], ignore_index=True)
+    rng = np.random.default_rng(seed + len(state["applied"]))
+    n_replay = min(len(X_old), max(int(len(X_new) * replay), REPLAY_MIN_ROWS))
+    idx = rng.choice(len(X_old), size=n_replay, replace=False)
+    X_fit = pd.concat([X_new, X_old.iloc[idx]], ignore_index=True)
+    y_fit = pd.concat([y_new, y_old.iloc[idx]], ignore_index=True)
+    # Para LogisticRegression el repaso pesa como todos los datos anteriores
+    weight = np.concatenate([np.ones(len(X_new)), np.full(n_replay, len(X_old) / n_replay)])
+
+    applied = state["applied"] + [e["hash"] for e in pending]
+    record = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "batches": [e["hash"] for e in pending],
+              "rows": len(X_new), "replay_rows": n_replay, "models": {}}
+    if y_fit.nunique() < 2:
+        print("⚠️ El lote y la muestra de repaso tienen una sola clase: los modelos no se actualizan")
+    else:
+        for name, pipe in models.items():
+            # F1 del modelo actual sobre el lote nuevo, antes de verlo (evaluación prequential)
+            f1_before = f1_score(y_new, pipe.predict(X_new), zero_division=0)
+            base_estimators = config["models"][name].get("params", {}).get("n_estimators", 100)
+            t0 = time.perf_counter()
+            update_imputers(pipe, stats)
+            summary = continue_model(pipe, X_fit, y_fit, weight, base_estimators, len(X_train), len(X_new))
+            if summary is None:
+                print(f"⏭️ {name}: no admite entrenamiento incremental, se mantiene hasta la próxima reconstrucción")
+                continue
+            seconds = time.perf_counter() - t0
+            print(f"🧩 {name}: {summary} en {seconds:.2f}s (F1 en el lote antes de actualizar: {f1_before:.3f})")
+            _save_model(store, pipe, name, split_key, applied, summary)
+            record["models"][name] = {"f1_before": round(float(f1_before), 4), "update": summary,
+                                      "seconds": round(seconds, 3)}
+
+    state.update(applied=applied, rows=state["rows"] + len(X_new), stats=stats)
+    state["history"].append(record)
+    store.put("incremental_state", split_key, state)
+    print(f"✅ {len(pending)} lotes aplicados en {time.perf_counter() - start:.2f}s "
+          f"({state['rows']} filas desde la última reconstrucción)")
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reentrenamiento incremental con lotes nuevos de datos etiquetados")
+    parser.add_argument("batches", nargs="*", help="CSV con las mismas columnas que Base_de_datos.csv")
+    parser.add_argument("--full", action="store_true", help="Forzar la reconstrucción completa")
+    parser.add_argument("--replay", type=float, default=REPLAY_RATIO,
+                        help="Filas anteriores de repaso por cada fila nueva")
+    args = parser.parse_args(argv)
+    incremental_update(args.batches, full=args.full, replay=args.replay)
+
+
+if __name__ == "__main__":
+    main()
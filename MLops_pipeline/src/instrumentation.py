@@ -0,0 +1,338 @@
+# instrumentation.py
+# Métricas del servicio en formato de texto de Prometheus (sin dependencias extra):
+# histogramas de tiempo por etapa, filas por lote, peticiones en curso y errores,
+# más un profiler por muestreo que se activa a pedido.
+#
+#   with stage("prepare"):
+#       df = prepare_dataframe(df, model)
+#
+#   GET /metrics  ->  scoring_stage_seconds_bucket{stage="prepare",le="0.005"} 42 ...
+
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# Límites de los histogramas (segundos y filas)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class CounterMetric(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class GaugeMetric(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class HistogramMetric(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Índice del primer límite >= value (el último es +Inf)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, n = value
+        lines, acc = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            acc += count
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (_number(bound),))} {acc}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(float(total))}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    """Métricas registradas más funciones que calculan valores al momento de consultarlas."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(CounterMetric(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(GaugeMetric(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(HistogramMetric(name, help_text, labelnames, buckets))
+
+    def collector(self, fn):
+        """`fn()` devuelve métricas ya armadas (lista de _Metric) en cada consulta."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            try:
+                for metric in fn():
+                    lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# colector {getattr(fn, '__name__', fn)} falló: {type(e).__name__}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Registro por defecto del servicio
+metrics = Registry()
+STAGE_SECONDS = metrics.histogram(
+    "scoring_stage_seconds", "Tiempo por etapa del scoring (cache incluye el predict_proba de las filas nuevas)", ["stage"])
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP", ["path", "method", "status"])
+IN_FLIGHT = metrics.gauge("http_requests_in_flight", "Peticiones en curso", ["path"])
+BATCH_ROWS = metrics.histogram("scoring_batch_rows", "Filas puntuadas por petición o lote", ["endpoint"], ROW_BUCKETS)
+ERRORS = metrics.counter("scoring_errors_total", "Errores al puntuar", ["endpoint", "type"])
+
+
+@contextmanager
+def stage(name):
+    """Mide el bloque y lo suma al histograma de la etapa `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def timed_handler(fn):
+    """
+    Marca el inicio y el fin del handler (necesita el parámetro `request`), para
+    que el middleware separe la lectura/parseo del body y la serialización de la
+    respuesta del tiempo del propio handler. FastAPI pasa `request` por nombre; en
+    llamadas directas (benchmarks, tests) también puede ir por posición.
+    """
+    position = list(inspect.signature(fn).parameters).index("request")
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        request = kwargs["request"] if "request" in kwargs else args[position]
+        state = request.state
+        state.handler_start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            state.handler_end = time.perf_counter()
+    return wrapper
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: peticiones en curso, duración por ruta y etapas de parseo/serialización."""
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _path_label(self, scope):
+        # Rutas con parámetros se agrupan por su plantilla para no crear una serie por valor
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        if self._paths is None:
+            router = getattr(self.app, "router", None) or getattr(scope.get("app"), "router", None)
+            self._paths = {r.path for r in getattr(router, "routes", []) if "{" not in r.path}
+        return scope["path"] if scope["path"] in self._paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        in_flight_path = self._path_label(scope)
+        IN_FLIGHT.inc(path=in_flight_path)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                state = scope.get("state") or {}
+                if "handler_start" in state:
+                    STAGE_SECONDS.observe(state["handler_start"] - start, stage="parse_request")
+                if "handler_end" in state:
+                    STAGE_SECONDS.observe(time.perf_counter() - state["handler_end"], stage="serialize_response")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec(path=in_flight_path)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, path=self._path_label(scope),
+                                    method=scope["method"], status=str(status["code"]))
+
+
+# --- Profiler por muestreo ---
+# Funciones donde un hilo está esperando, no trabajando
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("thread.py", "_worker"),
+               ("queue.py", "get")}
+
+
+class SamplingProfiler:
+    """
+    Cada `interval` segundos toma la pila de Python de todos los hilos (sin
+    detenerlos) y cuenta cuántas veces aparece cada función. Sirve para ver dónde
+    se va el tiempo bajo carga real sin herramientas externas; cuesta un poco de
+    CPU mientras está activo, por eso se enciende a pedido.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        # El hilo de muestreo agrega pilas mientras /debug/profile lee el informe
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            self.stacks, self.samples = Counter(), 0
+        self.started_at, self.stopped_at = time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.time()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            tick = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append((os.path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                if not stack or stack[0][:2] in IDLE_FRAMES:
+                    continue
+                tick.append(tuple(reversed(stack)))
+            with self._lock:
+                self.stacks.update(tick)
+                self.samples += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return Counter(self.stacks), self.samples
+
+    def report(self, top=25):
+        """Funciones con más muestras: propias (hoja de la pila) y acumuladas."""
+        stacks, samples = self._snapshot()
+        own, cumulative = Counter(), Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for func in set(stack):
+                cumulative[func] += count
+        busy = sum(stacks.values())
+        total = busy or 1
+
+        def rows(counter):
+            return [{"function": f"{name} ({file}:{line})", "samples": n, "pct": round(100 * n / total, 2)}
+                    for (file, name, line), n in counter.most_common(top)]
+        end = self.stopped_at or time.time()
+        return {"running": self.running, "interval_ms": self.interval * 1000, "ticks": samples,
+                "busy_samples": busy,
+                "seconds": round(end - self.started_at, 2) if self.started_at else 0.0,
+                "top_self": rows(own), "top_cumulative": rows(cumulative)}
+
+    def collapsed(self):
+        """Pilas en formato "a;b;c cantidad" (flamegraph.pl, speedscope)."""
+        stacks, _ = self._snapshot()
+        return "\n".join(";".join(f"{name} ({file}:{line})" for file, name, line in stack) + f" {count}"
+                         for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,85 @@
+# lean_deploy.py
+# API liviana que puntúa con el artefacto lean (solo NumPy): no importa sklearn,
+# pandas ni xgboost y no deserializa el Pipeline, así que cada worker arranca
+# rápido y los workers comparten el binario de los árboles vía memory-map.
+#
+# Ejecutar desde MLops_pipeline/src (después de model_training_evaluation.py):
+#   uvicorn lean_deploy:app --workers 4
+
+import csv
+import io
+import os
+from typing import Any
+
+from fastapi import Body, FastAPI, UploadFile # type: ignore
+from fastapi.responses import JSONResponse # type: ignore
+
+from lean_model import LeanModel, Unsupported
+
+app = FastAPI(
+    title="API liviana de Predicción de Adopciones de Mascotas 🐾",
+    description="Mismas predicciones que /predict del servicio principal, servidas desde el artefacto lean.",
+    version="1.0.0"
+)
+
+lean_path = os.getenv("LEAN_MODEL", "RandomForest_lean")
+model = LeanModel(lean_path)
+# Columnas que se dejan como texto al leer un CSV
+TEXT_COLUMNS = set(model.ordinal_maps) | {op[0] for op in model.cat_ops}
+
+
+def _parse_csv_value(col, value):
+    """Convierte un valor del CSV al tipo que usaría pandas (número o texto)."""
+    if value == "":
+        return float("nan")
+    if col in TEXT_COLUMNS:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _score(records):
+    """Resultados alineados con `records`; los registros inválidos devuelven el error."""
+    results = model.score_many(records)
+    for i, result in enumerate(results):
+        if result is None:
+            try:
+                results[i] = model.score(records[i])
+            except Unsupported as e:
+                results[i] = {"error": str(e)}
+    return results
+
+
+@app.get("/")
+def home():
+    return {"message": "API liviana funcionando. Usa /predict o /predict_batch.", "model": model.meta["model"]}
+
+
+@app.post("/predict")
+async def predict(payload: Any = Body(...)):
+    """Un objeto JSON o una lista de objetos."""
+    if isinstance(payload, dict):
+        try:
+            return model.score(payload)
+        except Unsupported as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+    if isinstance(payload, list):
+        return _score(payload)
+    return JSONResponse(status_code=400, content={"error": "JSON inválido: enviar objeto o lista de objetos."})
+
+
+@app.post("/predict_batch")
+async def predict_batch(file: UploadFile):
+    """CSV con las mismas columnas que el servicio principal."""
+    text = (await file.read()).decode("utf-8")
+    rows = list(csv.DictReader(io.StringIO(text)))
+    records = [{k: _parse_csv_value(k, v) for k, v in row.items()} for row in rows]
+    results = _score(records)
+    # Se devuelven los valores originales del CSV más la predicción (o el error)
+    return [{**row, "Prediction": r["prediction"], "Probability": r["probability"]}
+            if "error" not in r else {**row, **r} for row, r in zip(rows, results)]
@@ -0,0 +1,252 @@
+# lean_model.py
+# Artefacto de inferencia compacto: los árboles del modelo aplanados en arreglos
+# (feature, threshold, hijos, probabilidad de la hoja) dentro de un binario que se
+# abre con memory-map, y los parámetros del preprocesamiento en JSON.
+#
+# Cargarlo solo necesita NumPy (sin sklearn, pandas ni joblib), así que el servicio
+# arranca rápido y varios procesos comparten las páginas del binario.
+#
+#   export_lean(pipeline, {'Size': SIZE_MAP, 'Color': COLOR_MAP}, "RandomForest_lean")
+#   lean = LeanModel("RandomForest_lean")
+#   lean.score({"PetType": "Dog", ...})  ->  {"prediction": 1, "probability": 0.83}
+
+import json
+import math
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 3
+# Alineación de cada arreglo dentro del binario
+ALIGN = 64
+# Textos de las columnas binarias (los mismos que convierte `prepare_dataframe`)
+BINARY_COLUMNS = ('Vaccinated', 'HealthCondition', 'PreviousOwner')
+BINARY_TEXT = {'Sí': 1, 'Si': 1, 'No': 0, 'no': 0, 'sí': 1, 'si': 1}
+
+
+class Unsupported(Exception):
+    """El registro o el modelo no se pueden resolver sin sklearn/pandas."""
+
+
+def fill_record(num_ops, cat_ops, ordinal_maps, record, values):
+    """
+    Escribe en `values` la fila transformada de un dict (misma lógica que el
+    ColumnTransformer + `prepare_dataframe`), o lanza Unsupported.
+    """
+    if not isinstance(record, dict):
+        raise Unsupported("El registro no es un dict")
+
+    for col, fill, scale, shift, pos in num_ops:
+        if col not in record:
+            raise Unsupported(f"Falta la columna {col}")
+        v = record[col]
+        if v is None:
+            # null en el JSON: pandas lo deja como NaN y lo completa el imputador
+            v = math.nan
+        if col in ordinal_maps:
+            # Igual que `_prepare_dataframe`: todo lo que no esté en el mapa queda NaN
+            if not isinstance(v, (str, int, float)) or isinstance(v, bool):
+                raise Unsupported(f"Valor ordinal no soportado en {col}")
+            v = float(ordinal_maps[col].get(v, math.nan))
+        elif isinstance(v, str) and col in BINARY_COLUMNS and v in BINARY_TEXT:
+            v = BINARY_TEXT[v]
+        elif type(v) not in (int, float):
+            raise Unsupported(f"Valor no numérico en {col}")
+        v = float(v)
+        if math.isnan(v):
+            if fill is None:
+                raise Unsupported(f"NaN sin imputador en {col}")
+            v = fill
+        if scale is not None:
+            v = v * scale
+            v += shift
+        values[pos] = v
+
+    for col, lookup, unknown, fill in cat_ops:
+        if col not in record:
+            raise Unsupported(f"Falta la columna {col}")
+        v = record[col]
+        if v is None or (isinstance(v, float) and math.isnan(v)):
+            # Valor faltante -> categoría más frecuente del entrenamiento (SimpleImputer)
+            if fill is None:
+                raise Unsupported(f"Valor faltante sin imputador en {col}")
+            v = fill
+        if not isinstance(v, str):
+            raise Unsupported(f"Valor categórico no soportado en {col}")
+        # Categoría desconocida -> todo ceros (handle_unknown='ignore') o la
+        # columna de las poco frecuentes ('infrequent_if_exist')
+        pos = lookup.get(v, unknown)
+        if pos is not None:
+            values[pos] = 1.0
+
+
+# --- Exportación (se usa al entrenar; aquí sí se necesita el pipeline de sklearn) ---
+def _flatten_trees(classifier):
+    """Nodos de todos los árboles concatenados, con índices de hijos globales."""
+    name = type(classifier).__name__
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        trees = [est.tree_ for est in classifier.estimators_]
+    elif name == 'DecisionTreeClassifier':
+        trees = [classifier.tree_]
+    else:
+        raise Unsupported(f"Formato lean no soportado para {name}")
+    if getattr(classifier, 'n_outputs_', 1) != 1:
+        raise Unsupported("Clasificador multi-salida")
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    base = 0
+    for tree in trees:
+        roots.append(base)
+        feature.append(tree.feature.astype(np.int32))
+        threshold.append(tree.threshold.astype(np.float64))
+        # Las hojas tienen hijos -1; el resto se desplaza al índice global
+        left.append(np.where(tree.children_left < 0, -1, tree.children_left + base).astype(np.int32))
+        right.append(np.where(tree.children_right < 0, -1, tree.children_right + base).astype(np.int32))
+        # Igual que DecisionTreeClassifier.predict_proba: proporciones por nodo
+        proba = tree.value[:, 0, :].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(proba / normalizer)
+        base += tree.node_count
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.concatenate(value),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+
+
+def export_lean(pipeline, ordinal_maps, out_dir):
+    """
+    Escribe out_dir/model.bin (arreglos de los árboles) y out_dir/model.json
+    (preprocesamiento y ubicación de cada arreglo). Devuelve la ruta o None si
+    el pipeline no se puede exportar.
+    """
+    # Import diferido: el cargador no debe depender de sklearn
+    from fast_scoring import CompiledScorer
+
+    try:
+        compiled = CompiledScorer(pipeline, ordinal_maps)
+        arrays = _flatten_trees(compiled.classifier)
+    except (Unsupported, AttributeError, KeyError) as e:
+        print(f"⏭️ Formato lean omitido: {e}")
+        return None
+
+    os.makedirs(out_dir, exist_ok=True)
+    layout, offset = {}, 0
+    tmp = os.path.join(out_dir, "model.bin.tmp")
+    with open(tmp, "wb") as f:
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            pad = (-offset) % ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            layout[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+            f.write(arr.tobytes())
+            offset += arr.nbytes
+    os.replace(tmp, os.path.join(out_dir, "model.bin"))
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "model": type(compiled.classifier).__name__,
+        "classes": [int(c) for c in compiled.classes],
+        "expected": compiled.expected,
+        "n_features": compiled.n_features,
+        "num_ops": compiled._num_ops,
+        "cat_ops": compiled._cat_ops,
+        "ordinal_maps": ordinal_maps,
+        "arrays": layout,
+    }
+    with open(os.path.join(out_dir, "model.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    print(f"💾 Artefacto lean en '{out_dir}' ({len(arrays['roots'])} árboles, "
+          f"{len(arrays['feature'])} nodos, {offset / 1e6:.1f} MB)")
+    return out_dir
+
+
+# --- Carga e inferencia (solo NumPy) ---
+class LeanModel:
+    """Modelo exportado con `export_lean`, puntuado solo con NumPy."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "model.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["format"] not in (1, 2, FORMAT_VERSION):
+            raise ValueError(f"Formato lean {meta['format']} no soportado (se esperaba {FORMAT_VERSION})")
+        self.meta = meta
+        self.classes = np.array(meta["classes"])
+        self.expected = meta["expected"]
+        self.n_features = meta["n_features"]
+        self.num_ops = [tuple(op) for op in meta["num_ops"]]
+        # El formato 1 no tenía columna para las categorías desconocidas y el 2 no
+        # tenía el valor de imputación de las categóricas
+        self.cat_ops = [(op[0], op[1], op[2] if len(op) > 2 else None, op[3] if len(op) > 3 else None)
+                        for op in meta["cat_ops"]]
+        self.ordinal_maps = meta["ordinal_maps"]
+
+        # Memory-map de solo lectura: los procesos que abren el mismo archivo comparten páginas
+        buffer = np.memmap(os.path.join(path, "model.bin"), dtype=np.uint8, mode="r")
+        for name, spec in meta["arrays"].items():
+            arr = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]),
+                             buffer=buffer, offset=spec["offset"])
+            setattr(self, f"_{name}", arr)
+        self._n_trees = len(self._roots)
+
+    def transform_records(self, records):
+        """Matriz transformada y máscara de los registros que se pudieron resolver."""
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        ok = np.zeros(len(records), dtype=bool)
+        for i, record in enumerate(records):
+            try:
+                fill_record(self.num_ops, self.cat_ops, self.ordinal_maps, record, X[i])
+                ok[i] = True
+            except Unsupported:
+                X[i] = 0.0
+        return X, ok
+
+    def predict_proba(self, X):
+        """Probabilidades por clase para filas ya transformadas."""
+        # Los árboles de sklearn comparan en float32
+        X32 = np.asarray(X, dtype=np.float32)
+        n = len(X32)
+        # Un par (fila, árbol) por posición; solo se avanzan los que no llegaron a una hoja
+        node = np.tile(self._roots, n)
+        rows = np.repeat(np.arange(n), self._n_trees)
+        active = np.arange(node.size)
+        while active.size:
+            current = node[active]
+            left = self._left[current]
+            internal = left >= 0
+            active, current, left = active[internal], current[internal], left[internal]
+            go_left = X32[rows[active], self._feature[current]] <= self._threshold[current]
+            node[active] = np.where(go_left, left, self._right[current])
+        node = node.reshape(n, self._n_trees)
+        # Mismo orden de suma que el bosque de sklearn (árbol por árbol)
+        proba = np.zeros((len(X32), self._value.shape[1]), dtype=np.float64)
+        for t in range(self._n_trees):
+            proba += self._value[node[:, t]]
+        if self._n_trees > 1:
+            proba /= self._n_trees
+        return proba
+
+    def _result(self, proba):
+        label = self.classes[int(np.argmax(proba))]
+        return {"prediction": int(label), "probability": float(proba[1])}
+
+    def score(self, record):
+        """{"prediction", "probability"} de un registro, o lanza Unsupported."""
+        X, ok = self.transform_records([record])
+        if not ok[0]:
+            fill_record(self.num_ops, self.cat_ops, self.ordinal_maps, record, X[0])
+        return self._result(self.predict_proba(X)[0])
+
+    def score_many(self, records):
+        """Lista alineada con `records`; los que no se pueden resolver quedan en None."""
+        X, ok = self.transform_records(records)
+        results = [None] * len(records)
+        if ok.any():
+            for i, proba in zip(np.flatnonzero(ok), self.predict_proba(X[ok])):
+                results[i] = self._result(proba)
+        return results
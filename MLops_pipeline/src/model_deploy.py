@@ -1,56 +1,309 @@
-from fastapi import FastAPI, UploadFile, File, Request, Body # type: ignore
-from fastapi.responses import JSONResponse # type: ignore
+from fastapi import FastAPI, UploadFile, File, Request, Response, Body # type: ignore
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse # type: ignore
+from starlette.concurrency import run_in_threadpool # type: ignore
 import pandas as pd
-import joblib
+import numpy as np
+import hmac
 import io
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any
 
+from prediction import SIZE_MAP, COLOR_MAP, prepare_dataframe, predict_frame
+from batching import MicroBatcher
+from online_monitor import OnlineDriftMonitor, load_profile
+from prediction_log import PredictionLog
+from prediction_cache import PredictionCache
+from explanations import Unsupported, cached_contributions
+from model_manager import ModelManager
+from instrumentation import (BATCH_ROWS, ERRORS, CounterMetric, GaugeMetric, MetricsMiddleware,
+                             SamplingProfiler, metrics, stage, timed_handler)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Al apagar: vaciar la cola del monitor y el buffer del registro de predicciones
+    if monitor is not None:
+        monitor.close()
+    if prediction_log is not None:
+        prediction_log.close()
+
+
 # Inicializar la app FastAPI
 app = FastAPI(
     title="API de Predicción de Probabilidad de Adopciones de Mascotas 🐾",
     description="Servicio que utiliza el mejor modelo entrenado para predecir la probabilidad de adopción de una mascota.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware)
+
+def _model_name(path: str) -> str:
+    """RandomForest_model.pkl -> RandomForest"""
+    return os.path.basename(path).replace("_model.pkl", "").replace(".pkl", "")
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """"a=1,b=2" -> {"a": "1", "b": "2"}"""
+    pairs = [item.split("=", 1) for item in value.split(",") if item.strip()]
+    return {k.strip(): v.strip() for k, v in pairs}
+
+
+# Modelos residentes: MODEL_PATH es el modelo por defecto; MODELS agrega otros
+# ("XGBoost=XGBoost_model.pkl,...") y MODEL_SPLIT reparte el tráfico ("RandomForest=90,XGBoost=10")
+manager = ModelManager({'Size': SIZE_MAP, 'Color': COLOR_MAP})
+model_path = os.getenv("MODEL_PATH", "RandomForest_model.pkl")
+manager.load(_model_name(model_path), model_path, default=True)
+for name, path in _parse_pairs(os.getenv("MODELS", "")).items():
+    manager.load(name, path)
+if os.getenv("MODEL_SPLIT"):
+    manager.set_split({k: float(v) for k, v in _parse_pairs(os.getenv("MODEL_SPLIT")).items()})
+# Recarga automática cuando se sobrescribe el archivo de un modelo (0 = deshabilitada)
+if float(os.getenv("MODEL_WATCH_SECONDS", "0")) > 0:
+    manager.watch(float(os.getenv("MODEL_WATCH_SECONDS")))
+
+
+def _prepare_dataframe(df: pd.DataFrame, entry=None) -> pd.DataFrame:
+    """Mapea ordinales/binarias y reordena las columnas según el modelo (por defecto, el principal)."""
+    with stage("prepare"):
+        return prepare_dataframe(df, (entry or manager.default()).pipeline)
+
+
+# Cache de predicciones opcional: PREDICTION_CACHE=1 (requiere un Pipeline preprocesador + clasificador)
+cache = PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "100000")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600")),
+) if os.getenv("PREDICTION_CACHE", "0") == "1" else None
+# Las explicaciones (/explain) usan la misma clave por fila en un cache aparte
+explain_cache = PredictionCache(
+    max_entries=int(os.getenv("EXPLANATION_CACHE_SIZE", "20000")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600")),
+) if cache is not None else None
+if cache is not None:
+    # Al reemplazar o descargar un modelo se eliminan sus entradas
+    def _retain(versions):
+        cache.retain(versions)
+        explain_cache.retain(versions)
+    manager.on_change = _retain
+
+
+def _classify(entry, X):
+    with stage("predict_proba"):
+        return entry.classify(X)
+
 
-# Cargar modelo entrenado
-model_path = "RandomForest_model.pkl"  
-model = joblib.load(model_path)
+def _predict_transformed(entry, X):
+    """(clases, probabilidades) de filas ya transformadas; con cache solo se puntúan las filas nuevas."""
+    if cache is None:
+        return _classify(entry, X)
+    with stage("cache"):
+        return cache.predict(X, entry.version, lambda X_new: _classify(entry, X_new))
 
-# Mapas ordinales (deben coincidir con los usados en feature_engineering)
-SIZE_MAP = {'Small': 0, 'Medium': 1, 'Large': 2}
-COLOR_MAP = {'Black': 0, 'Brown': 1, 'Gray': 2, 'Orange': 3, 'White': 4}
 
+def _predict_prepared(entry, df_prepared: pd.DataFrame):
+    """(clases, probabilidades) de un DataFrame preparado (mismo resultado que predict_proba del Pipeline)."""
+    if not hasattr(entry.pipeline, "steps"):
+        with stage("predict_proba"):
+            return predict_frame(entry.pipeline, df_prepared)
+    with stage("transform"):
+        X = entry.pipeline[:-1].transform(df_prepared)
+    return _predict_transformed(entry, X)
 
-def _prepare_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+
+def _fast_score_many(entry, records: List[Dict[str, Any]]) -> List[Any]:
+    """Ruta rápida para varios registros; None en los que necesitan la ruta con pandas."""
+    with stage("fast_transform"):
+        X, ok = entry.fast_scorer.transform_many(records)
+    results = [None] * len(records)
+    if ok.any():
+        preds, probs = _predict_transformed(entry, entry.fast_scorer.model_input(X[ok]))
+        for i, pred, prob in zip(np.flatnonzero(ok), preds, probs):
+            results[i] = {"prediction": int(pred), "probability": float(prob)}
+    return results
+
+
+def _score_records(entry, records: List[Dict[str, Any]]) -> List[Any]:
     """
-    Asegura que el DataFrame tenga las columnas con tipos esperados por el pipeline:
-    - Convierte Size y Color a numérico si vienen como texto.
-    - Reordena las columnas según el preprocessor del modelo.
+    Puntúa una lista de registros en un solo lote.
+    Devuelve, alineado con `records`, el resultado o la excepción de cada registro.
     """
-    # Si columnas ordinales vienen como texto, mapearlas
-    if 'Size' in df.columns:
-        df['Size'] = df['Size'].map(SIZE_MAP).astype(float)
-    if 'Color' in df.columns:
-        df['Color'] = df['Color'].map(COLOR_MAP).astype(float)
-
-    # Si hay columnas binarias como 'Sí'/'No', convertir a 1/0 (por seguridad)
-    for col in ['Vaccinated', 'HealthCondition', 'PreviousOwner']:
-        if col in df.columns and df[col].dtype == object:
-            df[col] = df[col].replace({'Sí': 1, 'Si': 1, 'No': 0, 'no': 0, 'sí': 1, 'si': 1}).astype(float)
-
-    # Reordenar columnas según el preprocessor (si está disponible en el pipeline)
-    try:
-        expected = list(model.named_steps['preprocessor'].feature_names_in_)
-        missing = [c for c in expected if c not in df.columns]
-        if missing:
-            raise ValueError(f"Faltan columnas requeridas para la predicción: {missing}")
-        df = df[expected]
-    except Exception as e:
-        # Si no hay modelo o no existe feature_names_in_, devolvemos el df como está y el error será manejado arriba
-        print(f"Error: {e}")
-        raise e
+    results = _fast_score_many(entry, records) if entry.fast_scorer is not None else [None] * len(records)
+    for i, result in enumerate(results):
+        if result is not None:
+            continue
+        # Registros que la ruta rápida no resuelve: ruta con pandas, uno por uno
+        try:
+            with stage("dataframe"):
+                df = pd.DataFrame([records[i]])
+            preds, probs = _predict_prepared(entry, _prepare_dataframe(df, entry))
+            results[i] = {"prediction": int(preds[0]), "probability": float(probs[0])}
+        except Exception as e:
+            ERRORS.inc(endpoint="micro_batch", type=type(e).__name__)
+            results[i] = e
+    return results
+
+
+def _score_routed(items) -> List[Any]:
+    """Para el micro-batching: puntúa pares (modelo, registro) agrupándolos por modelo."""
+    results = [None] * len(items)
+    groups = {}
+    for i, (entry, _) in enumerate(items):
+        groups.setdefault(id(entry), (entry, []))[1].append(i)
+    BATCH_ROWS.observe(len(items), endpoint="micro_batch")
+    for entry, rows in groups.values():
+        for i, result in zip(rows, _score_records(entry, [items[i][1] for i in rows])):
+            results[i] = result
+    return results
+
+
+# Micro-batching opcional: BATCHING=1 agrupa peticiones concurrentes de /predict
+BATCHING = os.getenv("BATCHING", "0") == "1"
+batcher = MicroBatcher(
+    _score_routed,
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5")),
+    workers=int(os.getenv("BATCH_WORKERS", "1")),
+) if BATCHING else None
+
+
+# Monitoreo de drift en línea opcional: MONITORING=1 observa el tráfico puntuado
+MONITORING = os.getenv("MONITORING", "0") == "1"
+monitor = OnlineDriftMonitor(
+    load_profile(os.getenv("MONITOR_PROFILE")),
+    window_size=int(os.getenv("MONITOR_WINDOW", "1000")),
+    slide=int(os.getenv("MONITOR_SLIDE", "250")),
+    prepare=_prepare_dataframe,
+    db_path=os.getenv("MONITOR_DB", "monitoring.db"),
+) if MONITORING else None
+
+
+def _observe(data, prepared=False):
+    """Envía registros puntuados al monitor (solo encola, no bloquea la respuesta)."""
+    if monitor is not None:
+        monitor.observe(data, prepared)
+
+
+# Registro de predicciones opcional: PREDICTION_LOG=1 guarda cada predicción con su request_id
+prediction_log = PredictionLog(
+    os.getenv("PREDICTION_LOG_DIR", "prediction_log"),
+    model_version=manager.default().version,
+    flush_rows=int(os.getenv("PREDICTION_LOG_FLUSH_ROWS", "10000")),
+    flush_seconds=float(os.getenv("PREDICTION_LOG_FLUSH_SECONDS", "30")),
+) if os.getenv("PREDICTION_LOG", "0") == "1" else None
 
-    return df
+
+def _request_id(request: Request, response: Response) -> str:
+    """Usa el header X-Request-ID del cliente o genera uno, y lo devuelve en la respuesta."""
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    response.headers["X-Request-ID"] = rid
+    return rid
+
+
+def _route(request: Request, response: Response, rid: str):
+    """Modelo para la petición (header X-Model-Version o reparto de tráfico); se informa en la respuesta."""
+    entry = manager.route(rid, request.headers.get("X-Model-Version"))
+    response.headers["X-Model"] = entry.name
+    response.headers["X-Model-Version"] = entry.version
+    return entry
+
+
+def _log_predictions(entry, request_ids, preds, probs):
+    if prediction_log is not None:
+        prediction_log.log(request_ids, preds, probs, entry.version)
+
+
+def _admin_error(request: Request):
+    """Los endpoints que cambian modelos solo se habilitan con MODEL_ADMIN_TOKEN (header X-Admin-Token)."""
+    token = os.getenv("MODEL_ADMIN_TOKEN")
+    if not token:
+        return JSONResponse(status_code=403, content={"error": "Administración de modelos deshabilitada (definir MODEL_ADMIN_TOKEN)."})
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        return JSONResponse(status_code=403, content={"error": "Token de administración inválido."})
+    return None
+
+
+# Profiler por muestreo: PROFILER=1 lo enciende al arrancar; también se controla con /debug/profiler
+profiler = SamplingProfiler(interval=float(os.getenv("PROFILER_INTERVAL_MS", "10")) / 1000)
+if os.getenv("PROFILER", "0") == "1":
+    profiler.start()
+
+
+@metrics.collector
+def _service_metrics():
+    """Métricas que ya llevan los módulos (modelos, cache, micro-batching, monitor), leídas al consultar."""
+    requests = CounterMetric("model_requests_total", "Peticiones puntuadas por modelo", ["model", "version"])
+    rows = CounterMetric("model_rows_total", "Filas puntuadas por modelo", ["model", "version"])
+    errors = CounterMetric("model_errors_total", "Errores por modelo", ["model", "version"])
+    traffic = GaugeMetric("model_traffic_percent", "Porcentaje del tráfico sin header por modelo", ["model"])
+    for m in manager.summary()["models"]:
+        requests.inc(m["requests"], model=m["name"], version=m["version"])
+        rows.inc(m["rows"], model=m["name"], version=m["version"])
+        errors.inc(m["errors"], model=m["name"], version=m["version"])
+        traffic.set(m["traffic_pct"], model=m["name"])
+    result = [requests, rows, errors, traffic]
+    if cache is not None:
+        c = cache.summary()
+        lookups = CounterMetric("prediction_cache_lookups_total", "Búsquedas en el cache de predicciones", ["result"])
+        lookups.inc(c["hits"], result="hit")
+        lookups.inc(c["misses"], result="miss")
+        entries = GaugeMetric("prediction_cache_entries", "Entradas en el cache de predicciones")
+        entries.set(c["size"])
+        result += [lookups, entries]
+    if batcher is not None:
+        queue_ms = GaugeMetric("batcher_queue_ms", "Tiempo en cola del micro-batching", ["quantile"])
+        stats = batcher.stats.as_dict()
+        queue_ms.set(stats["queue_ms_p50"], quantile="0.5")
+        queue_ms.set(stats["queue_ms_p99"], quantile="0.99")
+        result.append(queue_ms)
+    if monitor is not None:
+        summary = monitor.summary()
+        queued = GaugeMetric("drift_monitor_queued", "Lotes esperando al monitor de drift")
+        queued.set(summary["queued"])
+        dropped = CounterMetric("drift_monitor_dropped_total", "Registros descartados por el monitor (cola llena)")
+        dropped.inc(summary["dropped"])
+        result += [queued, dropped]
+    return result
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/debug/profiler/start")
+def profiler_start(request: Request, interval_ms: float = 10.0):
+    """Enciende el profiler por muestreo (reinicia las muestras)."""
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    profiler.interval = interval_ms / 1000
+    profiler.start()
+    return {"running": True, "interval_ms": interval_ms}
+
+
+@app.post("/debug/profiler/stop")
+def profiler_stop(request: Request):
+    """Apaga el profiler y devuelve las funciones con más muestras."""
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    profiler.stop()
+    return profiler.report()
+
+
+@app.get("/debug/profiler")
+def profiler_report(request: Request, top: int = 25, format: str = "json"):
+    """Resultado del profiler: top de funciones (json) o pilas colapsadas para flamegraphs (collapsed)."""
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.report(top)
 
 
 @app.get("/")
@@ -58,29 +311,139 @@ def home():
     return {"message": "API funcionando correctamente. Usa /predict o /predict_batch para hacer predicciones."}
 
 
+@app.get("/batching/stats")
+def batching_stats():
+    """Métricas del agrupador de peticiones (tamaño de lote y tiempo en cola)."""
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats.as_dict()}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Aciertos, fallos, tamaño y expulsiones del cache de predicciones."""
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.summary()}
+
+
+@app.get("/explain/cache/stats")
+def explain_cache_stats():
+    """Aciertos, fallos y tamaño del cache de explicaciones."""
+    if explain_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **explain_cache.summary()}
+
+
+@app.get("/monitoring/drift")
+def monitoring_drift():
+    """Estado del monitor en línea y la evaluación de la última ventana."""
+    if monitor is None:
+        return {"enabled": False}
+    return {"enabled": True, **monitor.summary(), "latest": monitor.latest()}
+
+
+@app.get("/models")
+def models():
+    """Modelos residentes, reparto de tráfico y métricas (latencia, filas, memoria) de cada uno."""
+    return manager.summary()
+
+
+@app.post("/models/{name}/load")
+def load_model(name: str, request: Request, payload: Dict[str, Any] = Body(...)):
+    """
+    Carga (o reemplaza) un modelo en segundo plano: se calienta con un lote ficticio
+    y se activa solo si todo salió bien. Body: {"path": "...pkl", "default": false}.
+    """
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    path = payload.get("path")
+    if not path or not os.path.exists(path):
+        return JSONResponse(status_code=400, content={"error": f"No existe el archivo: {path}"})
+    manager.load_async(name, path, default=bool(payload.get("default", False)))
+    return JSONResponse(status_code=202, content={"status": "cargando", "name": name, "path": path})
+
+
+@app.post("/models/split")
+def set_model_split(request: Request, payload: Dict[str, float] = Body(...)):
+    """Reparte el tráfico sin header entre modelos cargados, p. ej. {"RandomForest": 90, "XGBoost": 10}."""
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    try:
+        manager.set_split(payload)
+    except (KeyError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    return {"split": manager.split()}
+
+
+@app.delete("/models/{name}")
+def unload_model(name: str, request: Request):
+    error = _admin_error(request)
+    if error is not None:
+        return error
+    try:
+        manager.unload(name)
+    except (KeyError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    return {"unloaded": name}
+
+
 @app.post("/predict")
-async def predict(payload: Any = Body(...)):
+@timed_handler
+async def predict(request: Request, response: Response, payload: Any = Body(...)):
     """
     Recibe un JSON con datos de una o varias mascotas.
     """
-    if model is None:
+    rid = _request_id(request, response)
+    try:
+        entry = _route(request, response, rid)
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    if entry is None:
         return JSONResponse(status_code=500, content={"error": "Modelo no disponible en el servidor."})
 
+    start = time.perf_counter()
     try:
+        # Micro-batching: el registro se puntúa junto con otras peticiones concurrentes
+        if isinstance(payload, dict) and batcher is not None:
+            result = await batcher.submit((entry, payload))
+            _observe([payload])
+            _log_predictions(entry, [rid], [result["prediction"]], [result["probability"]])
+            entry.stats.record(1, time.perf_counter() - start)
+            return result
+
+        # Ruta rápida: un solo registro sin pasar por pandas
+        if isinstance(payload, dict) and entry.fast_scorer is not None:
+            result = _fast_score_many(entry, [payload])[0]
+            if result is not None:
+                _observe([payload])
+                _log_predictions(entry, [rid], [result["prediction"]], [result["probability"]])
+                BATCH_ROWS.observe(1, endpoint="predict")
+                entry.stats.record(1, time.perf_counter() - start)
+                return result
+
         # Normalizar payload a DataFrame
-        if isinstance(payload, dict):
-            df = pd.DataFrame([payload])
-        elif isinstance(payload, list):
-            df = pd.DataFrame(payload)
-        else:
-            return JSONResponse(status_code=400, content={"error": "JSON inválido: enviar objeto o lista de objetos."})
+        with stage("dataframe"):
+            if isinstance(payload, dict):
+                df = pd.DataFrame([payload])
+            elif isinstance(payload, list):
+                df = pd.DataFrame(payload)
+            else:
+                return JSONResponse(status_code=400, content={"error": "JSON inválido: enviar objeto o lista de objetos."})
 
         # Preparar df (mapear ordinals y reordenar)
-        df_prepared = _prepare_dataframe(df.copy())
+        df_prepared = _prepare_dataframe(df.copy(), entry)
 
-        # Predicciones
-        preds = model.predict(df_prepared)
-        probs = model.predict_proba(df_prepared)[:, 1]
+        # Predicciones (con cache, solo las filas que no estaban guardadas)
+        preds, probs = _predict_prepared(entry, df_prepared)
+        _observe(df_prepared, prepared=True)
+        # Un registro conserva el request_id; en una lista se agrega la posición
+        ids = [rid] if isinstance(payload, dict) else [f"{rid}:{i}" for i in range(len(df_prepared))]
+        _log_predictions(entry, ids, preds, probs)
+        BATCH_ROWS.observe(len(df_prepared), endpoint="predict")
+        entry.stats.record(len(df_prepared), time.perf_counter() - start)
 
         # Formatear salida
         results = [
@@ -93,12 +456,19 @@ async def predict(payload: Any = Body(...)):
         return results
 
     except ValueError as ve:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict", type="ValueError")
         return JSONResponse(status_code=400, content={"error": str(ve)})
     except Exception as e:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict", type=type(e).__name__)
         return JSONResponse(status_code=400, content={"error": f"{type(e).__name__}: {e}"})
     
 @app.post("/predict_batch")
+@timed_handler
 async def predict_batch(
+    request: Request,
+    response: Response,
     file: UploadFile = None,
     payload: Any = Body(None)
 ):
@@ -106,36 +476,191 @@ async def predict_batch(
     Permite subir un archivo CSV o enviar una lista de JSON con varios registros.
     Devuelve las predicciones y probabilidades para cada mascota.
     """
+    rid = _request_id(request, response)
+    try:
+        entry = _route(request, response, rid)
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    start = time.perf_counter()
     try:
         # --- Opción 1: Archivo CSV ---
         if file:
             contents = await file.read()
-            df = pd.read_csv(io.BytesIO(contents))
-            df_prepared = _prepare_dataframe(df.copy())
+            with stage("read_csv"):
+                df = pd.read_csv(io.BytesIO(contents))
+            df_prepared = _prepare_dataframe(df.copy(), entry)
 
         # --- Opción 2: Lista de JSON ---
         elif payload:
             if isinstance(payload, list):
-                df = pd.DataFrame(payload)
+                with stage("dataframe"):
+                    df = pd.DataFrame(payload)
             elif isinstance(payload, dict):
-                df = pd.DataFrame([payload])
+                with stage("dataframe"):
+                    df = pd.DataFrame([payload])
             else:
                 return JSONResponse(status_code=400, content={"error": "Formato JSON inválido."})
-            df_prepared = _prepare_dataframe(df.copy())
+            df_prepared = _prepare_dataframe(df.copy(), entry)
 
         else:
             return JSONResponse(status_code=400, content={"error": "Debes subir un archivo CSV o enviar una lista de JSON."})
 
-        # Predicciones
-        preds = model.predict(df_prepared)
-        probs = model.predict_proba(df_prepared)[:, 1]
+        # Predicciones (con cache, solo las filas que no estaban guardadas)
+        preds, probs = _predict_prepared(entry, df_prepared)
+        _observe(df_prepared, prepared=True)
+        _log_predictions(entry, [f"{rid}:{i}" for i in range(len(df_prepared))], preds, probs)
+        BATCH_ROWS.observe(len(df_prepared), endpoint="predict_batch")
+        entry.stats.record(len(df_prepared), time.perf_counter() - start)
 
         df["Prediction"] = preds
         df["Probability"] = probs
 
-        return df.to_dict(orient="records")
+        with stage("serialize"):
+            return df.to_dict(orient="records")
+
+    except ValueError as ve:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict_batch", type="ValueError")
+        return JSONResponse(status_code=400, content={"error": str(ve)})
+    except Exception as e:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict_batch", type=type(e).__name__)
+        return JSONResponse(status_code=400, content={"error": f"{type(e).__name__}: {e}"})
+
+
+@app.post("/explain")
+@timed_handler
+async def explain(request: Request, response: Response, payload: Any = Body(...), top: int = 0):
+    """
+    Igual que /predict (un objeto o una lista), más la contribución de cada variable
+    original a la predicción: base_value + suma de contribuciones = probabilidad
+    (RandomForest/DecisionTree) o log-odds (GradientBoosting/XGBoost/LogisticRegression).
+    `top` limita la respuesta a las N variables de mayor impacto (0 = todas).
+    """
+    rid = _request_id(request, response)
+    try:
+        entry = _route(request, response, rid)
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    try:
+        explainer = entry.explainer
+        with stage("dataframe"):
+            if isinstance(payload, dict):
+                df = pd.DataFrame([payload])
+            elif isinstance(payload, list):
+                df = pd.DataFrame(payload)
+            else:
+                return JSONResponse(status_code=400, content={"error": "JSON inválido: enviar objeto o lista de objetos."})
+        df_prepared = _prepare_dataframe(df.copy(), entry)
+        with stage("transform"):
+            X = entry.pipeline[:-1].transform(df_prepared)
+
+        # Predicción y explicación con la misma clave canónica por fila (cada una en su cache)
+        preds, probs = _predict_transformed(entry, X)
+        with stage("explain"):
+            contributions = cached_contributions(explain_cache, X, entry.version, explainer)
+        BATCH_ROWS.observe(len(df_prepared), endpoint="explain")
+
+        results = [
+            {"prediction": int(pred), "probability": float(prob), **detail}
+            for pred, prob, detail in zip(preds, probs, explainer.as_records(contributions, top))
+        ]
+        if isinstance(payload, dict):
+            return results[0]
+        return results
+
+    except Unsupported as e:
+        ERRORS.inc(endpoint="explain", type="Unsupported")
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ValueError as ve:
+        ERRORS.inc(endpoint="explain", type="ValueError")
+        return JSONResponse(status_code=400, content={"error": str(ve)})
+    except Exception as e:
+        ERRORS.inc(endpoint="explain", type=type(e).__name__)
+        return JSONResponse(status_code=400, content={"error": f"{type(e).__name__}: {e}"})
+
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 
+def _score_chunk(entry, chunk: pd.DataFrame, fmt: str, first: bool, rid: str = "") -> str:
+    """Puntúa un bloque del CSV y lo serializa en el formato de salida."""
+    start = time.perf_counter()
+    df_prepared = _prepare_dataframe(chunk.copy(), entry)
+    preds, probs = _predict_prepared(entry, df_prepared)
+    _observe(df_prepared, prepared=True)
+    # El índice del bloque es la posición de la fila en el CSV completo
+    _log_predictions(entry, [f"{rid}:{i}" for i in chunk.index], preds, probs)
+    BATCH_ROWS.observe(len(chunk), endpoint="predict_batch_stream")
+    entry.stats.record(len(chunk), time.perf_counter() - start)
+    chunk["Prediction"] = preds
+    chunk["Probability"] = probs
+    with stage("serialize"):
+        if fmt == "csv":
+            return chunk.to_csv(index=False, header=first)
+        # Celdas vacías como null: json.dumps escribiría NaN, que no es JSON válido
+        records = chunk.astype(object).where(chunk.notna(), None).to_dict(orient="records")
+        return "".join(json.dumps(r, ensure_ascii=False, allow_nan=False) + "\n" for r in records)
+
+
+@app.post("/predict_batch/stream")
+@timed_handler
+async def predict_batch_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    format: str = "ndjson",
+    chunksize: int = 10000
+):
+    """
+    Puntúa un CSV grande por bloques de `chunksize` filas y devuelve el resultado
+    en streaming (NDJSON o CSV). La memoria queda acotada por el tamaño del bloque
+    y no por el tamaño del archivo.
+    """
+    if format not in STREAM_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Formato no soportado: {format}. Usa 'ndjson' o 'csv'."})
+    if chunksize <= 0:
+        return JSONResponse(status_code=400, content={"error": "chunksize debe ser mayor que 0."})
+
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    try:
+        entry = manager.route(rid, request.headers.get("X-Model-Version"))
+    except KeyError as e:
+        return JSONResponse(status_code=400, content={"error": str(e).strip("'")})
+    # El archivo subido ya está en un temporal; se lee por bloques sin cargarlo entero
+    try:
+        reader = pd.read_csv(file.file, chunksize=chunksize)
+        first_chunk = await run_in_threadpool(next, reader, None)
+        if first_chunk is None:
+            return JSONResponse(status_code=400, content={"error": "El archivo CSV está vacío."})
+        # El primer bloque se valida antes de empezar a responder para poder devolver 400
+        first_body = await run_in_threadpool(_score_chunk, entry, first_chunk, format, True, rid)
     except ValueError as ve:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict_batch_stream", type="ValueError")
         return JSONResponse(status_code=400, content={"error": str(ve)})
     except Exception as e:
+        entry.stats.errors += 1
+        ERRORS.inc(endpoint="predict_batch_stream", type=type(e).__name__)
         return JSONResponse(status_code=400, content={"error": f"{type(e).__name__}: {e}"})
+
+    def body():
+        # Generador síncrono: Starlette lo itera en un hilo y no bloquea el event loop
+        yield first_body
+        try:
+            for chunk in reader:
+                yield _score_chunk(entry, chunk, format, False, rid)
+        except Exception as e:
+            # Ya se envió el status 200: el error se reporta dentro del stream, como
+            # última línea (en CSV, una línea de comentario que empieza con "#")
+            print(f"Error: {e}")
+            ERRORS.inc(endpoint="predict_batch_stream", type=type(e).__name__)
+            message = f"{type(e).__name__}: {e}"
+            if format == "ndjson":
+                yield json.dumps({"error": message}, ensure_ascii=False) + "\n"
+            else:
+                yield "# error: " + " ".join(message.splitlines()) + "\n"
+        finally:
+            reader.close()
+
+    return StreamingResponse(body(), media_type=STREAM_FORMATS[format],
+                             headers={"X-Request-ID": rid, "X-Model": entry.name, "X-Model-Version": entry.version})
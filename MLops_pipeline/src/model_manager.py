@@ -0,0 +1,354 @@
+# model_manager.py
+# Modelos residentes en la API: carga en segundo plano, calentamiento, reemplazo
+# atómico y ruteo por versión o por porcentaje de tráfico (canary).
+#
+# Cada petición toma una referencia al modelo al empezar y la usa hasta el final,
+# así que reemplazar un modelo no corta las peticiones en curso: las nuevas usan el
+# modelo nuevo y el anterior se libera cuando terminan las que lo usaban.
+
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from explanations import TreeExplainer
+from fast_scoring import compile_scorer
+from prediction import predict_frame, prepare_dataframe
+from prediction_cache import artifact_version
+
+
+class ModelStats:
+    """Peticiones, filas y latencia de un modelo (últimas `window` peticiones)."""
+
+    def __init__(self, window=10000):
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.latency_ms = deque(maxlen=window)
+
+    def record(self, rows, seconds):
+        self.requests += 1
+        self.rows += rows
+        self.latency_ms.append(seconds * 1000)
+
+    def as_dict(self):
+        lat = np.array(self.latency_ms) if self.latency_ms else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "errors": self.errors,
+            "latency_ms_p50": float(np.percentile(lat, 50)),
+            "latency_ms_p99": float(np.percentile(lat, 99)),
+        }
+
+
+class LoadedModel:
+    """Un artefacto cargado: pipeline, ruta rápida, versión y sus métricas."""
+
+    def __init__(self, name, path, ordinal_maps=None):
+        self.name = name
+        self.path = path
+        self.version = artifact_version(path)
+        self.signature = _file_signature(path)
+
+        # Memoria aproximada: lo que creció el proceso al deserializar el modelo
+        # (sin /proc, el tamaño del archivo)
+        before = _rss_bytes()
+        start = time.perf_counter()
+        self.pipeline = joblib.load(path)
+        self.load_seconds = time.perf_counter() - start
+        after = _rss_bytes()
+        self.memory_bytes = max(after - before, 0) if before and after else self.signature[1]
+
+        self.ordinal_maps = ordinal_maps
+        self.fast_scorer = compile_scorer(self.pipeline, ordinal_maps)
+        self._explainer = None
+        self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.warmup_ms = None
+        self.stats = ModelStats()
+
+    @property
+    def explainer(self):
+        """TreeExplainer del pipeline (se arma con la primera explicación que se pide)."""
+        if self._explainer is None:
+            self._explainer = TreeExplainer(self.pipeline)
+        return self._explainer
+
+    def classify(self, X):
+        """(clases, probabilidades) de filas ya transformadas por el preprocesador."""
+        classifier = self.pipeline.steps[-1][1]
+        probas = classifier.predict_proba(X)
+        return classifier.classes_[probas.argmax(axis=1)], probas[:, 1]
+
+    def warmup(self, rows=32):
+        """
+        Puntúa un lote ficticio por la ruta rápida (si el modelo la tiene) y por la
+        de pandas antes de recibir tráfico. Si algo falla, lanza la excepción y el
+        modelo no se activa.
+        """
+        start = time.perf_counter()
+        if self.fast_scorer is not None:
+            records = _dummy_records(self.fast_scorer, rows)
+            # Misma ruta que la API: transform_many + classify, con una fila y con el lote
+            for batch in (records[:1], records):
+                X, ok = self.fast_scorer.transform_many(batch)
+                self.classify(self.fast_scorer.model_input(X[ok]))
+            predict_frame(self.pipeline, prepare_dataframe(pd.DataFrame(records), self.pipeline))
+        else:
+            # Sin ruta rápida (p. ej. categorías con hashing) todo el tráfico va por
+            # pandas: transform del preprocesador + classify, con una fila y con el lote
+            records = _frame_dummy_records(self.pipeline, self.ordinal_maps, rows)
+            for batch in (records[:1], records):
+                df = prepare_dataframe(pd.DataFrame(batch), self.pipeline)
+                self.classify(self.pipeline[:-1].transform(df))
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+
+    def summary(self):
+        return {"name": self.name, "path": self.path, "version": self.version,
+                "loaded_at": self.loaded_at, "load_seconds": round(self.load_seconds, 3),
+                "warmup_ms": None if self.warmup_ms is None else round(self.warmup_ms, 1),
+                "memory_mb": round(self.memory_bytes / 1e6, 1), **self.stats.as_dict()}
+
+
+def _rss_bytes():
+    """Memoria residente del proceso (Linux); None si no se puede leer."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _dummy_records(scorer, rows):
+    """Registros sintéticos válidos a partir de los parámetros del preprocesador."""
+    ordinal = {col: list(mapping) for col, mapping in scorer.ordinal_maps.items()}
+    records = []
+    for i in range(rows):
+        record = {}
+        for col, fill, _, _, _ in scorer._num_ops:
+            if col in ordinal:
+                record[col] = ordinal[col][i % len(ordinal[col])]
+            else:
+                record[col] = float(fill) if fill is not None else 0.0
+        for col, lookup, *_ in scorer._cat_ops:
+            categories = list(lookup)
+            record[col] = categories[i % len(categories)]
+        records.append(record)
+    return records
+
+
+def _frame_dummy_records(pipeline, ordinal_maps, rows):
+    """
+    Registros sintéticos para la ruta con pandas: categorías del OneHotEncoder o,
+    si no hay, el valor de imputación que aprendió el preprocesador.
+    """
+    preprocessor = pipeline.named_steps['preprocessor']
+    choices = {col: list(mapping) for col, mapping in (ordinal_maps or {}).items()}
+    for _, trans, cols in preprocessor.transformers_:
+        if isinstance(trans, str):  # 'drop' / 'passthrough'
+            continue
+        steps = [s for _, s in trans.steps] if isinstance(trans, Pipeline) else [trans]
+        encoder = next((s for s in steps if hasattr(s, 'categories_')), None)
+        imputer = next((s for s in steps if hasattr(s, 'statistics_')), None)
+        for j, col in enumerate(cols):
+            if col in choices:
+                continue
+            if encoder is not None:
+                choices[col] = list(encoder.categories_[j])
+            elif imputer is not None:
+                choices[col] = [imputer.statistics_[j]]
+    records = []
+    for i in range(rows):
+        record = {}
+        for col in preprocessor.feature_names_in_:
+            values = choices.get(col) or [0.0]
+            record[col] = values[i % len(values)]
+        records.append(record)
+    return records
+
+
+class ModelManager:
+    """
+    Modelos residentes por nombre y reglas de ruteo.
+
+        manager = ModelManager({'Size': SIZE_MAP, 'Color': COLOR_MAP})
+        manager.load("RandomForest", "RandomForest_model.pkl", default=True)
+        manager.load_async("XGBoost", "XGBoost_model.pkl")
+        manager.set_split({"RandomForest": 90, "XGBoost": 10})
+        entry = manager.route(request_id, requested=request.headers.get("X-Model-Version"))
+    """
+
+    def __init__(self, ordinal_maps=None, warmup_rows=32):
+        self.ordinal_maps = ordinal_maps
+        self.warmup_rows = warmup_rows
+        self.default_name = None
+        # Los dicts se reemplazan completos: quien los lee nunca ve un estado a medias
+        self._models = {}
+        self._split = []  # [(límite acumulado en %, nombre)]
+        self._load_lock = threading.Lock()
+        self._watch_thread = None
+        self.errors = {}
+        # Se llama con las versiones residentes después de cada cambio (por ejemplo, para el cache)
+        self.on_change = None
+
+    # --- Ciclo de vida ---
+    def load(self, name, path, default=False):
+        """Carga, calienta y activa un modelo; si falla, el modelo anterior sigue activo."""
+        with self._load_lock:
+            entry = LoadedModel(name, path, self.ordinal_maps)
+            entry.warmup(self.warmup_rows)
+            previous = self._models.get(name)
+            self._models = {**self._models, name: entry}
+            if default or self.default_name is None:
+                self.default_name = name
+            self.errors.pop(name, None)
+        action = "reemplazado" if previous is not None else "cargado"
+        print(f"🔁 Modelo '{name}' {action}: {entry.version} "
+              f"({entry.load_seconds:.2f} s, ~{entry.memory_bytes / 1e6:.0f} MB, calentamiento {entry.warmup_ms or 0:.0f} ms)")
+        self._changed()
+        return entry
+
+    def load_async(self, name, path, default=False):
+        """Igual que `load`, en un hilo aparte; los errores quedan en `errors`."""
+        def run():
+            try:
+                self.load(name, path, default)
+            except Exception as e:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                print(f"❌ No se pudo cargar '{name}' desde {path}: {e}")
+        thread = threading.Thread(target=run, name=f"load-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, name):
+        with self._load_lock:
+            if name not in self._models:
+                raise KeyError(f"Modelo no cargado: {name}")
+            if name == self.default_name:
+                raise ValueError("No se puede descargar el modelo por defecto")
+            # El tráfico del modelo descargado se reparte entre los que quedan
+            weights = {n: w for n, w in self.split().items() if n != name}
+            self._models = {k: v for k, v in self._models.items() if k != name}
+            self._split = []
+            if weights:
+                self.set_split(weights)
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.versions())
+
+    # --- Ruteo ---
+    def set_split(self, weights):
+        """Porcentaje de tráfico por modelo, p. ej. {"RandomForest": 90, "XGBoost": 10}."""
+        models = self._models
+        unknown = [n for n in weights if n not in models]
+        if unknown:
+            raise KeyError(f"Modelos no cargados: {unknown}")
+        if any(w < 0 for w in weights.values()) or sum(weights.values()) <= 0:
+            raise ValueError("Los porcentajes deben ser >= 0 y sumar más de 0")
+        total = sum(weights.values())
+        split, acc = [], 0.0
+        for name, weight in weights.items():
+            if weight > 0:
+                acc += 100.0 * weight / total
+                split.append((acc, name))
+        self._split = split
+
+    def split(self):
+        previous, result = 0.0, {}
+        for limit, name in self._split:
+            result[name] = round(limit - previous, 4)
+            previous = limit
+        return result
+
+    def get(self, name):
+        return self._models.get(name)
+
+    def default(self):
+        return self._models.get(self.default_name)
+
+    def route(self, request_id, requested=None):
+        """
+        Modelo para una petición: el pedido en el header (por nombre o versión) o,
+        si no, el que toque según el reparto de tráfico. El reparto usa un hash del
+        request_id, así que la misma petición repetida cae en el mismo modelo.
+        """
+        models = self._models
+        if requested:
+            entry = models.get(requested)
+            if entry is None:
+                entry = next((m for m in models.values() if m.version == requested), None)
+            if entry is None:
+                raise KeyError(f"Modelo no disponible: {requested}")
+            return entry
+        split = self._split
+        if split:
+            point = zlib.crc32(str(request_id).encode()) % 10000 / 100
+            for limit, name in split:
+                if point < limit and name in models:
+                    return models[name]
+        return models.get(self.default_name)
+
+    def versions(self):
+        return {m.version for m in self._models.values()}
+
+    def traffic_pct(self, name):
+        """Porcentaje del tráfico sin header que recibe un modelo."""
+        split = self.split()
+        if split:
+            return split.get(name, 0.0)
+        return 100.0 if name == self.default_name else 0.0
+
+    def summary(self):
+        return {"default": self.default_name, "split": self.split(), "errors": dict(self.errors),
+                "models": [{**m.summary(), "default": m.name == self.default_name,
+                            "traffic_pct": self.traffic_pct(m.name)}
+                           for m in self._models.values()]}
+
+    # --- Recarga automática ---
+    def watch(self, interval=10.0):
+        """
+        Revisa cada `interval` segundos si cambió el archivo de algún modelo y lo
+        recarga en segundo plano. Se espera a que el archivo quede igual entre dos
+        revisiones para no leerlo mientras se está escribiendo. Si la recarga falla,
+        no se reintenta hasta que el archivo vuelva a cambiar.
+        """
+        def run():
+            pending, failed = {}, {}
+            while True:
+                time.sleep(interval)
+                for name, entry in list(self._models.items()):
+                    try:
+                        signature = _file_signature(entry.path)
+                    except OSError:
+                        continue
+                    if signature == entry.signature or failed.get(name) == signature:
+                        pending.pop(name, None)
+                    elif pending.get(name) == signature:
+                        pending.pop(name)
+                        try:
+                            if artifact_version(entry.path) != entry.version:
+                                self.load(name, entry.path)
+                            else:
+                                entry.signature = signature
+                            failed.pop(name, None)
+                        except Exception as e:
+                            failed[name] = signature
+                            self.errors[name] = f"{type(e).__name__}: {e}"
+                            print(f"❌ No se pudo recargar '{name}': {e}")
+                    else:
+                        pending[name] = signature
+        self._watch_thread = threading.Thread(target=run, name="model-watch", daemon=True)
+        self._watch_thread.start()
@@ -1,123 +1,40 @@
 # model_monitoring.py
 
 import pandas as pd
-import numpy as np
-from scipy.stats import ks_2samp, chi2_contingency
-import joblib
-import matplotlib.pyplot as plt
-import os
 
-# --- Función para PSI ---
-def psi(expected, actual, bins=10):
-    """Population Stability Index (PSI)"""
-    expected_perc, bin_edges = np.histogram(expected, bins=bins)
-    actual_perc, _ = np.histogram(actual, bins=bin_edges)
-    expected_perc = expected_perc / len(expected)
-    actual_perc = actual_perc / len(actual)
-    psi_val = np.sum((expected_perc - actual_perc) * np.log((expected_perc + 1e-6) / (actual_perc + 1e-6)))
-    return psi_val
+from artifact_store import ArtifactStore
+from drift_charts import render_drift_charts
+from drift_engine import compute_drift, psi_alert
 
-print("📦 Cargando datos procesados...")
-X_train, X_test, y_train, y_test, preprocessor = joblib.load("processed_data.pkl")
+# El pool de procesos de los gráficos necesita el guard de __main__ (spawn en Windows)
+if __name__ == "__main__":
+    print("📦 Cargando perfil de referencia...")
+    # La referencia es el perfil guardado por ft_engineering.py: no se cargan filas de entrenamiento
+    store = ArtifactStore()
+    profile = store.get("reference_profile")
+    X_test = store.get("X_test")
 
-# Simular nuevos datos
-X_new = X_test.sample(frac=0.6, random_state=42).copy()
+    # Simular nuevos datos
+    X_new = X_test.sample(frac=0.6, random_state=42).copy()
 
-# Convertir todos a DataFrame (por si vienen en arrays)
-X_train = pd.DataFrame(X_train)
-X_new = pd.DataFrame(X_new)
+    # Convertir a DataFrame (por si viene en array)
+    X_new = pd.DataFrame(X_new)
 
-drift_results = []
+    # Comparación de todas las columnas contra el perfil
+    df_drift, psi_values = compute_drift(profile, X_new)
+    print("\n📊 Resultados de Drift:")
+    print(df_drift)
 
-# Analizar columnas numéricas y categóricas por separado
-for col in X_train.columns:
-    # Intentar identificar tipo de variable
-    if np.issubdtype(X_train[col].dtype, np.number):
-        stat, p_value = ks_2samp(X_train[col], X_new[col])
-        drift_results.append({
-            "Variable": col,
-            "Tipo": "Numérica",
-            "Métrica": "KS Test",
-            "Valor": stat,
-            "P-value": p_value,
-            "Alerta": "⚠️ Drift" if p_value < 0.05 else "✅ Estable"
-        })
-    else:
-        # Evitar columnas sin valores comunes
-        comunes = set(X_train[col].dropna().unique()) & set(X_new[col].dropna().unique())
+    # Calcular PSI global (solo numéricas)
+    print("\n📈 Population Stability Index (PSI):")
+    for c, psi_val in psi_values.items():
+        print(f"{c}: {psi_val:.4f}  -> {psi_alert(psi_val)}")
 
-        # Evitar errores por columnas sin valores comunes o con pocos datos
-        if len(comunes) <= 1:
-            drift_results.append({
-                "Variable": col,
-                "Tipo": "Categórica",
-                "Métrica": "Chi²",
-                "Valor": None,
-                "P-value": np.nan,
-                "Alerta": "N/A (sin valores comunes o insuficientes)"
-            })
-            continue
+    # Gráficos de comparación para variables numéricas (solo los que cambiaron)
+    rendered, skipped = render_drift_charts(profile, X_new)
+    print(f"\n🖼️ Gráficos: {len(rendered)} generados, {len(skipped)} sin cambios")
+    print("\n📊 Gráficos de comparación guardados en carpeta 'drift_charts/'")
 
-        # Crear tabla de contingencia solo con valores comunes
-        contingency = pd.crosstab(
-            X_train[col][X_train[col].isin(comunes)],
-            X_new[col][X_new[col].isin(comunes)]
-        )
 
-        # Saltar si la tabla queda vacía
-        if contingency.empty:
-            drift_results.append({
-                "Variable": col,
-                "Tipo": "Categórica",
-                "Métrica": "Chi²",
-                "Valor": None,
-                "P-value": np.nan,
-                "Alerta": "N/A (tabla vacía)"
-            })
-            continue
-
-        # Test Chi²
-        _, p_value, _, _ = chi2_contingency(contingency, correction=False)
-        drift_results.append({
-            "Variable": col,
-            "Tipo": "Categórica",
-            "Métrica": "Chi²",
-            "Valor": None,
-            "P-value": p_value,
-            "Alerta": "⚠️ Drift" if p_value < 0.05 else "✅ Estable"
-        })
-
-
-# Convertir resultados a DataFrame
-df_drift = pd.DataFrame(drift_results)
-print("\n📊 Resultados de Drift:")
-print(df_drift)
-
-# Calcular PSI global (solo numéricas)
-print("\n📈 Population Stability Index (PSI):")
-for c in X_train.select_dtypes(include=[np.number]).columns:
-    psi_val = psi(X_train[c], X_new[c])
-    alerta = "⚠️ Alto Drift" if psi_val > 0.2 else "✅ Estable"
-    print(f"{c}: {psi_val:.4f}  -> {alerta}")
-
-# Crear carpeta de gráficos si no existe
-os.makedirs("drift_charts", exist_ok=True)
-
-# Graficar comparaciones para variables numéricas
-for col in X_train.select_dtypes(include=[np.number]).columns:
-    plt.figure(figsize=(6, 4))
-    plt.hist(X_train[col], bins=20, alpha=0.5, label="Histórico (train)", color='skyblue', density=True)
-    plt.hist(X_new[col], bins=20, alpha=0.5, label="Actual (new)", color='salmon', density=True)
-    plt.title(f"Distribución de {col} - Histórico vs Actual")
-    plt.xlabel(col)
-    plt.ylabel("Densidad")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"drift_charts/{col}_drift.png")
-    plt.close()
-
-print("\n📊 Gráficos de comparación guardados en carpeta 'drift_charts/'")
-
-
-df_drift.to_csv("drift_results.csv", index=False)
-print("\n💾 Resultados guardados en 'drift_results.csv'")
+    df_drift.to_csv("drift_results.csv", index=False)
+    print("\n💾 Resultados guardados en 'drift_results.csv'")
@@ -0,0 +1,118 @@
+# model_registry.py
+# Registro declarativo de modelos: los candidatos, sus hiperparámetros y las
+# grillas de búsqueda se leen de config.json (sección "training").
+# Los resultados de cada corrida se guardan en SQLite para no repetirlas.
+
+import hashlib
+import importlib
+import itertools
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+CONFIG_PATH = "config.json"
+RESULTS_DB = "experiments.db"
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["training"]
+
+
+def build_estimator(spec, overrides=None):
+    """Instancia el estimador de un spec {"class": "modulo.Clase", "params": {...}}."""
+    module_name, class_name = spec["class"].rsplit(".", 1)
+    cls = getattr(importlib.import_module(module_name), class_name)
+    return cls(**{**spec.get("params", {}), **(overrides or {})})
+
+
+def candidates(config):
+    """Modelos base de config.json como lista de (estimador, nombre)."""
+    return [(build_estimator(spec), name) for name, spec in config["models"].items()]
+
+
+def expand_grid(config):
+    """
+    Corridas de la búsqueda: el modelo base de cada candidato más cada
+    combinación de su grilla. Devuelve dicts con name, class y params completos.
+    """
+    runs = []
+    for name, spec in config["models"].items():
+        grid = config.get("grids", {}).get(name, {})
+        keys = sorted(grid)
+        combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+        for overrides in [{}] + combos:
+            run = {"name": name, "class": spec["class"], "params": {**spec.get("params", {}), **overrides}}
+            # Parámetros efectivos (con los valores por defecto) para comparar corridas
+            run["resolved"] = build_estimator(run).get_params()
+            runs.append(run)
+    # Una misma combinación puede aparecer en la grilla y como modelo base
+    unique = {}
+    for run in runs:
+        unique.setdefault(run_id(run, None, None), run)
+    return list(unique.values())
+
+
+def run_id(run, data_version, cv):
+    """Hash del spec (clase + hiperparámetros efectivos) y de la versión de los datos."""
+    payload = json.dumps([run["class"], run["resolved"], data_version, cv], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class ResultsDB:
+    """Resultados de corridas en SQLite (una fila por run_id)."""
+
+    def __init__(self, path=RESULTS_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                model TEXT,
+                class TEXT,
+                params TEXT,
+                data_version TEXT,
+                cv_folds INTEGER,
+                status TEXT,
+                cv_f1_mean REAL,
+                cv_f1_std REAL,
+                test_f1 REAL,
+                test_roc_auc REAL,
+                seconds REAL,
+                started_at TEXT,
+                finished_at TEXT
+            )""")
+        self.conn.commit()
+
+    def done_ids(self):
+        return {r[0] for r in self.conn.execute("SELECT run_id FROM runs WHERE status = 'done'")}
+
+    def start(self, rid, run, data_version, cv):
+        # Si quedó en 'running' de una corrida interrumpida, se vuelve a empezar
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, model, class, params, data_version, cv_folds, status, started_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'running', ?)",
+            (rid, run["name"], run["class"], json.dumps(run["params"], sort_keys=True),
+             data_version, cv, time.strftime("%Y-%m-%d %H:%M:%S")))
+        self.conn.commit()
+
+    def finish(self, rid, metrics):
+        self.conn.execute(
+            "UPDATE runs SET status = 'done', cv_f1_mean = ?, cv_f1_std = ?, test_f1 = ?, "
+            "test_roc_auc = ?, seconds = ?, finished_at = ? WHERE run_id = ?",
+            (metrics["cv_f1_mean"], metrics["cv_f1_std"], metrics["test_f1"], metrics["test_roc_auc"],
+             metrics["seconds"], time.strftime("%Y-%m-%d %H:%M:%S"), rid))
+        self.conn.commit()
+
+    def query(self, sql, params=()):
+        """Consulta libre sobre la tabla `runs` como DataFrame."""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def top(self, n=10, data_version=None):
+        sql = "SELECT model, params, cv_f1_mean, cv_f1_std, test_f1, test_roc_auc, run_id FROM runs WHERE status = 'done'"
+        params = ()
+        if data_version:
+            sql += " AND data_version = ?"
+            params = (data_version,)
+        return self.query(sql + " ORDER BY cv_f1_mean DESC LIMIT ?", params + (n,))
@@ -8,15 +8,47 @@ from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, 
     f1_score, confusion_matrix, classification_report, roc_auc_score
 )
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
-from sklearn.tree import DecisionTreeClassifier
-from xgboost import XGBClassifier
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.base import clone
 import numpy as np
+import os
 
-# Cargar datos procesados
-# X_train, X_test, y_train, y_test, preprocessor = joblib.load("processed_data.pkl")
+from artifact_store import ArtifactStore
+from fold_cache import TransformCache
+from lean_model import export_lean
+from model_registry import candidates, load_config
+from prediction import COLOR_MAP, SIZE_MAP
+from training_scheduler import run_jobs
+
+# Piezas del split que ft_engineering guarda en el almacén de artefactos
+SPLIT_ARTIFACTS = ('X_train', 'X_test', 'y_train', 'y_test', 'preprocessor')
+# Mapas ordinales que la API aplica a Size y Color (para el artefacto lean)
+ORDINAL_MAPS = {'Size': SIZE_MAP, 'Color': COLOR_MAP}
+# Versiones de <Modelo>_model que reemplazan a la de config.json en el mismo split
+# (campo de sus metadatos -> script que las genera)
+DERIVED_MODELS = {'incremental': 'incremental_training.py', 'tuning': 'tuning.py'}
+
+
+def model_key(model, cv=None):
+    """Clave del modelo: split actual + clase e hiperparámetros (+ folds de CV)."""
+    return store.key(split_key, type(model).__name__, model.get_params(), cv)
+
+def deployed_key(model_name):
+    """
+    (clave, script) de la versión actual de `<Modelo>_model` si salió de tuning.py
+    o de incremental_training.py sobre el split actual, o (None, None). Esa versión
+    reemplaza a la de config.json y no se vuelve a entrenar ni a sobrescribir
+    mientras no cambie el split.
+    """
+    try:
+        meta = store.meta(f"{model_name}_model")
+    except FileNotFoundError:
+        return None, None
+    if meta.get("split") == split_key:
+        for field, script in DERIVED_MODELS.items():
+            if field in meta:
+                return store.ref(f"{model_name}_model"), script
+    return None, None
 
 def summarize_classification(y_true, y_pred, model_name):
     print(f"\n🔍 Resultados para {model_name}")
@@ -31,69 +63,129 @@ def summarize_classification(y_true, y_pred, model_name):
         "confusion_matrix": confusion_matrix(y_true, y_pred)
     }
 
-def build_model(model, model_name):
-    pipe = Pipeline([
-        ('preprocessor', preprocessor),
-        ('classifier', model)
-    ], memory=None)
-    
-    pipe.fit(X_train, y_train)
+def build_model(model, model_name, fitted=None):
+    """
+    Evalúa el modelo en el holdout y guarda el pipeline desplegable.
+    `fitted` es el clasificador ya ajustado por el planificador (si lo hay).
+    """
+    key = model_key(model)
+    deployed, source = deployed_key(model_name)
+    if deployed:
+        print(f"♻️ {model_name}: se mantiene la versión de {source} ({deployed})")
+        pipe = store.get(f"{model_name}_model", deployed)
+    elif store.has(f"{model_name}_model", key):
+        # Mismo split y mismos hiperparámetros: no se vuelve a entrenar
+        print(f"♻️ {model_name}: modelo sin cambios, se reutiliza ({key})")
+        pipe = store.get(f"{model_name}_model", key)
+    else:
+        # El preprocesador se ajusta una sola vez y lo comparten todos los modelos
+        fitted_pre, Xt_train, _ = transform_cache.full(X_test)
+        if fitted is None:
+            fitted = model.fit(Xt_train, y_train)
+        pipe = Pipeline([
+            ('preprocessor', fitted_pre),
+            ('classifier', fitted)
+        ], memory=None)
+        store.put(f"{model_name}_model", key, pipe, meta={"split": split_key, "params": model.get_params()})
+
     preds = pipe.predict(X_test)
     
     metrics = summarize_classification(y_test, preds, model_name)
     joblib.dump(pipe, f"{model_name}_model.pkl")
+    # Artefacto de inferencia compacto (solo NumPy) para servir sin sklearn
+    export_lean(pipe, ORDINAL_MAPS, f"{model_name}_lean")
     return metrics
 
+def cv_folds(cv=5):
+    """Folds de StratifiedKFold (igual que cross_val_score con cv=int)."""
+    return list(StratifiedKFold(n_splits=cv).split(X_train, y_train))
+
+def cv_scores(model, model_name, cv=5, fold_scores=None):
+    """
+    F1 por fold. Las matrices transformadas de cada fold salen de `transform_cache`;
+    `fold_scores` son los F1 ya calculados por el planificador (si los hay).
+    """
+    key = model_key(model, cv=cv)
+    if store.has(f"{model_name}_cv", key):
+        return store.get(f"{model_name}_cv", key)
+
+    if fold_scores is None:
+        fold_scores = []
+        for train_idx, test_idx in cv_folds(cv):
+            _, Xt_fold_train, Xt_fold_test = transform_cache.fold(train_idx, test_idx)
+            clf = clone(model).fit(Xt_fold_train, y_train.iloc[train_idx])
+            fold_scores.append(f1_score(y_train.iloc[test_idx], clf.predict(Xt_fold_test)))
+    scores = np.array(fold_scores)
+    store.put(f"{model_name}_cv", key, scores)
+    return scores
+
 def cross_validation(model, model_name, cv=5):
     """Evalúa un modelo usando validación cruzada (cross-validation)"""
-    pipe = Pipeline([
-        ('preprocessor', preprocessor),
-        ('classifier', model)
-    ], memory=None)
-    scores = cross_val_score(pipe, X_train, y_train, cv=cv, scoring='f1', n_jobs=-1)
+    scores = cv_scores(model, model_name, cv=cv)
     mean_f1, std_f1 = scores.mean(), scores.std()
     print(f"🔁 Cross-validation {cv}-fold para {model_name}: F1 mean={mean_f1:.3f}, std={std_f1:.3f}")
     return mean_f1, std_f1
 
+def schedule_training(holdout_models, cv_models, cv=5, budget=None):
+    """
+    Ajusta en paralelo (training_scheduler) todo lo que no esté ya en el almacén:
+    el holdout de `holdout_models` y cada fold de CV de `cv_models`.
+    """
+    _, Xt_train, Xt_test = transform_cache.full(X_test)
+    folds = {'holdout': (Xt_train, y_train, Xt_test, y_test)}
+    jobs = []
+    for model, model_name in holdout_models:
+        if deployed_key(model_name)[0] is None and not store.has(f"{model_name}_model", model_key(model)):
+            jobs.append({'kind': 'holdout', 'name': model_name, 'model': model, 'fold': 'holdout'})
+
+    pending_cv = [(m, n) for m, n in cv_models if not store.has(f"{n}_cv", model_key(m, cv=cv))]
+    if pending_cv:
+        for i, (train_idx, test_idx) in enumerate(cv_folds(cv)):
+            _, Xt_fold_train, Xt_fold_test = transform_cache.fold(train_idx, test_idx)
+            folds[i] = (Xt_fold_train, y_train.iloc[train_idx], Xt_fold_test, y_train.iloc[test_idx])
+            for model, model_name in pending_cv:
+                jobs.append({'kind': 'cv', 'name': model_name, 'model': model, 'fold': i})
+
+    outputs, report = run_jobs(jobs, folds, budget)
+    transform_cache.record_workers(report["cache"])
+    print(f"\n⚙️ Planificador: {report['jobs']} ajustes con {report['budget']} núcleos en "
+          f"{report['wall_seconds']}s (secuencial: {report['serial_seconds']}s)")
+    return outputs
+
 if __name__ == "__main__":
     print("📦 Cargando datos procesados...")
-    X_train, X_test, y_train, y_test, preprocessor = joblib.load("processed_data.pkl")
+    store = ArtifactStore()
+    split_key = store.ref("X_train")
+    X_train, X_test, y_train, y_test, preprocessor = (store.get(n, split_key) for n in SPLIT_ARTIFACTS)
+    # El paralelismo lo maneja el planificador; el ColumnTransformer corre en un solo hilo
+    preprocessor.set_params(n_jobs=1)
+    transform_cache = TransformCache(preprocessor, X_train, y_train)
+
+    # Candidatos e hiperparámetros definidos en config.json
+    config = load_config()
+    cv = config.get("cv_folds", 5)
+    holdout_models = candidates(config)
+    cv_models = [(clone(model), model_name) for model, model_name in holdout_models]
+
+    # Holdout y folds de CV de todos los modelos a la vez (TRAIN_CORES = núcleos a usar)
+    budget = int(os.getenv("TRAIN_CORES", "0")) or None
+    outputs = schedule_training(holdout_models, cv_models, cv=cv, budget=budget)
 
     # Entrenamiento de varios modelos
     results = []
-    results.append(build_model(LogisticRegression(max_iter=5000, 
-                                                random_state=42, 
-                                                n_jobs=-1), 
-                               "LogisticRegression"))
-    results.append(build_model(RandomForestClassifier(n_estimators=200, random_state=42,n_jobs=-1, class_weight='balanced_subsample',
-                                                    min_samples_leaf=1,
-                                                    max_features='sqrt'), "RandomForest"))
-    results.append(build_model(DecisionTreeClassifier(random_state=42,min_samples_leaf=1, max_features='sqrt',ccp_alpha=0.0), "DecisionTree"))
-    results.append(build_model(GradientBoostingClassifier(n_estimators=200, random_state=42,min_samples_leaf=1, max_features='sqrt', learning_rate=0.1), "GradientBoosting"))
-    results.append(build_model(XGBClassifier(n_estimators=200, use_label_encoder=False, eval_metric='logloss', random_state=42,n_jobs=-1), "XGBoost"))
+    for model, model_name in holdout_models:
+        results.append(build_model(model, model_name, fitted=outputs.get(('holdout', model_name))))
     
-    print("Evaluación con validación cruzada (5-fold CV) ===")
-
-    for model, model_name in [
-        (LogisticRegression(max_iter=5000, random_state=42, n_jobs=-1), "LogisticRegression"),
-        (RandomForestClassifier(
-            n_estimators=200, random_state=42, n_jobs=-1,
-            class_weight='balanced_subsample', min_samples_leaf=1, max_features='sqrt'), "RandomForest"),
-        (DecisionTreeClassifier(random_state=42, min_samples_leaf=1, max_features='sqrt', ccp_alpha=0.0), "DecisionTree"),
-        (GradientBoostingClassifier(
-            n_estimators=200, random_state=42, min_samples_leaf=1,
-            max_features='sqrt', learning_rate=0.1), "GradientBoosting"),
-        (XGBClassifier(
-            n_estimators=200, eval_metric='logloss',
-            random_state=42, n_jobs=-1), "XGBoost")
-    ]:
-        pipe = Pipeline([
-            ('preprocessor', preprocessor),
-            ('classifier', model)
-        ], memory=None)
-        scores = cross_val_score(pipe, X_train, y_train, cv=5, scoring='f1', n_jobs=-1)
-        print(f"{model_name} → F1 promedio (5-fold): {scores.mean():.3f} ± {scores.std():.3f}")
+    print(f"Evaluación con validación cruzada ({cv}-fold CV) ===")
+
+    for model, model_name in cv_models:
+        scores = cv_scores(model, model_name, cv=cv, fold_scores=outputs.get(('cv', model_name)))
+        print(f"{model_name} → F1 promedio ({cv}-fold): {scores.mean():.3f} ± {scores.std():.3f}")
 
+    cache_stats = transform_cache.stats()
+    print(f"\n🗃️ Cache de preprocesamiento: {cache_stats['misses']} ajustes, {cache_stats['hits']} reutilizaciones "
+          f"(hit rate {cache_stats['hit_rate']:.0%}, {cache_stats['fit_seconds']}s ajustando, "
+          f"{cache_stats['worker_loads']} cargas de folds en los procesos)")
     
     # Comparar resultados
     df_results = pd.DataFrame(results)
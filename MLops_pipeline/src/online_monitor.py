@@ -0,0 +1,235 @@
+# online_monitor.py
+# Monitoreo de drift en línea sobre el tráfico real de la API.
+#
+# La API solo encola los registros puntuados (sin bloquear la petición); un hilo
+# en segundo plano los agrega en conteos por variable (tramos de la ECDF para KS,
+# bins de PSI y frecuencias de categorías) contra el perfil de referencia.
+# Los conteos se organizan en paneles de `slide` registros y la ventana son los
+# últimos `window_size / slide` paneles: con slide == window_size la ventana es
+# fija (tumbling) y con slide < window_size es deslizante. Al cerrar cada panel
+# se evalúa la ventana sin volver a recorrer registros anteriores.
+# Los resultados se escriben por lotes en SQLite (monitoring.db).
+
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+import pandas as pd
+
+from drift_engine import P_VALUE_THRESHOLD, PSI_THRESHOLD, as_plain
+
+MONITOR_DB = "monitoring.db"
+
+
+def load_profile(path=None):
+    """Perfil de referencia desde un .joblib o, por defecto, el último del almacén de artefactos."""
+    if path:
+        import joblib
+        return joblib.load(path)
+    # Import diferido: artifact_store.py no se copia a la imagen de Docker; ahí el
+    # perfil se pasa como archivo (MONITOR_PROFILE)
+    from artifact_store import ArtifactStore
+    return ArtifactStore().get("reference_profile")
+
+
+class _Counts:
+    """Conteos agregados de un panel o de la ventana completa."""
+
+    def __init__(self, profile):
+        self.n = 0
+        self.ks = {c: np.zeros(len(profile.ecdf[c][0]) + 1, dtype=np.int64) for c in profile.numeric}
+        self.psi = {c: np.zeros(len(profile.psi_edges[c]) - 1, dtype=np.int64) for c in profile.numeric}
+        self.cat = {c: Counter() for c in profile.categorical}
+
+    def add(self, other, sign=1):
+        self.n += sign * other.n
+        for c in self.ks:
+            self.ks[c] += sign * other.ks[c]
+            self.psi[c] += sign * other.psi[c]
+        for c in self.cat:
+            if sign > 0:
+                self.cat[c].update(other.cat[c])
+            else:
+                self.cat[c].subtract(other.cat[c])
+
+
+class OnlineDriftMonitor:
+    """
+    Drift incremental sobre ventanas de registros.
+
+        monitor = OnlineDriftMonitor(profile, window_size=1000, slide=250)
+        monitor.observe([registro, ...])          # desde la API, no bloquea
+        monitor.latest()                          # última evaluación
+    """
+
+    def __init__(self, profile, window_size=1000, slide=None, prepare=None,
+                 db_path=MONITOR_DB, flush_rows=500, flush_seconds=2.0, max_queue=10000):
+        self.profile = profile
+        self.window_size = window_size
+        self.slide = slide or window_size
+        if window_size % self.slide:
+            raise ValueError("window_size debe ser múltiplo de slide")
+        self.panes_per_window = window_size // self.slide
+        self.prepare = prepare
+        self.db_path = db_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pane = _Counts(profile)
+        self._panes = deque()
+        self._window = _Counts(profile)
+        self._pending_rows = []
+        self._latest = None
+        self._lock = threading.Lock()
+        self.stats = {"observed": 0, "dropped": 0, "rejected": 0, "windows": 0, "alerts": 0, "written": 0}
+
+        self._thread = threading.Thread(target=self._run, name="online-drift-monitor", daemon=True)
+        self._thread.start()
+
+    # --- Lado de la API ---
+    def observe(self, data, prepared=False):
+        """
+        Encola registros (lista de dicts o DataFrame). Si `prepared` es False se
+        pasan por `prepare` en el hilo del monitor. Si la cola está llena el lote
+        se descarta: el monitoreo nunca frena la petición.
+        """
+        try:
+            self._queue.put_nowait((data, prepared))
+        except queue.Full:
+            self.stats["dropped"] += len(data)
+
+    def latest(self):
+        with self._lock:
+            return self._latest
+
+    def summary(self):
+        return {**self.stats, "queued": self._queue.qsize(), "window_size": self.window_size,
+                "slide": self.slide, "window_rows": self._window.n}
+
+    def close(self, timeout=10):
+        """Procesa lo pendiente, escribe lo que falta y detiene el hilo."""
+        self._queue.put((None, None))
+        self._thread.join(timeout)
+
+    # --- Hilo del monitor ---
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS drift_windows (
+                window_id INTEGER,
+                ended_at TEXT,
+                rows INTEGER,
+                variable TEXT,
+                tipo TEXT,
+                metrica TEXT,
+                valor REAL,
+                p_value REAL,
+                psi REAL,
+                alerta TEXT
+            )""")
+        conn.commit()
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            items = []
+            try:
+                items.append(self._queue.get(timeout=self.flush_seconds))
+                # Tomar todo lo que ya esté en cola para procesarlo de una vez
+                while len(items) < 256:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            for data, prepared in items:
+                if data is None:
+                    stop = True
+                    continue
+                self._process(data, prepared)
+            if self._pending_rows and (stop or len(self._pending_rows) >= self.flush_rows
+                                       or time.monotonic() - last_flush >= self.flush_seconds):
+                self._flush(conn)
+                last_flush = time.monotonic()
+        conn.close()
+
+    def _process(self, data, prepared):
+        try:
+            df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+            if not prepared and self.prepare is not None:
+                df = self.prepare(df.copy())
+            df = as_plain(df)
+        except Exception as e:
+            self.stats["rejected"] += len(data)
+            print(f"Monitor: registros descartados ({type(e).__name__}: {e})")
+            return
+        self.stats["observed"] += len(df)
+        # Partir el lote en los límites de panel
+        start = 0
+        while start < len(df):
+            take = min(len(df) - start, self.slide - self._pane.n)
+            self._update(self._pane, df.iloc[start:start + take])
+            start += take
+            if self._pane.n == self.slide:
+                self._close_pane()
+
+    def _update(self, counts, df):
+        profile = self.profile
+        counts.n += len(df)
+        for c in profile.numeric:
+            values = df[c].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            counts.ks[c] += profile.ks_buckets(c, values)
+            counts.psi[c] += np.histogram(values, bins=profile.psi_edges[c])[0]
+        for c in profile.categorical:
+            counts.cat[c].update(df[c].dropna().tolist())
+
+    def _close_pane(self):
+        self._panes.append(self._pane)
+        self._window.add(self._pane)
+        if len(self._panes) > self.panes_per_window:
+            self._window.add(self._panes.popleft(), sign=-1)
+        self._pane = _Counts(self.profile)
+        if len(self._panes) == self.panes_per_window:
+            self._evaluate()
+
+    def _evaluate(self):
+        profile, window = self.profile, self._window
+        self.stats["windows"] += 1
+        window_id = self.stats["windows"]
+        ended_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        results = []
+        for c in profile.columns:
+            if c in profile.ecdf:
+                n_valid = int(window.ks[c].sum())
+                if n_valid == 0:
+                    continue
+                stat, p_value = profile.ks_from_buckets(c, window.ks[c])
+                psi_val = profile.psi_from_counts(c, window.psi[c], n_valid)
+                drift = p_value < P_VALUE_THRESHOLD or psi_val > PSI_THRESHOLD
+                results.append({"Variable": c, "Tipo": "Numérica", "Métrica": "KS Test (aprox.)",
+                                "Valor": float(stat), "P-value": float(p_value), "PSI": float(psi_val),
+                                "Alerta": "⚠️ Drift" if drift else "✅ Estable"})
+            else:
+                p_value, na_alert = profile.chi2_from_counts(c, dict(window.cat[c]))
+                results.append({"Variable": c, "Tipo": "Categórica", "Métrica": "Chi²",
+                                "Valor": None, "P-value": None if na_alert else float(p_value), "PSI": None,
+                                "Alerta": na_alert or ("⚠️ Drift" if p_value < P_VALUE_THRESHOLD else "✅ Estable")})
+
+        drifted = [r["Variable"] for r in results if r["Alerta"] == "⚠️ Drift"]
+        if drifted:
+            self.stats["alerts"] += 1
+            print(f"🚨 Drift en la ventana #{window_id} ({window.n} registros): {', '.join(drifted)}")
+        with self._lock:
+            self._latest = {"window_id": window_id, "ended_at": ended_at, "rows": window.n,
+                            "drift": drifted, "results": results}
+        self._pending_rows.extend(
+            (window_id, ended_at, window.n, r["Variable"], r["Tipo"], r["Métrica"], r["Valor"],
+             r["P-value"], r["PSI"], r["Alerta"]) for r in results)
+
+    def _flush(self, conn):
+        conn.executemany("INSERT INTO drift_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending_rows)
+        conn.commit()
+        self.stats["written"] += len(self._pending_rows)
+        self._pending_rows = []
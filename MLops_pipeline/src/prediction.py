@@ -0,0 +1,84 @@
+# prediction.py
+# Preparación de registros y predicción compartidas por la API y el scoring masivo.
+
+import numpy as np
+import pandas as pd
+
+# Mapas ordinales (deben coincidir con los usados en feature_engineering)
+SIZE_MAP = {'Small': 0, 'Medium': 1, 'Large': 2}
+COLOR_MAP = {'Black': 0, 'Brown': 1, 'Gray': 2, 'Orange': 3, 'White': 4}
+
+
+def prepare_dataframe(df: pd.DataFrame, model) -> pd.DataFrame:
+    """
+    Asegura que el DataFrame tenga las columnas con tipos esperados por el pipeline:
+    - Convierte Size y Color a numérico si vienen como texto.
+    - Reordena las columnas según el preprocessor del modelo.
+    """
+    # Si columnas ordinales vienen como texto, mapearlas
+    if 'Size' in df.columns:
+        df['Size'] = df['Size'].map(SIZE_MAP).astype(float)
+    if 'Color' in df.columns:
+        df['Color'] = df['Color'].map(COLOR_MAP).astype(float)
+
+    # Si hay columnas binarias como 'Sí'/'No', convertir a 1/0 (por seguridad)
+    for col in ['Vaccinated', 'HealthCondition', 'PreviousOwner']:
+        # (con pandas >= 3 los textos tienen dtype `str` y no `object`)
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].replace({'Sí': 1, 'Si': 1, 'No': 0, 'no': 0, 'sí': 1, 'si': 1}).astype(float)
+
+    # Reordenar columnas según el preprocessor (si está disponible en el pipeline)
+    try:
+        expected = list(model.named_steps['preprocessor'].feature_names_in_)
+        missing = [c for c in expected if c not in df.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas requeridas para la predicción: {missing}")
+        df = df[expected]
+    except Exception as e:
+        # Si no hay modelo o no existe feature_names_in_, devolvemos el df como está y el error será manejado arriba
+        print(f"Error: {e}")
+        raise e
+
+    return df
+
+
+def predict_frame(model, df_prepared: pd.DataFrame):
+    """Predicción y probabilidad con una sola pasada por el pipeline (predict = clase más probable)."""
+    probas = model.predict_proba(df_prepared)
+    preds = model.classes_[probas.argmax(axis=1)]
+    return preds, probas[:, 1]
+
+
+def score_frame(model, df: pd.DataFrame):
+    """
+    (clases, probabilidades) de registros con los valores originales (Size/Color
+    como texto) en una sola llamada vectorizada, con el Pipeline o con el
+    artefacto lean. Con el lean, las filas que no se pueden resolver quedan con
+    clase -1 y probabilidad NaN.
+    """
+    if hasattr(model, "transform_records"):
+        X, ok = model.transform_records(df.to_dict(orient="records"))
+        preds = np.full(len(df), -1, dtype=np.int64)
+        probs = np.full(len(df), np.nan)
+        if ok.any():
+            proba = model.predict_proba(X[ok])
+            preds[ok] = model.classes[proba.argmax(axis=1)]
+            probs[ok] = proba[:, 1]
+        return preds, probs
+    return predict_frame(model, prepare_dataframe(df.copy(), model))
+
+
+def what_if_grid(base_record: dict, x_col: str, x_values, y_col: str, y_values) -> pd.DataFrame:
+    """
+    Una fila por cada combinación de x_values × y_values, con el resto de las
+    columnas iguales a `base_record` (la fila i corresponde a y_values[i // len(x_values)]
+    y x_values[i % len(x_values)]).
+    """
+    xx, yy = np.meshgrid(np.asarray(x_values), np.asarray(y_values))
+    n = xx.size
+    grid = pd.DataFrame({col: np.repeat(np.asarray([value], dtype=object if isinstance(value, str) else None), n)
+                         for col, value in base_record.items()})
+    grid[x_col] = xx.ravel()
+    grid[y_col] = yy.ravel()
+    return grid
+
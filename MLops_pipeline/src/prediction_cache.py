@@ -0,0 +1,132 @@
+# prediction_cache.py
+# Cache en memoria (LRU + TTL) de predicciones para la API.
+#
+# La clave es un hash de la fila que recibe el clasificador: la fila ya pasada por
+# `prepare_dataframe` (mapas ordinales, 'Sí'/'si' -> 1) y por el preprocesador, junto
+# con la versión del modelo. Dos registros que el modelo ve iguales comparten la
+# entrada, vengan por la ruta rápida o por la de pandas. Varias versiones del modelo
+# pueden convivir; `retain` elimina las entradas de las que ya no están cargadas.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+
+def artifact_version(path):
+    """Versión del modelo: nombre del archivo + hash de su contenido."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return f"{os.path.basename(path)}@{h.hexdigest()[:12]}"
+
+
+def row_keys(X, version):
+    """Clave canónica (16 bytes) de cada fila de X para una versión del modelo."""
+    # Una fila CSR y la misma fila densa dan la misma clave
+    X = X.toarray() if sparse.issparse(X) else X
+    X = np.array(X, dtype=np.float64, order="C")
+    # -0.0 y 0.0 (o NaN con distinto payload) deben dar la misma clave
+    X += 0.0
+    X[np.isnan(X)] = np.nan
+    version_key = hashlib.sha256(version.encode()).digest()
+    return [hashlib.blake2b(row, digest_size=16, key=version_key).digest() for row in X]
+
+
+class PredictionCache:
+    """
+    Cache acotado a `max_entries` entradas que expiran a los `ttl_seconds`.
+
+        cache = PredictionCache(max_entries=100_000, ttl_seconds=3600)
+        preds, probs = cache.predict(X, "RandomForest_model.pkl@ab12...", clasificar)
+
+    `clasificar(X_faltantes)` devuelve (clases, probabilidades) solo de las filas
+    que no estaban en cache.
+    """
+
+    def __init__(self, max_entries=100_000, ttl_seconds=3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # clave -> (clase, probabilidad, vence, versión)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get_many(self, keys):
+        """Resultados (clase, probabilidad) alineados con `keys`; None si no están."""
+        now = time.monotonic()
+        found = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] <= now:
+                    del self._entries[key]
+                    self.stats["expired"] += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[i] = entry[:2]
+            hits = sum(r is not None for r in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(keys) - hits
+        return found
+
+    def put_many(self, keys, preds, probs, version):
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, pred, prob in zip(keys, preds, probs):
+                self._entries[key] = (pred, prob, expires, version)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def predict(self, X, version, classify):
+        """
+        (clases, probabilidades) de las filas transformadas X. Solo se puntúan las
+        que no están en cache, y las repetidas dentro del lote una sola vez.
+        """
+        keys = row_keys(X, version)
+        found = self.get_many(keys)
+        preds = np.empty(len(keys), dtype=np.int64)
+        probs = np.empty(len(keys), dtype=np.float64)
+
+        missing = {}  # clave -> filas del lote con esa clave
+        for i, (key, result) in enumerate(zip(keys, found)):
+            if result is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                preds[i], probs[i] = result
+
+        if missing:
+            first = [rows[0] for rows in missing.values()]
+            new_preds, new_probs = classify(X[first] if sparse.issparse(X) else np.asarray(X)[first])
+            for rows, pred, prob in zip(missing.values(), new_preds, new_probs):
+                preds[rows] = pred
+                probs[rows] = prob
+            self.put_many(list(missing), [int(p) for p in new_preds], [float(p) for p in new_probs], version)
+        return preds, probs
+
+    def retain(self, versions):
+        """Elimina las entradas de versiones del modelo que ya no están cargadas."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[3] not in versions]
+            for key in stale:
+                del self._entries[key]
+            self.stats["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def summary(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "size": size, "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
@@ -0,0 +1,278 @@
+# prediction_log.py
+# Registro de predicciones y seguimiento del desempeño con etiquetas tardías.
+#
+# - La API registra cada predicción (request_id, hora, clase, probabilidad, modelo)
+#   en un buffer que se escribe por lotes, en segundo plano, como Parquet.
+# - Las etiquetas reales (AdoptionLikelihood) llegan después y se agregan con
+#   `python prediction_log.py labels resultados.csv`.
+# - `python prediction_log.py report` calcula el PSI de la probabilidad por ventana
+#   y el F1/ROC-AUC móvil (F1 con summarize_classification, ROC-AUC con la probabilidad).
+#
+# Predicciones y etiquetas se particionan por un hash del request_id
+# (bucket=00..07), así el cruce se hace bucket por bucket y nunca se carga el
+# registro completo en memoria.
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from drift_engine import PSI_THRESHOLD, psi_value
+
+LOG_DIR = "prediction_log"
+N_BUCKETS = 8
+# Bins fijos para la distribución de la probabilidad predicha
+SCORE_BINS = np.linspace(0, 1, 11)
+
+
+def _buckets(request_ids):
+    """Bucket estable (crc32) de cada request_id."""
+    return np.fromiter((zlib.crc32(str(i).encode()) % N_BUCKETS for i in request_ids),
+                       dtype=np.int64, count=len(request_ids))
+
+
+def _write_partitioned(root, table):
+    """Escribe `table` en root/bucket=XX/part-*.parquet según su request_id."""
+    buckets = _buckets(table.column("request_id").to_pylist())
+    stamp = time.strftime("%Y%m%d%H%M%S")
+    for b in np.unique(buckets):
+        part_dir = os.path.join(root, f"bucket={b:02d}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(table.filter(pa.array(buckets == b)), path)
+
+
+def _read_bucket(root, bucket, columns):
+    files = sorted(glob.glob(os.path.join(root, f"bucket={bucket:02d}", "*.parquet")))
+    if not files:
+        return pd.DataFrame(columns=columns)
+    return pa.concat_tables([pq.read_table(f, columns=columns) for f in files]).to_pandas()
+
+
+class PredictionLog:
+    """
+    Registro de solo escritura con buffer. `log` solo agrega a memoria; un hilo
+    escribe el buffer cada `flush_seconds` o al llegar a `flush_rows` filas.
+    """
+
+    def __init__(self, root=LOG_DIR, model_version=None, flush_rows=10000, flush_seconds=30.0):
+        self.root = os.path.join(root, "predictions")
+        self.model_version = model_version
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._buffer = {"request_id": [], "ts": [], "prediction": [], "probability": [], "model": []}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self.stats = {"logged": 0, "written": 0, "files": 0}
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def log(self, request_ids, predictions, probabilities, model_version=None):
+        now = time.time_ns() // 1_000_000  # ms desde epoch (UTC)
+        model_version = model_version or self.model_version
+        with self._lock:
+            self._buffer["request_id"].extend(str(i) for i in request_ids)
+            self._buffer["ts"].extend([now] * len(request_ids))
+            self._buffer["prediction"].extend(int(p) for p in predictions)
+            self._buffer["probability"].extend(float(p) for p in probabilities)
+            self._buffer["model"].extend([model_version] * len(request_ids))
+            self.stats["logged"] += len(request_ids)
+            full = len(self._buffer["request_id"]) >= self.flush_rows
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            buffer = self._buffer
+            self._buffer = {k: [] for k in buffer}
+        if not buffer["request_id"]:
+            return
+        table = pa.table({
+            "request_id": pa.array(buffer["request_id"], pa.string()),
+            "ts": pa.array(np.array(buffer["ts"], dtype="datetime64[ms]")),
+            "prediction": pa.array(buffer["prediction"], pa.int8()),
+            "probability": pa.array(buffer["probability"], pa.float32()),
+            "model": pa.array(buffer["model"], pa.string()),
+        })
+        _write_partitioned(self.root, table)
+        self.stats["written"] += table.num_rows
+        self.stats["files"] += 1
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error al escribir el registro de predicciones: {e}")
+        self.flush()
+
+
+# --- Etiquetas tardías ---
+def log_labels(request_ids, labels, root=LOG_DIR):
+    """Agrega etiquetas reales (1/0) para predicciones ya registradas."""
+    table = pa.table({
+        "request_id": pa.array([str(i) for i in request_ids], pa.string()),
+        "label": pa.array([int(v) for v in labels], pa.int8()),
+        "labeled_at": pa.array(np.full(len(request_ids), time.time_ns() // 1_000_000, dtype="datetime64[ms]")),
+    })
+    _write_partitioned(os.path.join(root, "labels"), table)
+    return table.num_rows
+
+
+def backfill_labels(csv_path, root=LOG_DIR, id_col="request_id", label_col="AdoptionLikelihood",
+                    chunksize=100_000):
+    """Carga etiquetas desde un CSV (request_id, AdoptionLikelihood) por bloques."""
+    total = 0
+    with pd.read_csv(csv_path, usecols=[id_col, label_col], chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk = chunk.dropna()
+            total += log_labels(chunk[id_col].tolist(), chunk[label_col].tolist(), root)
+    print(f"🏷️ {total} etiquetas agregadas a '{root}'")
+    return total
+
+
+# --- Análisis ---
+def save_score_reference(probabilities, root=LOG_DIR):
+    """Distribución de referencia de la probabilidad (por ejemplo, sobre el holdout)."""
+    counts, _ = np.histogram(probabilities, bins=SCORE_BINS)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "score_reference.json"), "w") as f:
+        json.dump({"bins": SCORE_BINS.tolist(), "expected": (counts / len(probabilities)).tolist(),
+                   "rows": len(probabilities)}, f, indent=2)
+
+
+def _holdout_reference(root, model_path):
+    """Referencia a partir de las probabilidades del modelo sobre X_test."""
+    import joblib
+    from artifact_store import ArtifactStore
+    from prediction import predict_frame
+    model = joblib.load(model_path)
+    _, probs = predict_frame(model, ArtifactStore().get("X_test"))
+    save_score_reference(probs, root)
+
+
+def _window_key(ts, freq):
+    return ts.dt.floor(freq).dt.strftime("%Y%m%dT%H%M")
+
+
+def score_psi(root=LOG_DIR, freq="D"):
+    """PSI de la probabilidad predicha por ventana, acumulando histogramas por bucket."""
+    with open(os.path.join(root, "score_reference.json")) as f:
+        expected = np.array(json.load(f)["expected"])
+    counts = {}
+    for b in range(N_BUCKETS):
+        preds = _read_bucket(os.path.join(root, "predictions"), b, ["ts", "probability"])
+        if preds.empty:
+            continue
+        preds["window"] = _window_key(preds["ts"], freq)
+        for window, group in preds.groupby("window"):
+            hist, _ = np.histogram(group["probability"].to_numpy(), bins=SCORE_BINS)
+            counts[window] = counts.get(window, 0) + hist
+    rows = []
+    for window in sorted(counts):
+        n = int(counts[window].sum())
+        psi_val = psi_value(expected, counts[window] / n)
+        rows.append({"window": window, "rows": n, "psi": psi_val,
+                     "Alerta": "⚠️ Alto Drift" if psi_val > PSI_THRESHOLD else "✅ Estable"})
+    return pd.DataFrame(rows, columns=["window", "rows", "psi", "Alerta"])
+
+
+def join_labels(root=LOG_DIR, freq="D"):
+    """
+    Cruza predicciones y etiquetas bucket por bucket y deja el resultado en
+    root/joined/window=<ventana>/bucket-XX.parquet. Devuelve las ventanas con datos.
+    """
+    joined_dir = os.path.join(root, "joined")
+    shutil.rmtree(joined_dir, ignore_errors=True)
+    windows = set()
+    for b in range(N_BUCKETS):
+        preds = _read_bucket(os.path.join(root, "predictions"), b, ["request_id", "ts", "prediction", "probability"])
+        labels = _read_bucket(os.path.join(root, "labels"), b, ["request_id", "label"])
+        if preds.empty or labels.empty:
+            continue
+        # Si una etiqueta se corrigió, vale la última
+        labels = labels.drop_duplicates("request_id", keep="last")
+        merged = preds.merge(labels, on="request_id", how="inner")
+        merged["window"] = _window_key(merged["ts"], freq)
+        for window, group in merged.groupby("window"):
+            out_dir = os.path.join(joined_dir, f"window={window}")
+            os.makedirs(out_dir, exist_ok=True)
+            group[["label", "prediction", "probability"]].to_parquet(
+                os.path.join(out_dir, f"bucket-{b:02d}.parquet"), index=False)
+            windows.add(window)
+    return sorted(windows)
+
+
+def rolling_performance(root=LOG_DIR, freq="D", rolling=7):
+    """
+    F1/ROC-AUC sobre las últimas `rolling` ventanas con etiqueta, para cada ventana.
+    Solo se leen a la vez las particiones de esas ventanas.
+    """
+    # Import diferido: la API usa este módulo sin las dependencias de entrenamiento
+    from sklearn.metrics import roc_auc_score
+    from model_training_evaluation import summarize_classification
+
+    windows = join_labels(root, freq)
+    rows = []
+    for i, window in enumerate(windows):
+        span = windows[max(0, i - rolling + 1):i + 1]
+        data = pd.concat([pd.read_parquet(os.path.join(root, "joined", f"window={w}")) for w in span])
+        if data["label"].nunique() < 2:
+            print(f"⏭️ Ventana {window}: una sola clase en las etiquetas, se omite")
+            continue
+        metrics = summarize_classification(data["label"], data["prediction"], f"ventanas {span[0]}..{window}")
+        # El ROC-AUC se calcula con la probabilidad registrada, no con la clase 0/1
+        rows.append({"window": window, "labeled_rows": len(data), "F1": metrics["F1"],
+                     "roc_auc": roc_auc_score(data["label"], data["probability"]), "Accuracy": metrics["Accuracy"]})
+    return pd.DataFrame(rows, columns=["window", "labeled_rows", "F1", "roc_auc", "Accuracy"])
+
+
+def report(root=LOG_DIR, freq="D", rolling=7, model_path="RandomForest_model.pkl"):
+    if not os.path.exists(os.path.join(root, "score_reference.json")):
+        _holdout_reference(root, model_path)
+    df_psi = score_psi(root, freq)
+    print("\n📈 PSI de la probabilidad por ventana:")
+    print(df_psi)
+    df_perf = rolling_performance(root, freq, rolling)
+    print("\n📉 Desempeño móvil con etiquetas reales:")
+    print(df_perf)
+    df = df_psi.merge(df_perf, on="window", how="left")
+    df.to_csv("performance_report.csv", index=False)
+    print("\n💾 Resultados guardados en 'performance_report.csv'")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro de predicciones: etiquetas tardías y reporte de desempeño.")
+    parser.add_argument("--root", default=LOG_DIR, help="Carpeta del registro")
+    sub = parser.add_subparsers(dest="command", required=True)
+    labels_cmd = sub.add_parser("labels", help="Agregar etiquetas reales desde un CSV")
+    labels_cmd.add_argument("csv", help="CSV con request_id y AdoptionLikelihood")
+    report_cmd = sub.add_parser("report", help="PSI de la probabilidad y F1/ROC-AUC móvil")
+    report_cmd.add_argument("--freq", default="D", help="Tamaño de la ventana (D = día, h = hora)")
+    report_cmd.add_argument("--rolling", type=int, default=7, help="Ventanas que se combinan en cada punto")
+    report_cmd.add_argument("--model", default="RandomForest_model.pkl", help="Modelo para la referencia de la probabilidad")
+    args = parser.parse_args()
+
+    if args.command == "labels":
+        backfill_labels(args.csv, args.root)
+    else:
+        report(args.root, args.freq, args.rolling, args.model)
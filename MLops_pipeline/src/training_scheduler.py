@@ -0,0 +1,150 @@
+# training_scheduler.py
+# Planificador de entrenamiento: reparte los ajustes de holdout y de cada fold de CV
+# de todos los modelos en un pool de procesos con un presupuesto fijo de núcleos.
+#
+# Cada trabajo recibe un número de hilos (n_jobs) según su costo estimado y se
+# lanza solo si hay núcleos libres, así la suma de hilos nunca pasa del presupuesto
+# y no hay paralelismo anidado (ColumnTransformer/estimador/cross_val_score).
+#
+# Las matrices de cada fold se escriben una vez en un directorio temporal y cada
+# proceso carga (con memory-map) solo los folds de sus trabajos, la primera vez que
+# los necesita; los trabajos siguientes sobre el mismo fold los reutilizan.
+
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import joblib
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from threadpoolctl import threadpool_limits
+
+# Costo relativo por árbol/iteración y si el estimador aprovecha varios hilos
+COST_MODEL = {
+    'RandomForestClassifier': (1.0, True),
+    'ExtraTreesClassifier': (0.8, True),
+    'XGBClassifier': (0.3, True),
+    'GradientBoostingClassifier': (1.0, False),
+    'DecisionTreeClassifier': (1.0, False),
+    'LogisticRegression': (5.0, False),
+}
+
+# Matrices de los folds ya cargados en este proceso de trabajo: {ruta: fold}
+_worker_folds = {}
+
+
+def estimate_cost(model, n_rows):
+    """Costo aproximado de un ajuste (unidades arbitrarias) y si es paralelizable."""
+    per_unit, parallel = COST_MODEL.get(type(model).__name__, (1.0, False))
+    units = model.get_params().get('n_estimators') or 1
+    return per_unit * units * n_rows, parallel
+
+
+def assign_threads(jobs, budget):
+    """
+    Hilos por trabajo: 1 para los estimadores secuenciales y, para los
+    paralelizables, la parte del presupuesto que corresponde a su fracción
+    del costo total.
+    """
+    total_cost = sum(j['cost'] for j in jobs) or 1.0
+    for job in jobs:
+        if job['parallel']:
+            job['threads'] = max(1, min(budget, math.ceil(budget * job['cost'] / total_cost)))
+        else:
+            job['threads'] = 1
+    return jobs
+
+
+def _load_fold(path):
+    """(fold, True si ya estaba cargado en este proceso)."""
+    if path in _worker_folds:
+        return _worker_folds[path], True
+    _worker_folds[path] = joblib.load(path, mmap_mode='r')
+    return _worker_folds[path], False
+
+
+def _run_job(job, path):
+    """Ajusta un clasificador en un fold con el número de hilos asignado."""
+    t0 = time.perf_counter()
+    (Xt_fit, y_fit, Xt_eval, y_eval), hit = _load_fold(path)
+    model = clone(job['model'])
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=job['threads'])
+    # Limitar también BLAS/OpenMP al presupuesto del trabajo
+    with threadpool_limits(limits=job['threads']):
+        model.fit(Xt_fit, y_fit)
+        if job['kind'] == 'cv':
+            output = f1_score(y_eval, model.predict(Xt_eval))
+        else:
+            # Se devuelve con los n_jobs originales para que el modelo guardado no cambie
+            if 'n_jobs' in model.get_params():
+                model.set_params(n_jobs=job['model'].get_params()['n_jobs'])
+            output = model
+    return job['kind'], job['name'], job['fold'], output, time.perf_counter() - t0, hit
+
+
+def run_jobs(jobs, folds, budget=None):
+    """
+    Ejecuta `jobs` (dicts con kind, name, model, fold) sobre `folds`
+    ({fold: (Xt_fit, y_fit, Xt_eval, y_eval)}) respetando `budget` núcleos.
+
+    Devuelve ({(kind, name): salida}, reporte). Para 'holdout' la salida es el
+    clasificador ajustado; para 'cv' es la lista de F1 en orden de fold. El reporte
+    incluye en `cache` cuántos trabajos encontraron su fold ya cargado en el proceso
+    (hits) y cuántas veces un proceso tuvo que cargarlo (misses).
+    """
+    budget = budget or os.cpu_count()
+    if not jobs:
+        return {}, {"jobs": 0, "budget": budget, "wall_seconds": 0.0, "serial_seconds": 0.0,
+                    "cache": {"hits": 0, "misses": 0}}
+
+    for job in jobs:
+        job['cost'], job['parallel'] = estimate_cost(job['model'], len(folds[job['fold']][1]))
+    assign_threads(jobs, budget)
+    # Los trabajos más caros primero (LPT) para que no queden al final solos
+    queue = sorted(jobs, key=lambda j: j['cost'], reverse=True)
+
+    start = time.perf_counter()
+    done_jobs = []
+    with tempfile.TemporaryDirectory(prefix="folds-") as tmp, ProcessPoolExecutor(max_workers=budget) as pool:
+        # Solo los folds que usa algún trabajo, una vez cada uno
+        paths = {}
+        for fold in dict.fromkeys(job['fold'] for job in jobs):
+            paths[fold] = os.path.join(tmp, f"{fold}.joblib")
+            joblib.dump(folds[fold], paths[fold])
+        running = {}
+        free = budget
+        while queue or running:
+            # Lanzar todo lo que quepa en los núcleos libres
+            for job in list(queue):
+                if job['threads'] <= free:
+                    running[pool.submit(_run_job, job, paths[job['fold']])] = job
+                    free -= job['threads']
+                    queue.remove(job)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                free += running.pop(future)['threads']
+                done_jobs.append(future.result())
+    wall = time.perf_counter() - start
+
+    outputs = {}
+    # Ordenar por fold para que las listas de CV queden en el orden de StratifiedKFold
+    for kind, name, fold, output, *_ in sorted(done_jobs, key=lambda r: (r[0], r[1], r[2] if r[0] == 'cv' else -1)):
+        if kind == 'cv':
+            outputs.setdefault((kind, name), []).append(output)
+        else:
+            outputs[(kind, name)] = output
+    serial = sum(r[4] for r in done_jobs)
+    report = {
+        "jobs": len(done_jobs),
+        "budget": budget,
+        "wall_seconds": round(wall, 3),
+        "serial_seconds": round(serial, 3),
+        "speedup": round(serial / wall, 2) if wall > 0 else None,
+        "threads": {f"{j['kind']}:{j['name']}:{j['fold']}": j['threads'] for j in jobs},
+        "job_seconds": {f"{kind}:{name}:{fold}": round(s, 3) for kind, name, fold, _, s, _ in done_jobs},
+        "cache": {"hits": sum(r[5] for r in done_jobs), "misses": sum(not r[5] for r in done_jobs)},
+    }
+    return outputs, report
@@ -0,0 +1,129 @@
+# tuning.py
+# Búsqueda de hiperparámetros por successive halving sobre los folds ya preprocesados.
+#
+# En cada ronda todos los candidatos vivos se evalúan con validación cruzada usando
+# un presupuesto `r` (árboles o filas); solo el mejor 1/factor pasa a la siguiente
+# ronda, donde el presupuesto se multiplica por `factor`. El ganador se entrena con
+# el presupuesto máximo y se guarda como el <Modelo>_model.pkl desplegable.
+#
+# Ejecutar desde MLops_pipeline/src (después de ft_engineering.py):
+#   python tuning.py                  # todos los modelos de config.json -> tuning
+#   python tuning.py RandomForest
+
+import argparse
+import itertools
+import math
+import os
+
+import joblib
+import numpy as np
+from sklearn.pipeline import Pipeline
+
+from artifact_store import ArtifactStore
+from experiment_runner import prepare_folds
+from lean_model import export_lean
+from model_registry import build_estimator, load_config
+from model_training_evaluation import ORDINAL_MAPS, summarize_classification
+from training_scheduler import run_jobs
+
+
+def _candidates(spec, space):
+    """Todas las combinaciones del espacio de búsqueda como specs completos."""
+    keys = sorted(space)
+    return [{"class": spec["class"], "params": {**spec.get("params", {}), **dict(zip(keys, values))}}
+            for values in itertools.product(*(space[k] for k in keys))]
+
+
+def _subsample_folds(folds, cv, n_rows, seed=42):
+    """Folds con solo `n_rows` filas de entrenamiento (presupuesto por filas)."""
+    reduced = {}
+    for i in range(cv):
+        Xt_fit, y_fit, Xt_eval, y_eval = folds[i]
+        if n_rows < len(y_fit):
+            idx = np.sort(np.random.RandomState(seed).permutation(len(y_fit))[:n_rows])
+            Xt_fit, y_fit = Xt_fit[idx], y_fit.iloc[idx]
+        reduced[i] = (Xt_fit, y_fit, Xt_eval, y_eval)
+    return reduced
+
+
+def successive_halving(spec, tuning, folds, cv, budget=None):
+    """
+    Devuelve (mejor spec, historial de rondas). `tuning` define resource
+    ('n_estimators' o 'n_samples'), min_resource, max_resource, factor y space.
+    """
+    resource = tuning.get("resource", "n_estimators")
+    r, r_max = tuning["min_resource"], tuning["max_resource"]
+    factor = tuning.get("factor", 3)
+    alive = _candidates(spec, tuning["space"])
+    history = []
+
+    while True:
+        if len(alive) == 1:
+            # Ya no hay a quién descartar: el ganador se entrena completo en tune()
+            best = alive[0]
+            break
+        if resource == "n_samples":
+            round_folds = _subsample_folds(folds, cv, r)
+            specs = alive
+        else:
+            round_folds = {i: folds[i] for i in range(cv)}
+            specs = [{**c, "params": {**c["params"], resource: r}} for c in alive]
+
+        jobs = [{'kind': 'cv', 'name': str(j), 'model': build_estimator(s), 'fold': i}
+                for j, s in enumerate(specs) for i in range(cv)]
+        outputs, report = run_jobs(jobs, round_folds, budget)
+        scores = [float(np.mean(outputs[('cv', str(j))])) for j in range(len(specs))]
+        history.append({"resource": r, "candidates": len(alive), "best_f1": max(scores),
+                        "seconds": report["wall_seconds"]})
+        print(f"  {resource}={r:<5} candidatos={len(alive):<3} mejor F1 CV={max(scores):.3f} "
+              f"({report['wall_seconds']}s)")
+
+        if r >= r_max:
+            best = alive[int(np.argmax(scores))]
+            break
+        # Sobreviven los mejores 1/factor
+        keep = max(1, math.ceil(len(alive) / factor))
+        order = np.argsort(scores)[::-1][:keep]
+        alive = [alive[k] for k in order]
+        r = min(r * factor, r_max)
+
+    if resource == "n_estimators":
+        best = {**best, "params": {**best["params"], resource: r_max}}
+    return best, history
+
+
+def tune(names=None, budget=None):
+    config = load_config()
+    cv = config.get("cv_folds", 5)
+    tuning_cfg = config.get("tuning", {})
+    names = names or list(tuning_cfg)
+    store = ArtifactStore()
+    split_key, folds, fitted_pre = prepare_folds(cv)
+    Xt_train, y_train, Xt_test, y_test = folds['holdout']
+
+    results = []
+    for name in names:
+        spec, tuning = config["models"][name], tuning_cfg[name]
+        exhaustive = len(_candidates(spec, tuning["space"]))
+        print(f"\n🎯 Successive halving para {name} ({exhaustive} combinaciones)")
+        best, history = successive_halving(spec, tuning, folds, cv, budget)
+
+        # Ganador: se entrena con el presupuesto completo y se guarda como desplegable
+        clf = build_estimator(best).fit(Xt_train, y_train)
+        pipe = Pipeline([('preprocessor', fitted_pre), ('classifier', clf)], memory=None)
+        metrics = summarize_classification(y_test, clf.predict(Xt_test), f"{name} (tuned)")
+        key = store.key(split_key, best["class"], best["params"], "tuned")
+        store.put(f"{name}_model", key, pipe, meta={"split": split_key, "params": best["params"], "tuning": history})
+        joblib.dump(pipe, f"{name}_model.pkl")
+        export_lean(pipe, ORDINAL_MAPS, f"{name}_lean")
+        print(f"🏆 {name}: {best['params']}")
+        print(f"💾 Guardado {name}_model.pkl (F1 test={metrics['F1']:.3f})")
+        results.append({"Model": name, "params": best["params"], "rounds": history, **metrics})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive halving sobre los modelos de config.json.")
+    parser.add_argument("models", nargs="*", help="Modelos a ajustar (por defecto, los de training.tuning)")
+    args = parser.parse_args()
+    tune(args.models or None, int(os.getenv("TRAIN_CORES", "0")) or None)
@@ -0,0 +1,73 @@
+# test_incremental_training.py
+# Una actualización incremental no se pierde al volver a ejecutar el script de entrenamiento.
+#
+#   python -m pytest MLops_pipeline/tests
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "MLops_pipeline" / "src"
+sys.path.insert(0, str(SRC))
+
+import incremental_training  # noqa: E402
+from artifact_store import ArtifactStore  # noqa: E402
+from ft_engineering import run_pipeline  # noqa: E402
+
+BASE_TREES = 20
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Misma estructura que el repo (Base_de_datos.csv dos niveles arriba de src) con un solo modelo chico."""
+    data = pd.read_csv(ROOT / "Base_de_datos.csv")
+    data.iloc[:1200].to_csv(tmp_path / "Base_de_datos.csv", index=False)
+    data.iloc[1200:1500].to_csv(tmp_path / "lote.csv", index=False)
+    src = tmp_path / "MLops_pipeline" / "src"
+    src.mkdir(parents=True)
+    config = {"training": {"cv_folds": 2, "models": {"RandomForest": {
+        "class": "sklearn.ensemble.RandomForestClassifier",
+        "params": {"n_estimators": BASE_TREES, "random_state": 42, "n_jobs": 1}}}}}
+    (src / "config.json").write_text(json.dumps(config))
+    monkeypatch.chdir(src)
+    # El lote es una muestra de los mismos datos: que la cobertura no pida reconstruir
+    monkeypatch.setattr(incremental_training, "MAX_UNSEEN_SHARE", 1.0)
+    monkeypatch.setattr(incremental_training, "MAX_OUT_OF_RANGE_SHARE", 1.0)
+    return tmp_path
+
+
+def train():
+    env = {**os.environ, "MPLBACKEND": "Agg", "TRAIN_CORES": "1"}
+    subprocess.run([sys.executable, str(SRC / "model_training_evaluation.py")], check=True, env=env,
+                   stdout=subprocess.DEVNULL)
+
+
+def trees():
+    return len(joblib.load("RandomForest_model.pkl").named_steps["classifier"].estimators_)
+
+
+def test_retrain_keeps_incremental_update(workdir):
+    run_pipeline()
+    train()
+    assert trees() == BASE_TREES
+
+    state = incremental_training.incremental_update([str(workdir / "lote.csv")])
+    updated = trees()
+    assert state["applied"] and updated > BASE_TREES
+
+    # Mismo split: el script no debe volver a escribir el modelo de config.json encima
+    train()
+    assert trees() == updated
+    store = ArtifactStore()
+    assert store.meta("RandomForest_model")["incremental"] == state["applied"]
+
+    # El lote sigue aplicado, y el modelo desplegado lo incluye
+    assert incremental_training.incremental_update([])["applied"] == state["applied"]
+    assert trees() == updated